@@ -1,14 +1,11 @@
-import pandas as pd
-import lightgbm as lgb
-import joblib
 import sys
 import os
-import numpy as np
 
 # Add local path
 sys.path.append(os.getcwd())
 
-from local_engine.preprocess import process_features
+from local_engine.feature_cache import load_features
+from local_engine.tree_model import feature_importances
 
 MODEL_PATH = r"C:\TFJV\my-racing-dashboard\local_engine\final_model.pkl"
 DATA_PATH = r"C:\TFJV\TXT\20210101-20251231-2.csv"
@@ -16,47 +13,14 @@ DATA_PATH = r"C:\TFJV\TXT\20210101-20251231-2.csv"
 def analyze_history():
     print("=== BACKTEST ANALYSIS: High Dividend Hits (EV > 1.34) ===")
     
-    # 1. Load Data
+    # 1-4. Load, Preprocess, Predict (Re-running history to see what the Current Brain WOULD have done)
+    # Rows with features and a result, is_win, ai_prob and ev; cached per CSV / preprocess / model
     print(f"Loading data from {DATA_PATH}...")
     try:
-        # encoding cp932 is standard for JRA-VAN CSVs
-        df = pd.read_csv(DATA_PATH, encoding='cp932', low_memory=False)
+        df, features = load_features(DATA_PATH, MODEL_PATH)
     except Exception as e:
-        print(f"Error loading CSV: {e}")
+        print(f"Error loading features: {e}")
         return
-
-    # 2. Preprocess
-    print("Preprocessing...")
-    df, features = process_features(df)
-    
-    # Drop rows without targets or features
-    df = df.dropna(subset=features + ['着順'])
-    
-    # Target Construction (Win = 1)
-    # Note: '着順' is raw rank.
-    df['is_win'] = df['着順'].apply(lambda x: 1 if x <= 1 else 0)
-    
-    # 3. Load Model
-    print(f"Loading model from {MODEL_PATH}...")
-    try:
-        model = joblib.load(MODEL_PATH)
-    except Exception as e:
-        print(f"Model load failed: {e}")
-        return
-
-    # 4. Predict (Re-running history to see what the Current Brain WOULD have done)
-    print("Running Inference on History (2021-2025)...")
-    # This might take a moment for 5 years
-    probs = model.predict_proba(df[features])[:, 1]
-    df['ai_prob'] = probs
-    
-    # Calculate EV
-    # Assuming '単勝オッズ' exists (cleaned by preprocess)
-    if '単勝オッズ' not in df.columns:
-        print("Error: Odds column missing.")
-        return
-        
-    df['ev'] = df['ai_prob'] * df['単勝オッズ']
     
     # 5. Filter: EV > 1.34 AND Result = WIN
     print("Filtering High EV Winners...")
@@ -74,8 +38,8 @@ def analyze_history():
     print("\n[TOP 10 HIGH DIVIDEND HITS (Simulated with Current Logic)]")
     
     # Global Feature Importance for context
-    importances = model.feature_importances_
-    feat_imp_dict = dict(zip(features, importances))
+    # Split counts from the NumPy export (the pickle is not loaded)
+    feat_imp_dict = feature_importances(MODEL_PATH) or {}
     
     for idx, row in top_hits.iterrows():
         print("="*60)
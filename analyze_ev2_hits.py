@@ -1,13 +1,10 @@
-import pandas as pd
-import joblib
 import sys
 import os
-import numpy as np
 
 # Add local path
 sys.path.append(os.getcwd())
 
-from local_engine.preprocess import process_features
+from local_engine.feature_cache import load_features
 
 MODEL_PATH = r"C:\TFJV\my-racing-dashboard\local_engine\final_model.pkl"
 DATA_PATH = r"C:\TFJV\TXT\20210101-20251231-2.csv"
@@ -18,15 +15,8 @@ def analyze_ev2():
     # 1. Load & Preprocess
     print("Loading Data...")
     try:
-        df = pd.read_csv(DATA_PATH, encoding='cp932', low_memory=False)
-        df, features = process_features(df)
-        df = df.dropna(subset=features + ['着順'])
-        df['is_win'] = df['着順'].apply(lambda x: 1 if x <= 1 else 0)
-        
-        # Load Model & Predict
-        model = joblib.load(MODEL_PATH)
-        df['ai_prob'] = model.predict_proba(df[features])[:, 1]
-        df['ev'] = df['ai_prob'] * df['単勝オッズ']
+        # Features, is_win, ai_prob and ev (cached per CSV / preprocess / model)
+        df, features = load_features(DATA_PATH, MODEL_PATH)
         
     except Exception as e:
         print(f"Error: {e}")
@@ -53,10 +43,6 @@ def analyze_ev2():
     # Sort hits by Date (Recent first)
     target_hits = target_hits.sort_values('Date', ascending=False)
     
-    # Feature Importance to explain "Why"
-    importances = model.feature_importances_
-    feat_imp_dict = dict(zip(features, importances))
-    
     # 3. Report Hits (Top 10)
     print(f"\n[FOUND {len(target_hits)} HITS in the Volume Zone (30-100x, EV>2.0)]")
     
@@ -1,6 +1,3 @@
-import pandas as pd
-import lightgbm as lgb
-import joblib
 import sys
 import os
 import numpy as np
@@ -8,7 +5,8 @@ import numpy as np
 # Add local path
 sys.path.append(os.getcwd())
 
-from local_engine.preprocess import process_features
+from local_engine.feature_cache import load_features
+from local_engine.tree_model import feature_importances
 
 MODEL_PATH = r"C:\TFJV\my-racing-dashboard\local_engine\final_model.pkl"
 DATA_PATH = r"C:\TFJV\TXT\20210101-20251231-2.csv"
@@ -16,42 +14,13 @@ DATA_PATH = r"C:\TFJV\TXT\20210101-20251231-2.csv"
 def analyze_volume_zone():
     print("=== VOLUME ZONE ANALYSIS: The 'Bread and Butter' Hits ===")
     
-    # 1. Load Data
+    # 1-4. Load, Preprocess, Predict (cached per CSV / preprocess / model)
     print(f"Loading data from {DATA_PATH}...")
     try:
-        df = pd.read_csv(DATA_PATH, encoding='cp932', low_memory=False)
+        df, features = load_features(DATA_PATH, MODEL_PATH)
     except Exception as e:
-        print(f"Error loading CSV: {e}")
+        print(f"Error loading features: {e}")
         return
-
-    # 2. Preprocess
-    print("Preprocessing...")
-    df, features = process_features(df)
-    
-    # Drop rows without targets or features
-    df = df.dropna(subset=features + ['着順'])
-    
-    # Target Construction (Win = 1)
-    df['is_win'] = df['着順'].apply(lambda x: 1 if x <= 1 else 0)
-    
-    # 3. Load Model
-    print(f"Loading model from {MODEL_PATH}...")
-    try:
-        model = joblib.load(MODEL_PATH)
-    except Exception as e:
-        print(f"Model load failed: {e}")
-        return
-
-    # 4. Predict
-    print("Running Inference...")
-    probs = model.predict_proba(df[features])[:, 1]
-    df['ai_prob'] = probs
-    
-    if '単勝オッズ' not in df.columns:
-        print("Error: Odds column missing.")
-        return
-        
-    df['ev'] = df['ai_prob'] * df['単勝オッズ']
     
     # 5. Filter: EV > 1.34 (All Bets)
     all_bets = df[df['ev'] > 1.34].copy()
@@ -83,8 +52,8 @@ def analyze_volume_zone():
     hits['diff_from_median'] = abs(hits['単勝オッズ'] - median_odds)
     typical_hits = hits.sort_values('diff_from_median').head(3)
     
-    importances = model.feature_importances_
-    feat_imp_dict = dict(zip(features, importances))
+    # Split counts from the NumPy export (the pickle is not loaded)
+    feat_imp_dict = feature_importances(MODEL_PATH) or {}
 
     for idx, row in typical_hits.iterrows():
         print("-" * 60)
@@ -5,14 +5,14 @@ import datetime
 import pytz
 import os
 import json
+import time
+import threading
 from dotenv import load_dotenv
-from supabase import create_client
-import joblib
-import sklearn
+from db_client import fetch_all, fetch_rpc, fetch_page, fan_out
+from worker_archive import iter_raw_rows
+from local_engine.model_registry import active_version, LEGACY_MODEL_PATH
 import numpy as np
 
-MODEL_PATH = "local_engine/final_model.pkl"
-
 # --- 0. Config & Setup ---
 st.set_page_config(page_title="Racing Dashboard (Debug)", layout="wide")
 load_dotenv()
@@ -21,19 +21,11 @@ load_dotenv()
 jst = pytz.timezone('Asia/Tokyo')
 now_jst = datetime.datetime.now(jst)
 
-# Supabase Connection
-@st.cache_resource
+# Supabase Connection (pooled client in db_client.py)
 def init_connection():
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_KEY")
-    try:
-        if url and key:
-            return create_client(url, key)
-    except:
-        return None
-    return None
+    return bool(os.getenv("SUPABASE_URL") and os.getenv("SUPABASE_KEY"))
 
-supabase = init_connection()
+db_ready = init_connection()
 
 # --- 1. Debug Container Wrapper ---
 def debug_container(component_id, title, func, *args, **kwargs):
@@ -75,130 +67,237 @@ def debug_container(component_id, title, func, *args, **kwargs):
 
 # --- 2. Data Logic ---
 
-@st.cache_data(ttl=60)
-def fetch_todays_data(date_str):
-    """Fetch 0B15 (SE7) and 0B30/31 (Odds) and merge using Pandas"""
-    if not supabase: return pd.DataFrame(), pd.DataFrame(), {}
+PLACE_MAP_EN = {
+    "01": "Sapporo", "02": "Hakodate", "03": "Fukushima", "04": "Niigata",
+    "05": "Tokyo", "06": "Nakayama", "07": "Chukyo", "08": "Kyoto", 
+    "09": "Hanshin", "10": "Kokura"
+}
+
+# Incremental refresh: snapshot column -> RPC "since" parameter (one watermark per source table)
+SNAPSHOT_WATERMARKS = {
+    "entry_ts": "p_entries_since",
+    "odds_ts": "p_odds_since",
+    "pred_ts": "p_pred_since",
+    "result_ts": "p_results_since",
+}
+REFRESH_TTL = 60  # Seconds between incremental refreshes
+
+def fetch_day_snapshot(date_str, watermarks=None):
+    """Entries + latest odds + predictions + finish flags in one RPC (joined server-side).
+    With watermarks, only horses changed since then are returned.
+    Empty frame when the RPC fails (the caller then uses the legacy path)."""
+    args = {"p_race_date": date_str}
+    for col, param in SNAPSHOT_WATERMARKS.items():
+        if watermarks and watermarks.get(col):
+            args[param] = watermarks[col]
     try:
-        # 1. Get 0B15 (Horse Info - SE7 from DB)
-        res_h = supabase.table("raw_race_data").select("race_id, content").eq("data_type", "0B15").eq("race_date", date_str).execute()
-        
-        # 2. Get 0B30 or 0B31 (Odds)
-        res_o = supabase.table("raw_race_data").select("race_id, content").in_("data_type", ["0B30", "0B31"]).eq("race_date", date_str).execute()
-        
-        # 3. Get 0B12 (Results)
-        res_r = supabase.table("raw_race_data").select("race_id, content").eq("data_type", "0B12").eq("race_date", date_str).execute()
-        
-        # 4. Get Prediction Results
-        # race_id based filter (YYYYMMDD%)
-        res_p = supabase.table("prediction_results").select("race_id, horse_num, predict_score, predict_flag").like("race_id", f"{date_str}%").execute()
-        
-        # --- Process Horses (0B15) ---
-        horses_list = []
-        parsed_races = []
-        seen_races = set()
-        
-        place_map = {
-            "01": "Sapporo", "02": "Hakodate", "03": "Fukushima", "04": "Niigata",
-            "05": "Tokyo", "06": "Nakayama", "07": "Chukyo", "08": "Kyoto", 
-            "09": "Hanshin", "10": "Kokura"
-        }
-
-        for r in (res_h.data if res_h.data else []):
-            try:
-                c = json.loads(r['content'])
-                if c.get('record_type') == 'SE':
-                    rid = c.get('race_id', '')
-                    if not rid: continue
-                    h_row = c.copy()
-                    h_row['race_id'] = rid
-                    h_row['horse_num'] = str(h_row.get('horse_num', '')).zfill(2)
-                    horses_list.append(h_row)
-                    
-                    if rid not in seen_races:
-                        jj = rid[8:10]
-                        race_num = rid[14:16]
-                        parsed_races.append({
-                            "Race ID": rid,
-                            "Place": place_map.get(jj, f"Jo{jj}"),
-                            "Round": f"{int(race_num):02d}R",
-                            "Date": date_str
-                        })
-                        seen_races.add(rid)
-            except: continue
-
-        df_horses = pd.DataFrame(horses_list)
-        if not df_horses.empty:
-            df_horses = df_horses.drop_duplicates(subset=['race_id', 'horse_num'], keep='last')
-        
-        # --- Process Odds (0B30/31) ---
-        odds_list = []
-        for r in (res_o.data if res_o.data else []):
-            rid = r['race_id']
-            try:
-                c = json.loads(r['content'])
-                for o in c.get('odds', []):
-                    o_row = o.copy()
-                    o_row['race_id'] = rid
-                    o_row['horse_num'] = str(o_row.get('horse_num', '')).zfill(2)
-                    odds_list.append(o_row)
-            except: continue
-        
-        df_odds = pd.DataFrame(odds_list)
-        if not df_odds.empty:
-            df_odds = df_odds.drop_duplicates(subset=['race_id', 'horse_num'], keep='last')
-            
-        # --- Process Predictions ---
-        df_pred = pd.DataFrame(res_p.data if res_p.data else [])
-        if not df_pred.empty:
-            df_pred['horse_num'] = df_pred['horse_num'].astype(str).str.zfill(2)
-            df_pred = df_pred.drop_duplicates(subset=['race_id', 'horse_num'], keep='last')
-        
-        # --- Merge Phase (Pandas) ---
-        if not df_horses.empty and not df_odds.empty:
-            df_merged = pd.merge(df_horses, df_odds[['race_id', 'horse_num', 'odds_tan', 'pop_tan']], 
-                                 on=['race_id', 'horse_num'], how='left')
-        else:
-            df_merged = df_horses
-            if not df_merged.empty:
-                df_merged['odds_tan'] = None
-                df_merged['pop_tan'] = None
-                
-        # Merge Predictions if available
-        if not df_merged.empty and not df_pred.empty:
-            df_merged = pd.merge(df_merged, df_pred[['race_id', 'horse_num', 'predict_score', 'predict_flag']],
-                                 on=['race_id', 'horse_num'], how='left')
-            # Fill NaN
-            df_merged['predict_score'] = df_merged['predict_score'].fillna(0.0)
-            df_merged['predict_flag'] = df_merged['predict_flag'].fillna(0)
-        elif not df_merged.empty:
-             df_merged['predict_score'] = 0.0
-             df_merged['predict_flag'] = 0
+        rows = fetch_rpc("get_day_snapshot", args, order="race_id.asc,horse_num.asc")
+    except Exception as e:
+        # RPC not deployed yet / backend without RPC (local_postgrest): refresh_day
+        # falls back to fetch_legacy_day on an empty frame
+        print(f"Snapshot RPC Fail: {e}")
+        return pd.DataFrame()
+    df = pd.DataFrame(rows)
+    if df.empty: return df
+    df['horse_num'] = df['horse_num'].astype(int).astype(str).str.zfill(2)
+    return df.rename(columns={'sex': 'sex_code'})
+
+def advance_watermarks(watermarks, df_delta):
+    """Move each table's high-water mark to the newest timestamp seen in the delta"""
+    wm = dict(watermarks)
+    for col in SNAPSHOT_WATERMARKS:
+        if col not in df_delta.columns: continue
+        newest = pd.to_datetime(df_delta[col], utc=True, errors='coerce').max()
+        if pd.isna(newest): continue
+        if not wm.get(col) or newest > pd.to_datetime(wm[col], utc=True):
+            wm[col] = newest.isoformat()
+    return wm
+
+def merge_delta(df_base, df_delta):
+    """Replace changed (race_id, horse_num) rows of the cached frame"""
+    if df_base.empty: return df_delta
+    if df_delta.empty: return df_base
+    return (pd.concat([df_base, df_delta])
+            .drop_duplicates(subset=['race_id', 'horse_num'], keep='last')
+            .sort_values(['race_id', 'horse_num'])
+            .reset_index(drop=True))
+
+def fetch_legacy_day(date_str):
+    """Fallback for dates collected before race_entries/win_odds existed (raw JSON path)"""
+    # Paged reads (PostgREST caps each response, so a single GET truncates busy days)
+    # The three queries are independent and run in parallel.
+    # (iter_raw_rows serves archived months from local Parquet when available)
+    res = fan_out({
+        # 1. 0B15 (Horse Info - SE7 from DB)
+        "horses": lambda: list(iter_raw_rows(select="race_id, content",
+                                             filters={"data_type": "0B15", "race_date": date_str})),
+        # 2. 0B30 or 0B31 (Odds)
+        "odds": lambda: list(iter_raw_rows(select="race_id, content",
+                                           filters={"data_type": ["0B30", "0B31"], "race_date": date_str})),
+        # 3. Prediction Results, race_id based filter (YYYYMMDD%)
+        "preds": lambda: fetch_all("prediction_results", select="race_id, horse_num, predict_score, predict_flag",
+                                   filters={"race_id": ("like", f"{date_str}*")}, order="race_id.asc,horse_num.asc"),
+    })
+    rows_h, rows_o, rows_p = res["horses"], res["odds"], res["preds"]
+    
+    # --- Process Horses (0B15) ---
+    horses_list = []
+    for r in rows_h:
+        try:
+            c = json.loads(r['content'])
+            if c.get('record_type') == 'SE':
+                rid = c.get('race_id', '')
+                if not rid: continue
+                h_row = c.copy()
+                h_row['race_id'] = rid
+                h_row['horse_num'] = str(h_row.get('horse_num', '')).zfill(2)
+                horses_list.append(h_row)
+        except: continue
+
+    df_horses = pd.DataFrame(horses_list)
+    if df_horses.empty:
+        return df_horses
+    df_horses = df_horses.drop_duplicates(subset=['race_id', 'horse_num'], keep='last')
+    
+    # --- Process Odds (0B30/31) ---
+    odds_list = []
+    for r in rows_o:
+        rid = r['race_id']
+        try:
+            c = json.loads(r['content'])
+            for o in c.get('odds', []):
+                o_row = o.copy()
+                o_row['race_id'] = rid
+                o_row['horse_num'] = str(o_row.get('horse_num', '')).zfill(2)
+                odds_list.append(o_row)
+        except: continue
+    
+    df_odds = pd.DataFrame(odds_list)
+    if not df_odds.empty:
+        df_odds = df_odds.drop_duplicates(subset=['race_id', 'horse_num'], keep='last')
         
-        # --- Process Results (Payoffs) ---
-        parsed_payoffs = {}
-        for r in (res_r.data if res_r.data else []):
-            rid = r['race_id']
-            try:
-                c = json.loads(r['content'])
-                if c.get('record_type') == 'HR':
-                    if rid not in parsed_payoffs: parsed_payoffs[rid] = []
-                    parsed_payoffs[rid].append(c)
-            except: continue
+    # --- Process Predictions ---
+    df_pred = pd.DataFrame(rows_p)
+    if not df_pred.empty:
+        df_pred['horse_num'] = df_pred['horse_num'].astype(str).str.zfill(2)
+        df_pred = df_pred.drop_duplicates(subset=['race_id', 'horse_num'], keep='last')
+    
+    # --- Merge Phase (Pandas) ---
+    if not df_odds.empty:
+        df_merged = pd.merge(df_horses, df_odds[['race_id', 'horse_num', 'odds_tan', 'pop_tan']], 
+                             on=['race_id', 'horse_num'], how='left')
+    else:
+        df_merged = df_horses
+        df_merged['odds_tan'] = None
+        df_merged['pop_tan'] = None
             
-        return pd.DataFrame(parsed_races), df_merged, parsed_payoffs
-    except Exception as e:
-        st.error(f"Data Fetch Error: {e}")
-        return pd.DataFrame(), pd.DataFrame(), {}
+    # Merge Predictions if available
+    if not df_pred.empty:
+        df_merged = pd.merge(df_merged, df_pred[['race_id', 'horse_num', 'predict_score', 'predict_flag']],
+                             on=['race_id', 'horse_num'], how='left')
+        # Fill NaN
+        df_merged['predict_score'] = df_merged['predict_score'].fillna(0.0)
+        df_merged['predict_flag'] = df_merged['predict_flag'].fillna(0)
+    else:
+         df_merged['predict_score'] = 0.0
+         df_merged['predict_flag'] = 0
+
+    # Raw odds / weight are 10x integers; convert to the snapshot's real units
+    df_merged['odds_tan'] = pd.to_numeric(df_merged['odds_tan'], errors='coerce') / 10.0
+    df_merged['pop_tan'] = pd.to_numeric(df_merged['pop_tan'], errors='coerce')
+    if 'weight' in df_merged.columns:
+        df_merged['weight'] = pd.to_numeric(df_merged['weight'], errors='coerce') / 10.0
+    return df_merged
+
+def fetch_payoffs(date_str, payoffs, watermark):
+    """0B12 HR records written or re-written after the watermark (updated_at), per race and row id"""
+    filters = {"data_type": "0B12", "race_date": date_str}
+    if watermark:
+        filters["updated_at"] = ("gt", watermark)
+    payoffs = {rid: dict(recs) for rid, recs in payoffs.items()}
+    # Archived months come from Parquet (worker_archive tiers)
+    for r in iter_raw_rows(select="id, race_id, content, updated_at", filters=filters,
+                           order="updated_at.asc,id.asc"):
+        rid = r['race_id']
+        if r.get('updated_at') and (not watermark or r['updated_at'] > watermark):
+            watermark = r['updated_at']
+        try:
+            c = json.loads(r['content'])
+            if c.get('record_type') == 'HR':
+                # Keyed by row id: a re-parsed row replaces its old content
+                payoffs.setdefault(rid, {})[r['id']] = c
+        except: continue
+    return payoffs, watermark
+
+def build_race_list(df_merged, date_str):
+    parsed_races = []
+    if not df_merged.empty:
+        for rid in df_merged['race_id'].unique():
+            jj = rid[8:10]
+            race_num = rid[14:16]
+            parsed_races.append({
+                "Race ID": rid,
+                "Place": PLACE_MAP_EN.get(jj, f"Jo{jj}"),
+                "Round": f"{int(race_num):02d}R",
+                "Date": date_str
+            })
+    return pd.DataFrame(parsed_races)
+
+def refresh_day(date_str, day):
+    """Fetch only rows newer than the cached watermarks and merge them in"""
+    if day is None:
+        day = {"frame": pd.DataFrame(), "wm": {}, "payoffs": {}, "pay_wm": None}
+
+    # Snapshot delta and payoffs (0B12 HR) are independent; fetch them in parallel
+    res = fan_out({
+        "delta": lambda: fetch_day_snapshot(date_str, day["wm"]),
+        "payoffs": lambda: fetch_payoffs(date_str, day["payoffs"], day["pay_wm"]),
+    })
+    payoffs, pay_wm = res["payoffs"]
+
+    # Merged horse / odds / prediction frame
+    # Without a snapshot baseline (first load / legacy date) the RPC returns the full day
+    base = day["frame"] if day["wm"] else pd.DataFrame()
+    df_delta = res["delta"]
+    if base.empty and df_delta.empty:
+        df_merged, wm = fetch_legacy_day(date_str), {}
+    else:
+        df_merged = merge_delta(base, df_delta)
+        wm = advance_watermarks(day["wm"], df_delta)
+
+    return {
+        "frame": df_merged, "wm": wm,
+        "payoffs": payoffs, "pay_wm": pay_wm,
+        "races": build_race_list(df_merged, date_str),
+        "fetched_at": time.time(),
+    }
+
 @st.cache_resource
-def load_prediction_model():
-    """Load model once for the app session"""
-    if os.path.exists(MODEL_PATH):
+def get_day_store():
+    """Process-wide cache: date -> last merged frame + per-table watermarks"""
+    return {"lock": threading.Lock(), "days": {}}
+
+def fetch_todays_data(date_str):
+    """Merged day frame and 0B12 payoffs, refreshed incrementally every REFRESH_TTL seconds"""
+    if not db_ready: return pd.DataFrame(), pd.DataFrame(), {}
+    store = get_day_store()
+    with store["lock"]:
+        day = store["days"].get(date_str)
+        if day and time.time() - day["fetched_at"] < REFRESH_TTL:
+            return day["races"], day["frame"], day["payoffs"]
         try:
-            return joblib.load(MODEL_PATH)
-        except:
-            return None
-    return None
+            day = refresh_day(date_str, day)
+            store["days"][date_str] = day
+            return day["races"], day["frame"], day["payoffs"]
+        except Exception as e:
+            st.error(f"Data Fetch Error: {e}")
+            if day:
+                return day["races"], day["frame"], day["payoffs"]
+            return pd.DataFrame(), pd.DataFrame(), {}
+
+def model_available():
+    """Whether a model is deployed (ACTIVE pointer or legacy final_model.pkl); nothing is loaded"""
+    return active_version() is not None or os.path.exists(LEGACY_MODEL_PATH)
 
 def run_ai_prediction(df_race):
     """Run AI inference/Rule-base on a single race's dataframe"""
@@ -206,14 +305,13 @@ def run_ai_prediction(df_race):
     
     df = df_race.copy()
     # 1. Feature Engineering (Simplified)
-    df['odds_tan_val'] = pd.to_numeric(df['odds_tan'], errors='coerce') / 10.0
+    df['odds_tan_val'] = pd.to_numeric(df['odds_tan'], errors='coerce')
     df['pop_tan_val'] = pd.to_numeric(df['pop_tan'], errors='coerce')
     df['horse_num_int'] = pd.to_numeric(df['horse_num'], errors='coerce')
     df['odds_per_pop'] = df['odds_tan_val'] / (df['pop_tan_val'].replace(0, 99))
     
     # 2. Inference
-    model = load_prediction_model()
-    if model:
+    if model_available():
         # We know from worker_predict.py it expects 8 features, but we have 4.
         # So we use rule-base as fallback for now to ensure consistency.
         df['pred_score'] = 0.0
@@ -247,8 +345,8 @@ def render_header():
     with cols[1]:
         st.metric("Current Time", now_jst.strftime("%H:%M:%S"))
     with cols[2]:
-        status_color = "green" if supabase else "red"
-        status_text = "Connected" if supabase else "Disconnected"
+        status_color = "green" if db_ready else "red"
+        status_text = "Connected" if db_ready else "Disconnected"
         st.markdown(f"**DB Status**: :{status_color}[{status_text}]")
 
 def render_filter(available_places, available_columns):
@@ -298,7 +396,10 @@ def render_horse_list(rid, df_merged):
     # Map columns to localized names
     sex_map = {"1": "牡", "2": "牝", "3": "セ"}
     def format_sex_age(row):
-        sex = sex_map.get(str(row.get('sex_code')), '')
+        try:
+            sex = sex_map.get(str(int(row.get('sex_code'))), '')
+        except:
+            sex = ''
         try:
             age = int(row.get('age'))
         except:
@@ -314,20 +415,17 @@ def render_horse_list(rid, df_merged):
         "weight": "斤量",
         "jockey": "騎手",
         "odds_tan": "単勝",
-        "pop_tan": "人気"
+        "pop_tan": "人気",
+        "finish_rank": "着"
     }
 
     display_cols = [c for c in col_map.keys() if c in df_race.columns]
     df_display = df_race[display_cols].rename(columns=col_map)
     
-    # Scale numeric odds (recorded as 10x integer often)
-    if "単勝" in df_display.columns:
-        df_display['単勝'] = pd.to_numeric(df_display['単勝'], errors='coerce') / 10.0
-    if "人気" in df_display.columns:
-        df_display['人気'] = pd.to_numeric(df_display['人気'], errors='coerce')
-    # Format weight (recorded as 10x integer, e.g. 550 = 55.0 kg)
-    if "斤量" in df_display.columns:
-        df_display['斤量'] = pd.to_numeric(df_display['斤量'], errors='coerce') / 10.0
+    # Odds / weight are already real values (typed tables)
+    for col in ["単勝", "人気", "斤量", "着"]:
+        if col in df_display.columns:
+            df_display[col] = pd.to_numeric(df_display[col], errors='coerce')
 
     st.dataframe(
         df_display,
@@ -339,6 +437,7 @@ def render_horse_list(rid, df_merged):
             "枠": st.column_config.TextColumn("枠", width="small"),
             "番": st.column_config.TextColumn("番", width="small"),
             "斤量": st.column_config.NumberColumn("斤量", format="%.1f kg"),
+            "着": st.column_config.NumberColumn("着", format="%d"),
         }
     )
 
@@ -350,28 +449,44 @@ def render_payoff_data(selected_rid, payoffs_map):
             st.write("No race selected.")
             return
         if selected_rid in payoffs_map:
-            st.dataframe(pd.DataFrame(payoffs_map[selected_rid]), use_container_width=True)
+            st.dataframe(pd.DataFrame(list(payoffs_map[selected_rid].values())), use_container_width=True)
         else:
             st.write(f"No payoff (HR) records found for {selected_rid}.")
 
 # --- 4. Main Layout ---
 
+@st.cache_data(ttl=60)
+def fetch_race_calendar():
+    """race_calendar rows keyed by race_date (maintained by ingest triggers)"""
+    if not db_ready: return {}
+    try:
+        rows = fetch_all("race_calendar", select="race_date, venues, race_count, is_complete",
+                         order="race_date.desc")
+        return {r['race_date']: r for r in rows}
+    except Exception as e:
+        print(f"Calendar Fetch Error: {e}")
+    return {}
+
 @st.cache_data(ttl=60)
 def fetch_available_dates():
-    """Fetch distinct race_dates from raw_race_data (0B15)"""
-    if not supabase: return []
+    """Race dates from race_calendar (falls back to scanning raw_race_data 0B15)"""
+    calendar = fetch_race_calendar()
+    if calendar:
+        return sorted(calendar.keys(), reverse=True)
+    if not db_ready: return []
     try:
         # Limit to 100 recent entries to find dates
-        res = supabase.table("raw_race_data").select("race_date").eq("data_type", "0B15").order("race_date", desc=True).limit(200).execute()
-        if res.data:
+        rows = fetch_page("raw_race_data", select="race_date", filters={"data_type": "0B15"},
+                          order="race_date.desc", limit=200)
+        if rows:
             # Extract unique dates and sort descending
-            dates = sorted(list(set([r['race_date'] for r in res.data])), reverse=True)
+            dates = sorted(list(set([r['race_date'] for r in rows])), reverse=True)
             return dates
     except Exception as e:
         print(f"Date Fetch Error: {e}")
     return []
 
-def render_date_selector(available_dates):
+def render_date_selector(available_dates, calendar=None):
     """ID: 002 Date Selector"""
     st.write("📅 **Date Selection**")
     
@@ -390,7 +505,13 @@ def render_date_selector(available_dates):
     if today_str in available_dates:
         default_ix = available_dates.index(today_str)
     
-    selected_date = st.selectbox("Select Date:", available_dates, index=default_ix, key="main_date_selector")
+    calendar = calendar or {}
+    def format_date(d):
+        # ✅ = cards, odds and results all present
+        return f"{d} ✅" if calendar.get(d, {}).get('is_complete') else d
+    
+    selected_date = st.selectbox("Select Date:", available_dates, index=default_ix,
+                                 format_func=format_date, key="main_date_selector")
     return selected_date
 
 # --- 4. Main Layout ---
@@ -402,12 +523,13 @@ def main():
         st.write("Mode: Gatekeeper Validated")
         st.write(f"Server Time: {now_jst.strftime('%Y-%m-%d %H:%M')}")
         
-        status_color = "green" if supabase else "red"
-        status_text = "Online" if supabase else "Offline"
+        status_color = "green" if db_ready else "red"
+        status_text = "Online" if db_ready else "Offline"
         st.markdown(f"**DB Connection**: :{status_color}[{status_text}]")
         
         if st.button("Clear Cache"):
             st.cache_data.clear()
+            get_day_store()["days"].clear()
             st.rerun()
 
     # Main Area
@@ -421,7 +543,7 @@ def main():
     c_date, c_place, c_num = st.columns([1, 1, 1])
     
     with c_date:
-        date_str = render_date_selector(available_dates)
+        date_str = render_date_selector(available_dates, fetch_race_calendar())
         
     # Fetch Data for selected date
     df_races, df_merged, todays_payoffs = fetch_todays_data(date_str)
@@ -432,7 +554,8 @@ def main():
 
     # 2. Place & RaceNum Filters
     # Calculate available options properly
-    place_options = ["All"] + sorted(list(set([f"{p['Place']} ({p['Race ID'][8:10]})" for p in df_races.to_dict('records')])))
+    venues = fetch_race_calendar().get(date_str, {}).get('venues') or sorted(df_races['Race ID'].str.slice(8, 10).unique())
+    place_options = ["All"] + [f"{PLACE_MAP_EN.get(v, f'Jo{v}')} ({v})" for v in venues]
     
     with c_place:
         st.write("📍 **Place**")
@@ -505,7 +628,7 @@ def main():
                  else:
                     st.warning("⚠️ オッズデータが不足しているため、正確な予測ができません。ダミーデータでテストしますか？")
                     if st.button("Generate Test Odds"):
-                        df_curr['odds_tan'] = np.random.randint(50, 500, size=len(df_curr))
+                        df_curr['odds_tan'] = np.random.randint(50, 500, size=len(df_curr)) / 10.0
                         df_curr['pop_tan'] = np.random.randint(1, 15, size=len(df_curr))
                     else:
                         st.stop()
@@ -516,7 +639,7 @@ def main():
                 df_pred['pred_score'] = df_pred['predict_score']
                 df_pred['pred_mark'] = df_pred.get('predict_flag', 0)
                 # Validation cols
-                df_pred['odds_tan_val'] = pd.to_numeric(df_pred['odds_tan'], errors='coerce') / 10.0
+                df_pred['odds_tan_val'] = pd.to_numeric(df_pred['odds_tan'], errors='coerce')
                 df_pred['pop_tan_val'] = pd.to_numeric(df_pred['pop_tan'], errors='coerce')
                 st.info("💡 保存済みの予測データを表示しています")
             else:
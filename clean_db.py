@@ -1,45 +1,36 @@
 
-import os
-from dotenv import load_dotenv
-from supabase import create_client
-
-load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+from db_client import fetch_all, delete_rows
 
 def clean_garbage():
     print("Deleting garbage entries (race_id not starting with '20')...")
     # Delete anything that doesn't look like a year-based ID
-    # Note: 'not_.ilike' support might be limited in py-supabase, looping might be safer but slow.
-    # Let's try direct delete logic if possible.
-    # Supabase-py uses postgrest.
+    # PostgREST negation: race_id=not.ilike.2026* (db_client passes the operator through)
     
     # Logic: Delete where race_date = '20260207' AND race_id NOT like '20%'
     today = "20260207"
+    chunk_size = 100
     
     # 1. Fetch bad IDs to verify
-    res = supabase.table("raw_race_data").select("race_id").eq("race_date", today).not_.ilike("race_id", "2026%").execute()
-    bad_ids = [r['race_id'] for r in res.data] if res.data else []
+    rows = fetch_all("raw_race_data", select="race_id", filters={"race_date": today, "race_id": ("not.ilike", "2026*")})
+    bad_ids = sorted({r['race_id'] for r in rows})
     
     print(f"Found {len(bad_ids)} bad IDs for {today}.")
     if bad_ids:
         # Delete in chunks
-        chunk_size = 100
         for i in range(0, len(bad_ids), chunk_size):
             chunk = bad_ids[i:i+chunk_size]
-            supabase.table("raw_race_data").delete().in_("race_id", chunk).execute()
+            delete_rows("raw_race_data", {"race_date": today, "race_id": chunk})
             print(f"Deleted chunk {i}")
             
     # Also check 20260208
     tomorrow = "20260208"
-    res_tm = supabase.table("raw_race_data").select("race_id").eq("race_date", tomorrow).not_.ilike("race_id", "2026%").execute()
-    bad_ids_tm = [r['race_id'] for r in res_tm.data] if res_tm.data else []
+    rows_tm = fetch_all("raw_race_data", select="race_id", filters={"race_date": tomorrow, "race_id": ("not.ilike", "2026*")})
+    bad_ids_tm = sorted({r['race_id'] for r in rows_tm})
     print(f"Found {len(bad_ids_tm)} bad IDs for {tomorrow}.")
     if bad_ids_tm:
         for i in range(0, len(bad_ids_tm), chunk_size):
             chunk = bad_ids_tm[i:i+chunk_size]
-            supabase.table("raw_race_data").delete().in_("race_id", chunk).execute()
+            delete_rows("raw_race_data", {"race_date": tomorrow, "race_id": chunk})
             print(f"Deleted chunk {i}")
 
     print("Cleanup Complete.")
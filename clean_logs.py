@@ -1,12 +1,4 @@
-
-import os
-from dotenv import load_dotenv
-from supabase import create_client
-
-load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+from db_client import fetch_all, delete_rows
 
 def clean_system_logs():
     print("Cleaning system_logs table...")
@@ -18,21 +10,21 @@ def clean_system_logs():
     
     # Supabase (Postgrest) delete without where clause is blocked usually.
     # We need a condition.
-    # Let's find IDs first.
+    # Let's find IDs first (paged: a single GET stops at max-rows).
     
-    res = supabase.table("system_logs").select("id").execute()
-    if not res.data:
+    rows = fetch_all("system_logs", select="id", order="id.asc")
+    if not rows:
         print("No logs found.")
         return
 
-    ids = [r['id'] for r in res.data]
+    ids = [r['id'] for r in rows]
     print(f"Found {len(ids)} logs. Deleting...")
     
     # Delete in chunks
     chunk_size = 100
     for i in range(0, len(ids), chunk_size):
         chunk = ids[i:i+chunk_size]
-        supabase.table("system_logs").delete().in_("id", chunk).execute()
+        delete_rows("system_logs", {"id": chunk})
         print(f"Deleted chunk {i}")
 
     print("System logs cleaned.")
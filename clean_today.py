@@ -1,6 +1,6 @@
 import os
-import requests
 from dotenv import load_dotenv
+from db_client import count_rows, delete_rows
 
 # Load Env
 load_dotenv()
@@ -15,40 +15,24 @@ TARGET_DATE = "20260208"
 
 def clean_target_date():
     print(f"Cleaning data for {TARGET_DATE}...")
-    
-    headers = {
-        "apikey": key,
-        "Authorization": f"Bearer {key}",
-        "Content-Type": "application/json"
-    }
 
-    # Count before
-    count_url = f"{url}/rest/v1/raw_race_data?select=count&race_date=eq.{TARGET_DATE}"
-    # Supabase returns count in header 'Content-Range' usually if Prefer: count=exact, or simply count items
-    # But let's just use select=id with HEAD or select=count
-    # Actually, simplest is to check len(GET)
-    r = requests.get(f"{url}/rest/v1/raw_race_data", headers=headers, params={"select": "race_date", "race_date": f"eq.{TARGET_DATE}"})
-    if r.status_code == 200:
-        count_before = len(r.json())
+    # Count before (exact count from Content-Range, no rows transferred)
+    try:
+        count_before = count_rows("raw_race_data", {"race_date": TARGET_DATE})
         print(f"Records before: {count_before}")
-    else:
-        print(f"Error checking count: {r.text}")
+    except Exception as e:
+        print(f"Error checking count: {e}")
         count_before = -1
     
     if count_before > 0:
-        # DELETE
-        # Need to include filters in query params
-        del_url = f"{url}/rest/v1/raw_race_data"
-        r = requests.delete(del_url, headers=headers, params={"race_date": f"eq.{TARGET_DATE}"})
-        
-        if r.status_code in (200, 204):
+        try:
+            delete_rows("raw_race_data", {"race_date": TARGET_DATE})
             print("Delete request sent successfully.")
-        else:
-            print(f"Delete failed: {r.status_code} {r.text}")
+        except Exception as e:
+            print(f"Delete failed: {e}")
             
         # Verify
-        r = requests.get(f"{url}/rest/v1/raw_race_data", headers=headers, params={"select": "race_date", "race_date": f"eq.{TARGET_DATE}"})
-        count_after = len(r.json())
+        count_after = count_rows("raw_race_data", {"race_date": TARGET_DATE})
         print(f"Records after delete: {count_after}")
     else:
         print("No records found to delete.")
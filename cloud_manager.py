@@ -1,22 +1,21 @@
 import streamlit as st
 import datetime
-from supabase import create_client
+from db_client import fetch_page, upsert_rows, insert_rows
 import os
 
 # Wrapper for reading/writing system config to Supabase
 # Table: system_config (key: text PK, value: text, updated_at: timestamp)
 
 class CloudManager:
-    def __init__(self, supabase):
-        self.client = supabase
+    # Supabase access goes through the shared pooled client (db_client.py)
 
     def get_config(self, key, default_value):
         try:
             # st.cache_data removed here to ensure real-time toggle response for critical switches
             # or use logic to force refresh. For now, direct DB hit is safer for "Stop Button".
-            response = self.client.table("system_config").select("value").eq("key", key).execute()
-            if response.data:
-                return response.data[0]['value']
+            rows = fetch_page("system_config", select="value", filters={"key": key}, order=None, limit=1)
+            if rows:
+                return rows[0]['value']
             else:
                 return default_value
         except Exception as e:
@@ -27,7 +26,7 @@ class CloudManager:
         try:
             now = datetime.datetime.now().isoformat()
             data = {"key": key, "value": str(value), "updated_at": now}
-            self.client.table("system_config").upsert(data).execute()
+            upsert_rows("system_config", [data], on_conflict="key")
             return True
         except Exception as e:
              print(f"[CloudManager] Error setting {key}: {e}")
@@ -70,6 +69,6 @@ class CloudManager:
                 "details": str(details),
                 # timestamp defaults to now() in DB
             }
-            self.client.table("system_logs").insert(data).execute()
+            insert_rows("system_logs", [data])
         except Exception as e:
             print(f"[CloudManager] Log failed: {e}")
@@ -1,30 +0,0 @@
-
-import os
-from dotenv import load_dotenv
-from supabase import create_client
-
-load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-
-def create_table_race_results():
-    print("Creating race_results table via SQL RPC or Direct Exec (if allowed)...")
-    # Note: supabase-py doesn't support direct DDL execution easily without Service Role or SQL Editor.
-    # But often we can use a stored procedure if available.
-    # Since I don't have a 'exec_sql' RPC, I will try to use the dashboard or assume user has to run it.
-    # WAIT. The user has been running python scripts.
-    # The user probably needs to paste this SQL into Supabase Dashboard.
-    # I can't run DDL from here usually.
-    # BUT, I can try to use `postgres` library if I had connection string? No.
-    # I will output the SQL and tell the user to run it?
-    # No, the user said "Run 'worker_result_scraper.py' failed... Table not created?".
-    # I should TRY to create it if I can, but standard Supabase client is Data API only.
-    
-    # However, I can try to simply UPSERT to it. If it fails, then table missing.
-    # I already know it's missing.
-    # I will tell the user to run the SQL.
-    pass
-
-if __name__ == "__main__":
-    pass
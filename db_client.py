@@ -0,0 +1,394 @@
+"""
+Supabase Data Access Client
+===========================
+The one way every worker, the dashboard and the scripts talk to Supabase
+(PostgREST). All calls share a pooled HTTP session and the same timeout,
+retry and compression behavior:
+
+    - Connection pool sized for the concurrent page / fan-out workers
+    - Retries with exponential backoff on 429, 5xx and connection errors
+      (plain inserts are only retried when the server did not process them)
+    - gzip request bodies for large writes (responses are gzip-negotiated)
+    - Per-call timing hooks (add_timing_hook)
+
+PostgREST caps every response (max-rows, usually 1000), so reads page through
+a query with Range headers and fetch the pages concurrently with a bounded
+pool, streaming rows back to the caller in order.
+
+Usage:
+    from db_client import iter_rows, fetch_all
+
+    for row in iter_rows("raw_race_data", select="race_id, content",
+                         filters={"data_type": "0B15", "race_date": "20260207"}):
+        ...
+
+    rows = fetch_rpc("get_day_snapshot", {"p_race_date": "20260207"})
+
+    upsert_rows("race_entries", rows, on_conflict="race_id,horse_num")
+    upsert_rows("bet_queue", bets, on_conflict="bet_key", ignore_duplicates=True)
+    update_rows("bet_queue", {"status": "purchased"}, {"id": bet_id})
+    delete_rows("raw_race_data", {"race_date": "20260207"})
+
+    # Independent queries in parallel
+    res = fan_out({
+        "cards": lambda: fetch_all("race_entries", filters={"race_date": d}),
+        "preds": lambda: fetch_all("prediction_results", filters={"race_date": d}),
+    })
+
+    # asyncio
+    client = AsyncClient()
+    cards, bets = await client.gather(client.fetch_all("race_entries"), client.fetch_all("bet_queue"))
+
+Reads page in DEFAULT_ORDER (race_id, id) unless the table has no id column;
+those (race_entries, win_odds, horse_history, ...) page on their primary key
+(TABLE_ORDER). Pass `order` for any other table without an id.
+
+Filter values:
+    "0B15"                  -> eq.0B15
+    ["0B30", "0B31"]        -> in.(0B30,0B31)
+    ("like", "20260207*")   -> like.20260207*   (any PostgREST operator)
+    "or": "(a.is.null,a.neq.1)"  -> passed through (PostgREST logic tree)
+"""
+
+import os
+import gzip
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv()
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+PAGE_SIZE = 1000      # Keep <= PostgREST max-rows
+MAX_WORKERS = 4       # Concurrent page requests
+FAN_OUT_WORKERS = 8   # Concurrent independent queries (fan_out / AsyncClient)
+TIMEOUT = 30
+RETRIES = 3           # Retries on 429 / 5xx / connection errors
+BACKOFF = 1.0         # Seconds, doubled per attempt
+GZIP_MIN_BYTES = 8192  # Compress request bodies larger than this
+
+# Stable ordering is required for Range paging (otherwise pages may overlap).
+# DEFAULT_ORDER pages on the BIGSERIAL id; tables without an id column page on
+# their primary key instead (order=DEFAULT_ORDER is resolved per table).
+DEFAULT_ORDER = "race_id.asc,id.asc"
+TABLE_ORDER = {
+    "race_entries": "race_id.asc,horse_num.asc",
+    "win_odds": "race_id.asc,horse_num.asc,snapshot_ts.asc",
+    "race_results": "race_id.asc",
+    "horse_history": "horse_id.asc",
+    "shadow_predictions": "race_id.asc,horse_num.asc,model_version.asc",
+    "race_calendar": "race_date.asc",
+}
+
+# Statuses where the request was not processed (safe to retry even an insert)
+_NOT_PROCESSED = (429, 503)
+
+_session = requests.Session()
+_pool_size = MAX_WORKERS * 2 + FAN_OUT_WORKERS
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=_pool_size))
+_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=_pool_size))
+
+_timing_hooks = []
+_fan_out_pool = None
+
+
+def add_timing_hook(hook):
+    """hook(method, path, status, seconds, attempts) after every call (status None on network error)"""
+    _timing_hooks.append(hook)
+
+
+def remove_timing_hook(hook):
+    if hook in _timing_hooks:
+        _timing_hooks.remove(hook)
+
+
+def _headers(key=None):
+    key = key or SUPABASE_KEY
+    return {
+        "apikey": key,
+        "Authorization": f"Bearer {key}",
+    }
+
+
+def build_params(select="*", filters=None, order=None):
+    """Convert a filter dict into PostgREST query params"""
+    params = {"select": select}
+    if filters:
+        for k, v in filters.items():
+            if k in ("or", "and"):
+                params[k] = v
+            elif isinstance(v, list):
+                params[k] = f"in.({','.join(str(x) for x in v)})"
+            elif isinstance(v, tuple):
+                op, val = v
+                params[k] = f"{op}.{val}"
+            else:
+                params[k] = f"eq.{v}"
+    if order:
+        params["order"] = order
+    return params
+
+
+def request(method, path, params=None, body=None, headers=None, key=None,
+            retries=RETRIES, idempotent=True):
+    """
+    Single HTTP call to {SUPABASE_URL}/rest/v1/{path}.
+    Retries 429 / 5xx / connection errors with backoff; a non-idempotent call
+    (plain insert) is only retried when the server did not process it.
+    Raises requests.HTTPError on final failure.
+    """
+    url = f"{SUPABASE_URL}/rest/v1/{path}"
+    all_headers = _headers(key)
+    all_headers.update(headers or {})
+    data = None
+    if body is not None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        all_headers["Content-Type"] = "application/json"
+        if len(data) > GZIP_MIN_BYTES:
+            data = gzip.compress(data, compresslevel=5)
+            all_headers["Content-Encoding"] = "gzip"
+
+    t0 = time.perf_counter()
+    status = None
+    attempt = 0
+    try:
+        for attempt in range(retries + 1):
+            try:
+                resp = _session.request(method, url, params=params, data=data,
+                                        headers=all_headers, timeout=TIMEOUT)
+                status = resp.status_code
+                retryable = status in _NOT_PROCESSED or (idempotent and status >= 500)
+                if not retryable:
+                    resp.raise_for_status()
+                    return resp
+                error = requests.HTTPError(f"HTTP {status}: {resp.text[:200]}", response=resp)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # A dropped insert may have been applied; only a failed connect is safe to repeat
+                if not idempotent and not isinstance(e, requests.ConnectTimeout):
+                    raise
+                error = e
+            if attempt < retries:
+                time.sleep(BACKOFF * (2 ** attempt))
+        raise error
+    finally:
+        elapsed = time.perf_counter() - t0
+        for hook in _timing_hooks:
+            hook(method, path, status, elapsed, attempt + 1)
+
+
+# --- Reads ---
+
+def order_for(table, order=DEFAULT_ORDER):
+    """The order actually sent: DEFAULT_ORDER becomes the table's key order"""
+    if order == DEFAULT_ORDER:
+        return TABLE_ORDER.get(table, DEFAULT_ORDER)
+    return order
+
+
+def _parse_total(content_range):
+    """'0-999/2345' -> 2345 (None if the server did not count)"""
+    if not content_range or "/" not in content_range:
+        return None
+    total = content_range.split("/")[-1]
+    return int(total) if total.isdigit() else None
+
+
+def _get_page(path, params, start, end, count=False, body=None):
+    """GET a table page, or POST an RPC call when body is given"""
+    headers = {"Range-Unit": "items", "Range": f"{start}-{end}"}
+    if count:
+        headers["Prefer"] = "count=exact"
+    resp = request("GET" if body is None else "POST", path, params=params, body=body, headers=headers)
+    return resp.json(), resp.headers.get("Content-Range")
+
+
+def iter_pages(table, select="*", filters=None, order=DEFAULT_ORDER,
+               page_size=PAGE_SIZE, max_workers=MAX_WORKERS, rpc_args=None):
+    """
+    Yields lists of rows, one per page, in query order.
+    The first page also returns the exact row count; the remaining pages are
+    fetched concurrently (at most max_workers in flight).
+    With rpc_args, `table` is a set-returning function called via /rpc/.
+    """
+    path = table if rpc_args is None else f"rpc/{table}"
+    params = build_params(select, filters, order if rpc_args is not None else order_for(table, order))
+
+    first, content_range = _get_page(path, params, 0, page_size - 1, count=True, body=rpc_args)
+    yield first
+
+    total = _parse_total(content_range)
+    if not first or total is None or total <= len(first):
+        return
+
+    # The server may cap pages below page_size; follow its actual page length
+    step = len(first)
+    starts = list(range(step, total, step))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = deque()
+        for start in starts:
+            pending.append(pool.submit(_get_page, path, params, start, start + step - 1, False, rpc_args))
+            if len(pending) >= max_workers * 2:
+                yield pending.popleft().result()[0]
+        while pending:
+            yield pending.popleft().result()[0]
+
+
+def iter_rows(table, select="*", filters=None, order=DEFAULT_ORDER,
+              page_size=PAGE_SIZE, max_workers=MAX_WORKERS, rpc_args=None):
+    """Streams individual rows across all pages"""
+    for page in iter_pages(table, select, filters, order, page_size, max_workers, rpc_args):
+        yield from page
+
+
+def fetch_all(table, select="*", filters=None, order=DEFAULT_ORDER,
+              page_size=PAGE_SIZE, max_workers=MAX_WORKERS):
+    """Returns the complete result set as a list"""
+    return list(iter_rows(table, select, filters, order, page_size, max_workers))
+
+
+def fetch_rpc(function, args, order=None, page_size=PAGE_SIZE, max_workers=MAX_WORKERS):
+    """Calls a set-returning Postgres function (paged like a table read)"""
+    return list(iter_rows(function, order=order, page_size=page_size,
+                          max_workers=max_workers, rpc_args=args))
+
+
+def fetch_page(table, select="*", filters=None, order=DEFAULT_ORDER, limit=PAGE_SIZE):
+    """A single page (no count). For keyset paging: filter on the last key seen."""
+    rows, _ = _get_page(table, build_params(select, filters, order_for(table, order)), 0, limit - 1)
+    return rows
+
+
+def count_rows(table, filters=None):
+    """Exact row count without transferring rows"""
+    _, content_range = _get_page(table, build_params("*", filters), 0, 0, count=True)
+    return _parse_total(content_range) or 0
+
+
+def call_rpc(function, args=None, key=None):
+    """Calls a scalar / void Postgres function. `key` overrides SUPABASE_KEY
+    (admin functions are granted to the service role only)."""
+    resp = request("POST", f"rpc/{function}", body=args or {}, key=key)
+    return resp.json() if resp.content else None
+
+
+# --- Writes ---
+
+def insert_rows(table, rows, returning=False):
+    """Plain insert (a duplicate key is an error). Returns the inserted rows if `returning`."""
+    if not rows:
+        return [] if returning else 0
+    prefer = "return=representation" if returning else "return=minimal"
+    resp = request("POST", table, body=rows, headers={"Prefer": prefer}, idempotent=False)
+    return resp.json() if returning else len(rows)
+
+
+def upsert_rows(table, rows, on_conflict, retries=RETRIES, ignore_duplicates=False):
+    """
+    Batch upsert (merge-duplicates) on the `on_conflict` unique key.
+    ignore_duplicates: rows whose key exists are skipped and the stored row is
+    left untouched (insert-if-absent).
+    """
+    if not rows:
+        return 0
+    resolution = "ignore-duplicates" if ignore_duplicates else "merge-duplicates"
+    request("POST", table, params={"on_conflict": on_conflict}, body=rows,
+            headers={"Prefer": f"resolution={resolution},return=minimal"}, retries=retries)
+    return len(rows)
+
+
+def update_rows(table, values, filters):
+    """PATCH `values` onto every row matching `filters`"""
+    request("PATCH", table, params=build_params(filters=filters), body=values,
+            headers={"Prefer": "return=minimal"})
+
+
+def delete_rows(table, filters):
+    """DELETE every row matching `filters` (filters are required)"""
+    if not filters:
+        raise ValueError("delete_rows requires filters")
+    request("DELETE", table, params=build_params(filters=filters), headers={"Prefer": "return=minimal"})
+
+
+# --- Concurrency ---
+
+def _pool():
+    global _fan_out_pool
+    if _fan_out_pool is None:
+        _fan_out_pool = ThreadPoolExecutor(max_workers=FAN_OUT_WORKERS, thread_name_prefix="db_fan_out")
+    return _fan_out_pool
+
+
+def fan_out(calls, return_exceptions=False):
+    """
+    Runs independent zero-argument callables concurrently.
+    {"name": callable} -> {"name": result}. With return_exceptions, a failing
+    call yields its exception instead of raising.
+    """
+    futures = {name: _pool().submit(fn) for name, fn in calls.items()}
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            results[name] = e
+    return results
+
+
+class AsyncClient:
+    """
+    asyncio front end over the pooled client (calls run in worker threads,
+    at most `concurrency` at a time).
+
+        client = AsyncClient()
+        rows = await client.fetch_all("race_entries", filters={"race_date": d})
+    """
+
+    def __init__(self, concurrency=FAN_OUT_WORKERS):
+        # asyncio is imported here: the sync workers never pay for it
+        import asyncio
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def _run(self, fn, *args, **kwargs):
+        import asyncio
+        async with self._semaphore:
+            return await asyncio.to_thread(fn, *args, **kwargs)
+
+    async def fetch_all(self, *args, **kwargs):
+        return await self._run(fetch_all, *args, **kwargs)
+
+    async def fetch_rpc(self, *args, **kwargs):
+        return await self._run(fetch_rpc, *args, **kwargs)
+
+    async def fetch_page(self, *args, **kwargs):
+        return await self._run(fetch_page, *args, **kwargs)
+
+    async def count_rows(self, *args, **kwargs):
+        return await self._run(count_rows, *args, **kwargs)
+
+    async def call_rpc(self, *args, **kwargs):
+        return await self._run(call_rpc, *args, **kwargs)
+
+    async def insert_rows(self, *args, **kwargs):
+        return await self._run(insert_rows, *args, **kwargs)
+
+    async def upsert_rows(self, *args, **kwargs):
+        return await self._run(upsert_rows, *args, **kwargs)
+
+    async def update_rows(self, *args, **kwargs):
+        return await self._run(update_rows, *args, **kwargs)
+
+    async def delete_rows(self, *args, **kwargs):
+        return await self._run(delete_rows, *args, **kwargs)
+
+    @staticmethod
+    async def gather(*coros, return_exceptions=False):
+        import asyncio
+        return await asyncio.gather(*coros, return_exceptions=return_exceptions)
@@ -0,0 +1,205 @@
+"""
+Per-horse History Feature Store
+===============================
+Keeps each horse's most recent runs in the `horse_history` table, keyed by
+血統登録番号 (horse_id), so live prediction can get lag features for every
+runner of a day with one indexed read instead of reloading the TARGET CSV.
+
+Each row holds the last HISTORY_DEPTH runs (`recent`, newest first) plus
+columns derived from them:
+    last_*   the previous run (what process_features' shift(1) yields).
+             When the newest run is a rank-only live result (0B12 brings no
+             PCI / 上り3F), last_pci / last_3f come from the run before it and
+             prev_stale is set; across more than one such run they stay empty
+    avg_*    mean over the last ROLLING_WINDOW runs (missing values skipped)
+
+Runs are merged, not appended, keyed by race date (a horse runs at most once
+a day): a run for a day already in `recent` fills in the values it carries
+(0B12 brings the rank, a TARGET CSV load adds PCI and 上り3F), and late runs
+are slotted in by date.
+
+Updated by worker_collector.py as 0B12 results arrive; bootstrap or refresh
+from a TARGET export with:
+    python horse_history.py --csv C:\\TFJV\\TXT\\20210101-20251231-2.csv
+
+The merge is pure standard library (it runs inside the 32bit collector).
+"""
+
+import json
+import argparse
+import datetime
+from db_client import fetch_all, upsert_rows
+
+HISTORY_DEPTH = 5
+ROLLING_WINDOW = 3
+LOOKUP_CHUNK = 200    # horse_ids per request (keeps the URL short)
+
+FIELDS = ("pci", "last_3f", "rank")
+
+
+def horse_key(val):
+    """2019105432 / 2019105432.0 / ' 2019105432' -> '2019105432' (None if empty)"""
+    if val is None:
+        return None
+    if isinstance(val, float):
+        if val != val:
+            return None
+        val = int(val)
+    val = str(val).strip()
+    return val.zfill(10) if val else None
+
+
+def to_history_run(parsed: dict, race_date: str) -> dict:
+    """0B12 SE record -> run for merge_runs (None if not a horse result)"""
+    if not parsed or parsed.get("record_type") != "SE":
+        return None
+    horse_id = horse_key(parsed.get("horse_id"))
+    race_id = parsed.get("race_id")
+    if not horse_id or not race_id:
+        return None
+    rank = str(parsed.get("rank") or "").strip()
+    return {
+        "horse_id": horse_id,
+        "race_id": race_id,
+        "race_date": race_date,
+        "rank": int(rank) if rank.isdigit() and int(rank) > 0 else None,
+    }
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else None
+
+
+def _rank_only(run):
+    return run.get("rank") is not None and run.get("pci") is None and run.get("last_3f") is None
+
+
+def _previous(runs, field):
+    """
+    (value, stale) of field for the last_* column (runs newest first): the
+    newest run's own value, or the run before it when the newest run is a
+    rank-only live result (stale). Older gaps are not bridged.
+    """
+    latest = runs[0]
+    if latest.get(field) is not None:
+        return latest[field], False
+    if _rank_only(latest) and len(runs) > 1 and runs[1].get(field) is not None:
+        return runs[1][field], True
+    return None, False
+
+
+def merge_runs(row: dict, runs: list) -> dict:
+    """Existing horse_history row (or None) + new runs of that horse -> new row"""
+    recent = (row or {}).get("recent") or []
+    if isinstance(recent, str):  # JSON text (SQLite mirror)
+        recent = json.loads(recent)
+    recent = {r["race_date"]: dict(r) for r in recent}
+    for run in runs:
+        cur = recent.setdefault(run["race_date"], {"race_date": run["race_date"], "race_id": None})
+        for f in ("race_id",) + FIELDS:
+            if run.get(f) is not None:
+                cur[f] = run[f]
+
+    ordered = sorted(recent.values(), key=lambda r: r["race_date"], reverse=True)
+    ordered = ordered[:HISTORY_DEPTH]
+    last = ordered[0]
+    window = ordered[:ROLLING_WINDOW]
+    last_pci, pci_stale = _previous(ordered, "pci")
+    last_3f, f3_stale = _previous(ordered, "last_3f")
+    return {
+        "horse_id": (row or runs[0])["horse_id"],
+        "last_race_id": last["race_id"],
+        "last_race_date": last["race_date"],
+        "last_pci": last_pci,
+        "last_3f": last_3f,
+        "last_rank": last.get("rank"),
+        "prev_stale": pci_stale or f3_stale,
+        "avg_pci": _mean(r.get("pci") for r in window),
+        "avg_3f": _mean(r.get("last_3f") for r in window),
+        "avg_rank": _mean(r.get("rank") for r in window),
+        "recent": ordered,
+        "updated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+
+
+class HorseHistoryStore:
+    """Batched reads and incremental writes for horse_history"""
+
+    table = "horse_history"
+
+    def lookup(self, horse_ids, select="*") -> dict:
+        """{horse_id: row} for the given horses (unknown horses are absent)"""
+        ids = sorted({k for k in (horse_key(h) for h in horse_ids) if k})
+        rows = {}
+        for i in range(0, len(ids), LOOKUP_CHUNK):
+            chunk = ids[i:i + LOOKUP_CHUNK]
+            for r in fetch_all(self.table, select=select, filters={"horse_id": chunk}, order="horse_id.asc"):
+                rows[r["horse_id"]] = r
+        return rows
+
+    def update(self, runs) -> int:
+        """Merge runs (dicts with horse_id, race_date and any of race_id / FIELDS)"""
+        by_horse = {}
+        for run in runs:
+            if run and run.get("horse_id") and run.get("race_date"):
+                by_horse.setdefault(horse_key(run["horse_id"]), []).append(dict(run, horse_id=horse_key(run["horse_id"])))
+        if not by_horse:
+            return 0
+        current = self.lookup(by_horse)
+        rows = [merge_runs(current.get(h), hr) for h, hr in by_horse.items()]
+        return upsert_rows(self.table, rows, on_conflict="horse_id")
+
+
+def runs_from_target_csv(path, date_from=None):
+    """
+    Runs from a TARGET CSV export (PCI / 上り3F / 着順 cleaned as in
+    process_features). Only each horse's last HISTORY_DEPTH runs are kept.
+    """
+    import pandas as pd
+    from local_engine.preprocess import clean_numeric_series
+    from local_engine.target_loader import load_target
+
+    df = load_target(path)
+    runs = pd.DataFrame({
+        "horse_id": df["血統登録番号"].map(horse_key),
+        "race_date": ("20" + df["年"].astype(str).str.zfill(2) + df["月"].astype(str).str.zfill(2)
+                      + df["日"].astype(str).str.zfill(2)),
+        "pci": clean_numeric_series(df["PCI"]),
+        "last_3f": clean_numeric_series(df["上がり3Fタイム"]),
+        "rank": clean_numeric_series(df["確定着順"]),
+    }).dropna(subset=["horse_id"])
+    if date_from:
+        runs = runs[runs["race_date"] >= date_from]
+    runs = runs.sort_values(["horse_id", "race_date"]).groupby("horse_id").tail(HISTORY_DEPTH)
+    runs["rank"] = runs["rank"].where(runs["rank"] > 0)
+    runs = runs.astype(object).where(runs.notna(), None)
+    return runs.to_dict("records")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build / refresh horse_history")
+    parser.add_argument("--csv", required=True, help="TARGET CSV export")
+    parser.add_argument("--from", dest="date_from", help="Ignore runs before this date (YYYYMMDD)")
+    parser.add_argument("--batch", type=int, default=2000, help="Horses per update batch")
+    args = parser.parse_args()
+
+    print(f"[HISTORY] Reading {args.csv}...")
+    runs = runs_from_target_csv(args.csv, args.date_from)
+    by_horse = {}
+    for run in runs:
+        by_horse.setdefault(run["horse_id"], []).append(run)
+    horses = list(by_horse)
+    print(f"[HISTORY] {len(runs):,} runs for {len(horses):,} horses")
+
+    store = HorseHistoryStore()
+    done = 0
+    for i in range(0, len(horses), args.batch):
+        batch = [r for h in horses[i:i + args.batch] for r in by_horse[h]]
+        done += store.update(batch)
+        print(f"   {done:,}/{len(horses):,} horses", end="\r")
+    print("\n[HISTORY] Done.")
+
+
+if __name__ == "__main__":
+    main()
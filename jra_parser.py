@@ -1,5 +1,23 @@
+import json
+import hashlib
 from jra_specs import SPECS
 
+
+# Bump when a change to the parsing logic below changes the parsed content
+# (spec changes are picked up from SPECS). Comments / formatting / line endings
+# do not change PARSER_VERSION, so they never trigger a history re-parse.
+PARSER_REVISION = 1
+
+
+def _parser_version():
+    """Changes whenever SPECS or PARSER_REVISION changes (stamped on raw_race_data rows)"""
+    h = hashlib.md5(json.dumps(SPECS, sort_keys=True).encode("utf-8"))
+    h.update(f"|{PARSER_REVISION}".encode("ascii"))
+    return h.hexdigest()[:12]
+
+
+PARSER_VERSION = _parser_version()
+
 class JRAParser:
     def __init__(self, data):
         # データの型に応じてバイト型に統一
@@ -9,6 +9,7 @@ SPECS = {
             "race_id_part": {"start": 11, "len": 16},
             "waku":         {"start": 27, "len": 1},
             "horse_num":    {"start": 28, "len": 2},
+            "horse_id":     {"start": 30, "len": 10}, # 血統登録番号
             "horse_name":   {"start": 40, "len": 28},
             "sex_code":     {"start": 297, "len": 1},
             "hair_code":    {"start": 298, "len": 2},
@@ -24,6 +25,7 @@ SPECS = {
                 "columns": {
                     "race_id_part": {"start": 11, "len": 16},
                     "horse_num":    {"start": 28, "len": 2},
+                    "horse_id":     {"start": 30, "len": 10}, # 血統登録番号
                     "rank":         {"start": 148, "len": 2}, # 確定着順 (RT spec TBD)
                 }
             },
@@ -0,0 +1,91 @@
+"""
+Benchmark: clean_numeric (per-cell apply) vs clean_numeric_series (vectorized)
+on a synthetic TARGET-like frame. Both paths must return identical values.
+
+Usage:
+    python local_engine/bench_clean_numeric.py             # 1,000,000 rows
+    python local_engine/bench_clean_numeric.py --rows 200000
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from preprocess import clean_numeric, clean_numeric_series
+
+# The 8 columns process_features cleans
+COLUMNS = ['PCI', '上がり3Fタイム', '確定着順', '人気順', '単勝オッズ', '頭数', '馬番', '斤量']
+
+EDGE_CASES = [
+    '１２', ' 3 ', '12.5', '.5', '5.', '.', '', '1.2.3', '中止', '取消', '①', '²5',
+    '٣', '１．５', '-1', '1e5', 'nan', None, np.nan, 7, 7.5, True,
+]
+
+
+def synthetic_frame(rows, seed=0):
+    """Strings as read_csv leaves them: padded, full-width, blanks and status words"""
+    rng = np.random.default_rng(seed)
+
+    def column(values, noise=0.02):
+        col = pd.Series(values, dtype=object)
+        pick = rng.random(rows)
+        col[pick < noise] = rng.choice(['', ' ', '中止', '取消', '除外'], size=int((pick < noise).sum()))
+        full = (pick >= noise) & (pick < noise * 2)
+        col[full] = col[full].str.translate(str.maketrans('0123456789', '０１２３４５６７８９'))
+        return col
+
+    def fmt(arr, spec):
+        return [format(v, spec) for v in arr]
+
+    return pd.DataFrame({
+        'PCI': column(fmt(rng.normal(50, 5, rows), '.1f')),
+        '上がり3Fタイム': column(fmt(rng.normal(35.5, 1.2, rows), '.1f')),
+        '確定着順': column(fmt(rng.integers(1, 19, rows), '>2d')),
+        '人気順': column(fmt(rng.integers(1, 19, rows), 'd')),
+        '単勝オッズ': column(fmt(rng.lognormal(2.5, 1.0, rows), '.1f')),
+        '頭数': column(fmt(rng.integers(5, 19, rows), 'd'), noise=0),
+        '馬番': column(fmt(rng.integers(1, 19, rows), 'd'), noise=0),
+        '斤量': column(fmt(rng.choice([52.0, 54.0, 55.0, 56.0, 57.0, 58.0], rows), '.1f'), noise=0),
+    })
+
+
+def check_edge_cases():
+    s = pd.Series(EDGE_CASES, dtype=object)
+    np.testing.assert_array_equal(clean_numeric_series(s).to_numpy(), s.apply(clean_numeric).to_numpy(dtype=float))
+    cat = s.dropna().astype(str).astype('category')
+    np.testing.assert_array_equal(clean_numeric_series(cat).to_numpy(), cat.astype(object).apply(clean_numeric).to_numpy())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark vectorized numeric cleaning")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    check_edge_cases()
+    print(f"Building synthetic frame ({args.rows:,} rows x {len(COLUMNS)} columns)...")
+    df = synthetic_frame(args.rows)
+
+    t_apply = t_vec = 0.0
+    print(f"{'column':<16}{'apply (s)':>12}{'vectorized (s)':>16}{'speedup':>10}")
+    for col in COLUMNS:
+        t0 = time.perf_counter()
+        expected = df[col].apply(clean_numeric)
+        t1 = time.perf_counter()
+        actual = clean_numeric_series(df[col])
+        t2 = time.perf_counter()
+        np.testing.assert_array_equal(actual.to_numpy(), expected.to_numpy(dtype=float))
+        assert actual.dtype == 'float64' and actual.index.equals(expected.index)
+        t_apply += t1 - t0
+        t_vec += t2 - t1
+        print(f"{col:<16}{t1 - t0:>12.3f}{t2 - t1:>16.3f}{(t1 - t0) / (t2 - t1):>9.1f}x")
+
+    print(f"{'total':<16}{t_apply:>12.3f}{t_vec:>16.3f}{t_apply / t_vec:>9.1f}x")
+    print("Values identical.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,65 +1,174 @@
 import pandas as pd
-import joblib
 import os
-import sys
-from .preprocess import process_features
+from .preprocess import process_features, horse_ids
+from .model_registry import ActiveModel, active_model, shadow_models
 
 class Brain:
-    def __init__(self, model_path="final_model.pkl"):
-        # Resolve path relative to this script if not absolute
-        if not os.path.isabs(model_path):
-            model_path = os.path.join(os.path.dirname(__file__), model_path)
-            
-        print(f"[BRAIN] Loading Model from {model_path}...")
-        try:
-            self.model = joblib.load(model_path)
-            print("[BRAIN] Model Loaded Successfully.")
-        except Exception as e:
-            print(f"[BRAIN] Failed to load model: {e}")
-            self.model = None
-
-    def predict(self, df):
+    def __init__(self, model_path=None, history_store=None, models=None, shadows=None):
+        # history_store: horse_history.HorseHistoryStore (lag features for today's runners)
+        self.history_store = history_store
+        # models: model_registry.ActiveModel. Default: the registry's active model,
+        # re-checked before every batch (hot reload). model_path pins a fixed file.
+        if models is None and model_path:
+            if not os.path.isabs(model_path):
+                # Resolve path relative to this script if not absolute
+                model_path = os.path.join(os.path.dirname(__file__), model_path)
+            models = ActiveModel(model_path=model_path)
+        elif models is None:
+            models = active_model()
+        self.models = models
+        # shadows: model_registry.ShadowModels scored next to the active model
+        # (predict_day_with_shadows). Default: the registry's SHADOW list.
+        if shadows is None and not model_path:
+            shadows = shadow_models()
+        self.shadows = shadows
+
+        version, model = self.models.current()
+        if model is not None:
+            print(f"[BRAIN] Model {version} Loaded Successfully.")
+        else:
+            print("[BRAIN] Failed to load model (none registered / not loadable).")
+
+    @property
+    def model(self):
+        """Model currently active (hot-reloaded)"""
+        return self.models.current()[1]
+
+    def load_history(self, df):
+        """horse_history rows for every horse in df (one batched read), indexed by horse_id"""
+        if self.history_store is None or '血統登録番号' not in df.columns:
+            return None
+        rows = self.history_store.lookup(horse_ids(df['血統登録番号']).dropna().unique())
+        if not rows:
+            return None
+        return pd.DataFrame(list(rows.values())).set_index('horse_id')
+
+    def _score(self, df, history=None, shadows=False):
         """
-        Takes a raw dataframe (formatted like TARGET CSV),
-        applies preprocessing, and returns predictions.
+        Preprocess df and score every row with complete features in one
+        predict_proba call -> (scored rows, model_version, shadow scores).
+        One model per call: a registry swap takes effect on the next call.
+        shadows=True also scores the shadow models on the same rows:
+        {version: probabilities aligned with the scored rows}.
         """
-        if self.model is None:
+        version, model = self.models.current()
+        if model is None:
             raise RuntimeError("Model is not loaded.")
 
-        # Preprocess
-        df_processed, features = process_features(df)
-        
         # We need historical data for 'Shift' to work.
-        # If 'df' only contains TODAY's race, shift(1) will produce NaN.
-        # The calling script (Worker) must provide concatenated history 
-        # OR we need a dedicated 'fetch_history' mechanism inside preprocess.
-        # For now, we assume 'df' includes necessary history or pre-calculated lag features.
-        
-        # Check for missing columns
-        missing = [c for c in features if c not in df_processed.columns]
-        if missing:
-            # If Lag features are missing (NaN), we cannot predict.
-            # But process_features calculates them. If they are NaN, it means not enough history.
-            pass
+        # If 'df' only contains TODAY's race, shift(1) will produce NaN; those
+        # lags come from the horse_history feature store (or `history`) instead.
+        # After a rank-only live run (0B12 has no PCI / 上り3F) the store's
+        # Prev_PCI / Prev_3F are those of the run before it (prev_stale) - one
+        # run older than shift(1) gave in training. After two such runs they
+        # are missing and the horse is not scored until the TARGET CSV refresh.
+        if history is None:
+            history = self.load_history(df)
+
+        # Preprocess
+        df_processed, features = process_features(df, history=history)
 
         # Filter rows valid for prediction (must have features)
         # We perform prediction on ALL rows that have valid features.
         valid_mask = df_processed[features].notna().all(axis=1)
         valid_df = df_processed[valid_mask].copy()
-        
         if valid_df.empty:
-            print("[BRAIN] No valid rows for prediction (History missing?).")
-            return pd.DataFrame()
+            return valid_df, version, {}
 
         # Predict
-        probs = self.model.predict_proba(valid_df[features])[:, 1]
-        valid_df['ai_prob'] = probs
-        
+        valid_df['ai_prob'] = model.predict_proba(valid_df[features])[:, 1]
+        valid_df['model_version'] = version
+
         # EV Check (if Odds available)
         if '単勝オッズ' in valid_df.columns:
             valid_df['ev'] = valid_df['ai_prob'] * valid_df['単勝オッズ']
-        
-        return valid_df[['Date', 'race_id', '馬番', 'ai_prob', 'ev'] if 'race_id' in valid_df.columns else ['Date', '馬番', 'ai_prob', 'ev']]
+
+        shadow_scores = {}
+        for shadow_version, shadow_model, shadow_features in (self.shadows.current() if shadows and self.shadows else []):
+            if shadow_version == version:
+                continue
+            # A shadow trained on other features uses them when they were built
+            cols = shadow_features if shadow_features and set(shadow_features) <= set(valid_df.columns) else features
+            try:
+                shadow_scores[shadow_version] = shadow_model.predict_proba(valid_df[cols])[:, 1]
+            except Exception as e:
+                print(f"[BRAIN] Shadow model {shadow_version} failed: {e}")
+        return valid_df, version, shadow_scores
+
+    def predict(self, df, history=None):
+        """
+        Takes a raw dataframe (formatted like TARGET CSV),
+        applies preprocessing, and returns predictions.
+        """
+        valid_df, _, _ = self._score(df, history)
+        if valid_df.empty:
+            print("[BRAIN] No valid rows for prediction (History missing?).")
+            return pd.DataFrame()
+
+        cols = ['Date', 'race_id', '馬番', 'ai_prob', 'ev', 'model_version']
+        return valid_df[[c for c in cols if c != 'race_id' or 'race_id' in valid_df.columns]]
+
+    @staticmethod
+    def _race_view(race_id, horse_num, odds, prob):
+        """Per-race normalization / ranks for one model's probabilities"""
+        out = pd.DataFrame({'race_id': race_id, 'horse_num': horse_num, 'odds': odds, 'ai_prob': prob})
+        by_race = out.groupby('race_id', sort=False)['ai_prob']
+        out['runners'] = by_race.transform('size')
+        out['prob_norm'] = out['ai_prob'] / by_race.transform('sum')
+        out['ev'] = out['ai_prob'] * out['odds']
+        out['ev_norm'] = out['prob_norm'] * out['odds']
+        out['prob_rank'] = by_race.rank(ascending=False, method='min').astype('Int16')
+        out['ev_rank'] = out.groupby('race_id', sort=False)['ev'].rank(ascending=False, method='min').astype('Int16')
+        return out
+
+    def _predict_day(self, frame, history, shadows):
+        missing = [c for c in ('race_id', '馬番') if c not in frame.columns]
+        if missing:
+            raise ValueError(f"predict_day needs columns {missing}")
+        scored, version, shadow_scores = self._score(frame.copy(), history, shadows)
+        race_id = scored['race_id'].astype(str)
+        horse_num = pd.to_numeric(scored['馬番'], errors='coerce').astype('Int16')
+        odds = pd.to_numeric(scored['単勝オッズ'], errors='coerce') if '単勝オッズ' in scored.columns else float('nan')
+        if len(scored) < len(frame):
+            print(f"[BRAIN] predict_day: {len(frame) - len(scored)} of {len(frame)} runners lack features (History missing?).")
+
+        prob = scored['ai_prob'] if 'ai_prob' in scored.columns else pd.Series(dtype=float)
+        out = self._race_view(race_id, horse_num, odds, prob)
+        out['model_version'] = version
+        day = out.set_index(['race_id', 'horse_num']).sort_index()
+
+        views = []
+        for shadow_version, shadow_prob in shadow_scores.items():
+            view = self._race_view(race_id, horse_num, odds, shadow_prob)
+            view['model_version'] = shadow_version
+            view['primary_prob'] = out['ai_prob'].to_numpy()
+            views.append(view)
+        shadow = (pd.concat(views).set_index(['model_version', 'race_id', 'horse_num']).sort_index()
+                  if views else pd.DataFrame())
+        return day, shadow
+
+    def predict_day(self, frame, history=None):
+        """
+        Scores every runner of every race in frame (TARGET columns + race_id,
+        one day) with a single predict_proba call, then post-processes per race.
+        Returns a frame indexed by (race_id, horse_num):
+            odds, ai_prob        model probability, ev = ai_prob * odds
+            prob_norm, ev_norm   probability normalized to sum to 1 within the race
+            prob_rank, ev_rank   1 = best in the race
+            runners              scored runners in the race
+            model_version
+        Runners without complete features are left out (as in predict).
+        """
+        return self._predict_day(frame, history, shadows=False)[0]
+
+    def predict_day_with_shadows(self, frame, history=None):
+        """
+        predict_day plus the shadow models' scores on the same feature rows:
+        (day, shadow). shadow has the same columns (+ primary_prob, the active
+        model's ai_prob), indexed by (model_version, race_id, horse_num);
+        empty when no shadow model is listed.
+        """
+        return self._predict_day(frame, history, shadows=True)
 
 if __name__ == "__main__":
     # Test Run
@@ -0,0 +1,212 @@
+"""
+Feature Matrix Cache
+====================
+The analysis scripts and save_final_model.py all start from the same frame:
+TARGET CSV -> process_features -> rows with features and a result -> is_win
+(-> model scores). This module builds that frame once and keeps it as
+Parquet under cache/features/, so later runs load it in seconds.
+
+Cache keys:
+    base   = hash(CSV file) + hash(preprocess.py, target_loader.py)   features + labels
+    scored = base + hash(model file)                                + ai_prob / ev
+A new model only re-scores the cached base frame; a new CSV or a change in
+the loading / feature code rebuilds it.
+
+Requirements:
+    - pyarrow (pip install pyarrow)
+
+Usage:
+    from local_engine.feature_cache import load_features
+    df, features = load_features(DATA_PATH, MODEL_PATH)   # scored
+    df, features = load_features(DATA_PATH)               # features + labels only
+
+    python local_engine/feature_cache.py --list
+    python local_engine/feature_cache.py --clear
+"""
+
+import os
+import sys
+import json
+import time
+import glob
+import hashlib
+import argparse
+import pandas as pd
+
+try:
+    from .preprocess import process_features
+    from .target_loader import load_target
+    from .tree_model import load_model
+    from .lowmem_features import build_features_lowmem
+except ImportError:
+    from preprocess import process_features
+    from target_loader import load_target
+    from tree_model import load_model
+    from lowmem_features import build_features_lowmem
+
+CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", os.path.join("cache", "features"))
+HASH_INDEX = "file_hashes.json"   # path -> (size, mtime, md5): skip re-hashing unchanged files
+
+
+def file_hash(path, cache_dir=CACHE_DIR):
+    """md5 of a file's content, remembered per (size, mtime)"""
+    stat = os.stat(path)
+    index_path = os.path.join(cache_dir, HASH_INDEX)
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    key = os.path.abspath(path)
+    entry = index.get(key)
+    if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry["md5"]
+
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    index[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "md5": h.hexdigest()}
+    os.makedirs(cache_dir, exist_ok=True)
+    _write_json(index_path, index)
+    return index[key]["md5"]
+
+
+VERSIONED_SOURCES = ("preprocess.py", "target_loader.py", "lowmem_features.py")
+# Raw columns the analysis scripts print, kept by the low-memory build
+LOW_MEMORY_KEEP = ("馬名", "人気順")
+
+
+def preprocess_version():
+    """Hash of the loading / feature code: any change invalidates the cache"""
+    h = hashlib.md5()
+    for name in VERSIONED_SOURCES:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:12]
+
+
+def cache_key(data_path, model_path=None, cache_dir=CACHE_DIR, low_memory=False):
+    key = f"{file_hash(data_path, cache_dir)[:12]}_{preprocess_version()}"
+    if low_memory:
+        key += "_lm"
+    if model_path:
+        key += f"_{file_hash(model_path, cache_dir)[:12]}"
+    return key
+
+
+def _write_json(path, obj):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def _paths(key, cache_dir):
+    base = os.path.join(cache_dir, key)
+    return base + ".parquet", base + ".json"
+
+
+def _read(key, cache_dir):
+    data_path, meta_path = _paths(key, cache_dir)
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return None, None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    return pd.read_parquet(data_path), meta
+
+
+def _write(df, key, meta, cache_dir):
+    """Parquet + metadata sidecar, each replaced atomically (meta last = commit)"""
+    os.makedirs(cache_dir, exist_ok=True)
+    data_path, meta_path = _paths(key, cache_dir)
+    # Object columns mixing numbers and strings cannot go to Arrow as is
+    for col in df.columns[df.dtypes == object]:
+        if pd.api.types.infer_dtype(df[col], skipna=True) not in ("string", "empty"):
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    df.to_parquet(data_path + ".tmp", index=False)
+    os.replace(data_path + ".tmp", data_path)
+    _write_json(meta_path, meta)
+
+
+def build_base(data_path, read_csv=None, low_memory=False):
+    """CSV -> (frame with features, 着順 and is_win, feature list)"""
+    if low_memory:
+        return build_features_lowmem(data_path, keep=LOW_MEMORY_KEEP)
+    df = load_target(data_path) if read_csv is None else read_csv(data_path)
+    df, features = process_features(df)
+    df = df.dropna(subset=features + ['着順']).reset_index(drop=True)
+    df['is_win'] = (df['着順'] <= 1).astype(int)
+    return df, features
+
+
+def score(df, features, model_path):
+    """Adds ai_prob and ev for the model at model_path"""
+    model = load_model(model_path)
+    df['ai_prob'] = model.predict_proba(df[features])[:, 1]
+    df['ev'] = df['ai_prob'] * df['単勝オッズ']
+    return df
+
+
+def load_features(data_path, model_path=None, cache_dir=CACHE_DIR, read_csv=None, refresh=False,
+                  low_memory=False):
+    """
+    (frame, feature list) for the TARGET CSV at data_path, from the cache when
+    the CSV, preprocess.py and the model are unchanged. With model_path the
+    frame also carries ai_prob and ev.
+    read_csv: optional loader (path -> DataFrame) used on a cache miss.
+    low_memory: build year by year in float32 (see lowmem_features); cached
+    separately from the default frame.
+    """
+    t0 = time.perf_counter()
+    key = cache_key(data_path, model_path, cache_dir, low_memory)
+    if not refresh:
+        df, meta = _read(key, cache_dir)
+        if df is not None:
+            print(f"[CACHE] Hit {key} ({len(df):,} rows, {time.perf_counter() - t0:.1f}s)")
+            return df, meta["features"]
+
+    base_key = cache_key(data_path, None, cache_dir, low_memory)
+    df, meta = (None, None) if refresh else _read(base_key, cache_dir)
+    if df is None:
+        print(f"[CACHE] Miss {base_key}: reading {data_path} and preprocessing...")
+        df, features = build_base(data_path, read_csv, low_memory)
+        meta = {"features": features, "data_path": os.path.abspath(data_path), "rows": len(df),
+                "preprocess": preprocess_version(), "built_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+        _write(df, base_key, meta, cache_dir)
+
+    if model_path:
+        print(f"[CACHE] Scoring with {model_path}...")
+        df = score(df, meta["features"], model_path)
+        meta = dict(meta, model_path=os.path.abspath(model_path), built_at=time.strftime("%Y-%m-%d %H:%M:%S"))
+        _write(df, key, meta, cache_dir)
+
+    print(f"[CACHE] Built {key} ({len(df):,} rows, {time.perf_counter() - t0:.1f}s)")
+    return df, meta["features"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect / clear the feature matrix cache")
+    parser.add_argument("--dir", default=CACHE_DIR, help="Cache directory")
+    parser.add_argument("--list", action="store_true", help="List cached frames")
+    parser.add_argument("--clear", action="store_true", help="Delete all cached frames")
+    args = parser.parse_args()
+
+    metas = sorted(glob.glob(os.path.join(args.dir, "*.json")))
+    metas = [m for m in metas if os.path.basename(m) != HASH_INDEX]
+    if args.clear:
+        for m in metas:
+            for path in (m, m[:-len(".json")] + ".parquet"):
+                if os.path.exists(path):
+                    os.remove(path)
+        print(f"[CACHE] Removed {len(metas)} frames.")
+        return
+    for m in metas:
+        with open(m, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        size = os.path.getsize(m[:-len(".json")] + ".parquet") / 1e6
+        print(f"{os.path.basename(m)[:-len('.json')]}  {meta['rows']:>10,} rows  {size:8.1f} MB  "
+              f"{meta['built_at']}  {os.path.basename(meta.get('model_path', '-'))}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
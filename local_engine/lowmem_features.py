@@ -0,0 +1,168 @@
+"""
+Low-Memory Feature Build
+========================
+build_base (feature_cache) holds the whole typed CSV, the sorted copy and
+every alias column next to its original at once. This builds the same
+training frame within a much smaller peak:
+
+    1. One chunked pass over the CSV reads only the columns process_features
+       needs (+ keep) and spills them by year to Parquet (temp dir)
+    2. Years are processed oldest first with process_features(low_memory=True):
+       float32 values, originals replaced by their cleaned columns
+    3. Each horse's last run of the previous years is carried over as a
+       horse_history-style frame, so the first run of a year gets its n-1 lags
+       (same values as processing all years together, at float32 precision)
+
+Only one year (plus the small carry-over) is in memory at a time; per-year
+rows, time, RSS and peak RSS are reported.
+
+Usage:
+    from local_engine.lowmem_features import build_features_lowmem
+    df, features = build_features_lowmem(DATA_PATH)            # like build_base
+    for year, df, features in iter_features_by_year(DATA_PATH):
+        ...
+
+    python local_engine/lowmem_features.py C:\\TFJV\\TXT\\20210101-20251231-2.csv --compare
+"""
+
+import os
+import glob
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+try:
+    from .preprocess import (process_features, group_starts, horse_ids, KEY_COLUMN, DATE_COLUMNS,
+                             RAW_COLUMNS, CURRENT_COLUMNS)
+    from .target_loader import iter_target, concat_chunks, report, CHUNK_ROWS
+    from .memstat import rss_mb, peak_rss_mb
+except ImportError:
+    from preprocess import (process_features, group_starts, horse_ids, KEY_COLUMN, DATE_COLUMNS,
+                            RAW_COLUMNS, CURRENT_COLUMNS)
+    from target_loader import iter_target, concat_chunks, report, CHUNK_ROWS
+    from memstat import rss_mb, peak_rss_mb
+
+SOURCE_COLUMNS = [KEY_COLUMN] + DATE_COLUMNS + list(RAW_COLUMNS) + list(CURRENT_COLUMNS)
+
+
+def _mb(value):
+    return f"{value:,.0f} MB" if value is not None else "n/a"
+
+
+def spill_by_year(path, spill_dir, keep=(), chunksize=CHUNK_ROWS):
+    """One chunked pass: spill_dir/<yy>/<chunk>.parquet per year; returns the 2-digit years"""
+    years = set()
+    usecols = SOURCE_COLUMNS + [c for c in keep if c not in SOURCE_COLUMNS]
+    for i, chunk in enumerate(iter_target(path, chunksize=chunksize, usecols=usecols)):
+        yy = chunk["年"].astype("Float64") % 100
+        for year, part in chunk.groupby(yy, sort=False):
+            year = int(year)
+            os.makedirs(os.path.join(spill_dir, f"{year:02d}"), exist_ok=True)
+            part.to_parquet(os.path.join(spill_dir, f"{year:02d}", f"{i:05d}.parquet"), index=False)
+            years.add(year)
+    return sorted(years)
+
+
+def _read_year(spill_dir, year):
+    files = sorted(glob.glob(os.path.join(spill_dir, f"{year:02d}", "*.parquet")))
+    return concat_chunks([pd.read_parquet(f) for f in files])
+
+
+def last_runs(df):
+    """Each horse's last run in a processed frame, as a history frame for fill_lags_from_history"""
+    ends = np.append(group_starts(df[KEY_COLUMN])[1:], True)
+    last = df[ends & df[KEY_COLUMN].notna().to_numpy()]
+    return pd.DataFrame({
+        "last_race_date": last["Date"].dt.strftime("%Y%m%d").to_numpy(),
+        "last_pci": last["PCI"].to_numpy(),
+        "last_3f": last["上り3F"].to_numpy(),
+        "last_rank": last["着順"].to_numpy(),
+    }, index=horse_ids(last[KEY_COLUMN]).to_numpy())
+
+
+def iter_features_by_year(path, years=None, keep=(), spill_dir=None, verbose=True):
+    """
+    (year, processed frame, feature list) per year, oldest first.
+    years: (first, last) inclusive, e.g. (2023, 2025); earlier years are still
+    processed (for the carried-over lags) but not yielded.
+    keep: extra CSV columns to keep (e.g. 馬名)
+    """
+    own_dir = spill_dir is None
+    spill_dir = spill_dir or tempfile.mkdtemp(prefix="lowmem_")
+    try:
+        t0 = time.perf_counter()
+        found = spill_by_year(path, spill_dir, keep)
+        if verbose:
+            print(f"[LOWMEM] Spilled {len(found)} years in {time.perf_counter() - t0:.1f}s | "
+                  f"RSS {_mb(rss_mb())} | peak {_mb(peak_rss_mb())}")
+        carry = None
+        for yy in found:
+            year = 2000 + yy
+            if years and year > years[1]:
+                break
+            t0 = time.perf_counter()
+            df, features = process_features(_read_year(spill_dir, yy), history=carry, low_memory=True, keep=keep)
+            new = last_runs(df)
+            carry = new if carry is None else pd.concat([carry[~carry.index.isin(new.index)], new])
+            if verbose:
+                print(f"[LOWMEM] {year}: {len(df):,} rows in {time.perf_counter() - t0:.1f}s | "
+                      f"carry {len(carry):,} horses | RSS {_mb(rss_mb())} | peak {_mb(peak_rss_mb())}")
+            if not years or year >= years[0]:
+                yield year, df, features
+    finally:
+        if own_dir:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+def build_features_lowmem(path, years=None, keep=(), verbose=True):
+    """Same rows as feature_cache.build_base (features, 着順, is_win), float32, year by year"""
+    t0 = time.perf_counter()
+    parts, features = [], None
+    for _, df, features in iter_features_by_year(path, years, keep, verbose=verbose):
+        df = df.dropna(subset=features + ["着順"])
+        df["is_win"] = (df["着順"] <= 1).astype("int8")
+        parts.append(df)
+    df = concat_chunks(parts).reset_index(drop=True) if parts else pd.DataFrame()
+    if verbose:
+        report("LOWMEM", df, time.perf_counter() - t0)
+    return df, features
+
+
+def _standard(path):
+    try:
+        from .feature_cache import build_base
+    except ImportError:
+        from feature_cache import build_base
+    t0 = time.perf_counter()
+    df, _ = build_base(path)
+    report("STANDARD", df, time.perf_counter() - t0)
+
+
+def _lowmem(path, years):
+    build_features_lowmem(path, years)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the training frame year by year within a small memory budget")
+    parser.add_argument("path", help="TARGET CSV export")
+    parser.add_argument("--years", help="Years to output, e.g. 2023-2025")
+    parser.add_argument("--compare", action="store_true",
+                        help="Also run the standard build (each in its own process, peak RSS is per process)")
+    args = parser.parse_args()
+    years = tuple(int(y) for y in args.years.split("-")) if args.years else None
+
+    if not args.compare:
+        build_features_lowmem(args.path, years)
+        return
+    import multiprocessing
+    for target, extra in ((_standard, ()), (_lowmem, (years,))):
+        proc = multiprocessing.Process(target=target, args=(args.path,) + extra)
+        proc.start()
+        proc.join()
+
+
+if __name__ == "__main__":
+    main()
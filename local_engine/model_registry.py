@@ -0,0 +1,330 @@
+"""
+Model Registry
+==============
+Versioned model directories with an active pointer, so a new model goes
+live without restarting the workers:
+
+    local_engine/models/
+        ACTIVE                  name of the live version (replaced atomically)
+        SHADOW                  versions scored next to it, one per line (never bet on)
+        20261019-153000/
+            model.pkl           pickled LGBMClassifier
+            model.trees/        tree_model export (inference without lightgbm)
+            meta.json           version, features, created_at, training info
+
+ActiveModel follows the pointer: current() stats ACTIVE and, when it changed,
+loads the new version completely before swapping it in, so a batch always
+sees one model. Without a registry (no ACTIVE yet) it serves
+local_engine/final_model.pkl as version "legacy-<md5>" and reloads it when
+the file is replaced. ShadowModels follows
+SHADOW the same way and keeps already loaded versions across list changes.
+
+Usage:
+    python local_engine/model_registry.py list
+    python local_engine/model_registry.py register local_engine/final_model.pkl --activate
+    python local_engine/model_registry.py activate 20261019-153000
+    python local_engine/model_registry.py shadow add 20261101-090000
+
+    from local_engine.model_registry import active_model
+    version, model = active_model().current()   # Reloads if ACTIVE moved
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import threading
+
+try:
+    from .tree_model import MODEL_PATH as LEGACY_MODEL_PATH, load_model, export_model, artifact_path, file_md5
+except ImportError:
+    from tree_model import MODEL_PATH as LEGACY_MODEL_PATH, load_model, export_model, artifact_path, file_md5
+
+REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR",
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"))
+POINTER = "ACTIVE"
+SHADOW = "SHADOW"
+MODEL_FILE = "model.pkl"
+META_FILE = "meta.json"
+
+
+def _write_atomic(path, text):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def version_dir(version, registry_dir=REGISTRY_DIR):
+    return os.path.join(registry_dir, version)
+
+
+def read_meta(version, registry_dir=REGISTRY_DIR):
+    with open(os.path.join(version_dir(version, registry_dir), META_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def list_versions(registry_dir=REGISTRY_DIR):
+    """Complete versions (meta.json written), oldest first"""
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(v for v in os.listdir(registry_dir)
+                  if os.path.exists(os.path.join(registry_dir, v, META_FILE)))
+
+
+def active_version(registry_dir=REGISTRY_DIR):
+    try:
+        with open(os.path.join(registry_dir, POINTER), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def activate(version, registry_dir=REGISTRY_DIR):
+    """Point ACTIVE at version (running ActiveModels pick it up on their next batch)"""
+    if version not in list_versions(registry_dir):
+        raise ValueError(f"Unknown model version '{version}' in {registry_dir}")
+    _write_atomic(os.path.join(registry_dir, POINTER), version + "\n")
+    print(f"[REGISTRY] Active model -> {version}")
+
+
+def shadow_versions(registry_dir=REGISTRY_DIR):
+    """Versions listed in SHADOW, in order"""
+    try:
+        with open(os.path.join(registry_dir, SHADOW), "r", encoding="utf-8") as f:
+            return list(dict.fromkeys(line.strip() for line in f if line.strip()))
+    except FileNotFoundError:
+        return []
+
+
+def set_shadows(versions, registry_dir=REGISTRY_DIR):
+    """Replace the shadow list (running ShadowModels pick it up on their next batch)"""
+    versions = list(dict.fromkeys(versions))
+    unknown = [v for v in versions if v not in list_versions(registry_dir)]
+    if unknown:
+        raise ValueError(f"Unknown model version(s) {', '.join(unknown)} in {registry_dir}")
+    _write_atomic(os.path.join(registry_dir, SHADOW), "".join(v + "\n" for v in versions))
+    print(f"[REGISTRY] Shadow models -> {', '.join(versions) or '(none)'}")
+
+
+def register(model_path, features=None, version=None, info=None, activate_now=False,
+             registry_dir=REGISTRY_DIR):
+    """
+    Copy a pickled model into a new version directory (+ NumPy export when
+    lightgbm is available); meta.json is written last. Returns the version.
+    """
+    version = version or datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    out = version_dir(version, registry_dir)
+    if os.path.exists(out):
+        raise ValueError(f"Model version '{version}' already exists")
+    os.makedirs(out)
+    target = os.path.join(out, MODEL_FILE)
+    shutil.copy2(model_path, target)
+    try:
+        export_model(target)
+    except (ImportError, ValueError) as e:
+        print(f"[REGISTRY] No NumPy export ({e}); the version loads through joblib")
+
+    if features is None:
+        trees_meta = os.path.join(artifact_path(target), "meta.json")
+        if os.path.exists(trees_meta):
+            with open(trees_meta, "r", encoding="utf-8") as f:
+                features = json.load(f)["features"]
+    meta = {
+        "version": version,
+        "features": list(features or []),
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "source": os.path.abspath(model_path),
+        "md5": file_md5(target),
+        "info": info or {},
+    }
+    _write_atomic(os.path.join(out, META_FILE), json.dumps(meta, ensure_ascii=False, indent=1, default=str))
+    print(f"[REGISTRY] Registered {version} ({len(meta['features'])} features)")
+    if activate_now:
+        activate(version, registry_dir)
+    return version
+
+
+def _file_stamp(path):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except FileNotFoundError:
+        return None
+
+
+class ActiveModel:
+    """
+    The model ACTIVE points at, reloaded when the pointer changes.
+    model_path pins a fixed file instead (no registry), reloaded when replaced.
+    """
+
+    def __init__(self, registry_dir=REGISTRY_DIR, model_path=None):
+        self.registry_dir = registry_dir
+        self.model_path = model_path
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._checked = False
+        self._state = (None, None)   # (version, model): swapped as one tuple
+
+    def _pointer_stamp(self):
+        """What current() watches: the ACTIVE pointer, else the served file itself"""
+        if self.model_path:
+            return _file_stamp(self.model_path)
+        pointer = _file_stamp(os.path.join(self.registry_dir, POINTER))
+        if pointer is not None:
+            return pointer
+        # Legacy final_model.pkl: replacing the file is the "activation"
+        return ("legacy", _file_stamp(LEGACY_MODEL_PATH))
+
+    def _resolve(self):
+        """(version, model file) to serve"""
+        if self.model_path:
+            return f"file-{file_md5(self.model_path)[:8]}", self.model_path
+        version = active_version(self.registry_dir)
+        if version:
+            return version, os.path.join(version_dir(version, self.registry_dir), MODEL_FILE)
+        if os.path.exists(LEGACY_MODEL_PATH):
+            return f"legacy-{file_md5(LEGACY_MODEL_PATH)[:8]}", LEGACY_MODEL_PATH
+        return None, None
+
+    def current(self):
+        """(version, model); (None, None) when there is no model. Cheap when nothing changed."""
+        stamp = self._pointer_stamp()
+        if self._checked and stamp == self._stamp:
+            return self._state
+        with self._lock:
+            if self._checked and stamp == self._stamp:
+                return self._state
+            version, path = self._resolve()
+            if version is not None and version != self._state[0]:
+                t0 = time.perf_counter()
+                try:
+                    self._state = (version, load_model(path))
+                    print(f"[REGISTRY] Loaded model {version} ({time.perf_counter() - t0:.2f}s)")
+                except Exception as e:
+                    # Keep serving the previous model; retried when ACTIVE changes again
+                    print(f"[REGISTRY] Failed to load {version}: {e}")
+            self._stamp = stamp
+            self._checked = True
+            return self._state
+
+    @property
+    def version(self):
+        return self.current()[0]
+
+
+class ShadowModels:
+    """
+    The models SHADOW lists, reloaded when the list changes. Scored on the
+    same features as the active model for comparison; they never drive bets.
+    """
+
+    def __init__(self, registry_dir=REGISTRY_DIR):
+        self.registry_dir = registry_dir
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._checked = False
+        self._models = []    # [(version, model, features)]: swapped as one list
+
+    def current(self):
+        """[(version, model, features from meta.json or None)]. Cheap when nothing changed."""
+        stamp = _file_stamp(os.path.join(self.registry_dir, SHADOW))
+        if self._checked and stamp == self._stamp:
+            return self._models
+        with self._lock:
+            if self._checked and stamp == self._stamp:
+                return self._models
+            loaded = {version: entry for version, *entry in self._models}
+            models = []
+            for version in shadow_versions(self.registry_dir):
+                if version in loaded:
+                    models.append((version, *loaded[version]))
+                    continue
+                try:
+                    model = load_model(os.path.join(version_dir(version, self.registry_dir), MODEL_FILE))
+                    features = read_meta(version, self.registry_dir).get("features") or None
+                    models.append((version, model, features))
+                    print(f"[REGISTRY] Loaded shadow model {version}")
+                except Exception as e:
+                    # Skipped until the list changes again
+                    print(f"[REGISTRY] Failed to load shadow model {version}: {e}")
+            self._models = models
+            self._stamp = stamp
+            self._checked = True
+            return models
+
+
+_shared = None
+_shared_shadows = None
+_shared_lock = threading.Lock()
+
+
+def active_model():
+    """Process-wide ActiveModel for REGISTRY_DIR (Brain, worker_predict and app share one load)"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = ActiveModel()
+        return _shared
+
+
+def shadow_models():
+    """Process-wide ShadowModels for REGISTRY_DIR"""
+    global _shared_shadows
+    with _shared_lock:
+        if _shared_shadows is None:
+            _shared_shadows = ShadowModels()
+        return _shared_shadows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Versioned model registry")
+    parser.add_argument("--dir", default=REGISTRY_DIR, help="Registry directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="List versions")
+    reg = sub.add_parser("register", help="Add a pickled model as a new version")
+    reg.add_argument("model", help="Pickled model (e.g. local_engine/final_model.pkl)")
+    reg.add_argument("--version", help="Version name (default: timestamp)")
+    reg.add_argument("--activate", action="store_true", help="Make it the active version")
+    act = sub.add_parser("activate", help="Switch the active version")
+    act.add_argument("version")
+    sh = sub.add_parser("shadow", help="Show / change the shadow models")
+    sh.add_argument("action", nargs="?", choices=["list", "add", "remove", "clear"], default="list")
+    sh.add_argument("versions", nargs="*")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "register":
+            register(args.model, version=args.version, activate_now=args.activate, registry_dir=args.dir)
+        elif args.command == "activate":
+            activate(args.version, args.dir)
+        elif args.command == "shadow" and args.action != "list":
+            current = shadow_versions(args.dir)
+            if args.action == "add":
+                set_shadows(current + args.versions, args.dir)
+            elif args.action == "remove":
+                set_shadows([v for v in current if v not in args.versions], args.dir)
+            else:
+                set_shadows([], args.dir)
+        elif args.command == "shadow":
+            print("\n".join(shadow_versions(args.dir)) or "(no shadow models)")
+        else:
+            active = active_version(args.dir)
+            shadows = set(shadow_versions(args.dir))
+            for v in list_versions(args.dir):
+                meta = read_meta(v, args.dir)
+                mark = "*" if v == active else "s" if v in shadows else " "
+                print(f"{mark} {v}  {meta['created_at']}  "
+                      f"{len(meta['features'])} features  {meta.get('info', {})}")
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,71 +1,254 @@
+import re
+import sys
 import pandas as pd
 import numpy as np
 
+FULLWIDTH_DIGITS = str.maketrans('０１２３４５６７８９', '0123456789')
+
 def clean_numeric(x):
     """
     Cleans Japanese numeric strings (full-width to half-width) and converts to float.
     """
     if isinstance(x, str):
-        x = x.translate(str.maketrans('０１２３４５６７８９', '0123456789'))
+        x = x.translate(FULLWIDTH_DIGITS)
         x = ''.join(c for c in x if c.isdigit() or c == '.')
     try:
         return float(x)
     except:
         return np.nan
 
-def process_features(df):
+# What float() accepts once clean_numeric has stripped a string to ASCII digits and dots
+_ASCII_FLOAT = r'^(?:[0-9]+\.?[0-9]*|\.[0-9]+)$'
+_strip_pattern = None
+
+def _strip_regex():
+    """
+    Matches every character clean_numeric drops. str.isdigit() is wider than
+    regex \\d (superscripts, circled digits), so the kept set is built from it.
+    """
+    global _strip_pattern
+    if _strip_pattern is None:
+        extra = ''.join(chr(i) for i in range(0x80, sys.maxunicode + 1) if chr(i).isdigit())
+        _strip_pattern = re.compile('[^0-9.' + re.escape(extra) + ']')
+    return _strip_pattern
+
+def _clean_values(obj):
+    """clean_numeric over a 1-D object array, string cells via column-wide string ops"""
+    values = np.full(len(obj), np.nan)
+    is_str = np.fromiter((type(v) is str for v in obj), dtype=bool, count=len(obj))
+
+    # Non-string cells (numbers, None, NaN) keep float() semantics
+    others = np.flatnonzero(~is_str)
+    if len(others):
+        values[others] = [clean_numeric(v) for v in obj[others]]
+
+    if is_str.any():
+        cleaned = pd.Series(obj[is_str], dtype=object).str.translate(FULLWIDTH_DIGITS) \
+                                                      .str.replace(_strip_regex(), '', regex=True)
+        ascii_ok = cleaned.str.match(_ASCII_FLOAT).to_numpy(dtype=bool)
+        parsed = np.full(len(cleaned), np.nan)
+        parsed[ascii_ok] = cleaned.to_numpy()[ascii_ok].astype('float64')
+        # Rejected strings are either unparseable (NaN) or contain non-ASCII digits
+        rest = np.flatnonzero(~ascii_ok & cleaned.str.contains(r'[^0-9.]').to_numpy(dtype=bool))
+        if len(rest):
+            parsed[rest] = [clean_numeric(v) for v in cleaned.to_numpy()[rest]]
+        values[is_str] = parsed
+    return values
+
+def clean_numeric_series(s):
+    """
+    Vectorized clean_numeric over a whole column (same values, float64).
+    TARGET columns repeat a small set of values, so the column is factorized
+    and only the distinct values are cleaned, then mapped back by code.
+    """
+    if pd.api.types.is_bool_dtype(s.dtype) or pd.api.types.is_numeric_dtype(s.dtype):
+        if isinstance(s.dtype, np.dtype):
+            return s.astype('float64')
+        # Nullable extension types: float(pd.NA) fails, so NA -> NaN
+        return pd.Series(s.to_numpy(dtype='float64', na_value=np.nan), index=s.index, name=s.name)
+
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes, uniques = s.cat.codes.to_numpy(), s.cat.categories
+    else:
+        codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    cleaned = _clean_values(np.asarray(uniques, dtype=object))
+    values = np.where(codes >= 0, cleaned[codes] if len(cleaned) else np.nan, np.nan)
+    return pd.Series(values, index=s.index, name=s.name, dtype='float64')
+
+# Lag feature -> (source column, runs back)
+LAGS = {'Prev_PCI': ('PCI', 1), 'Prev_3F': ('上り3F', 1), 'Prev_Rank': ('着順', 1)}
+
+def group_starts(keys):
+    """
+    Key column of a frame sorted by it -> bool array, True on the first row of
+    each group. Missing keys are groups of their own (groupby drops them, so
+    their lags stay empty either way).
+    """
+    values = keys.to_numpy() if hasattr(keys, 'to_numpy') else np.asarray(keys)
+    if not (isinstance(values.dtype, np.dtype) and values.dtype.kind in 'iufb'):
+        values = pd.factorize(values, use_na_sentinel=True)[0]
+        missing = values < 0
+    else:
+        missing = np.isnan(values) if values.dtype.kind == 'f' else None
+    starts = np.ones(len(values), dtype=bool)
+    starts[1:] = values[1:] != values[:-1]
+    if missing is not None:
+        starts |= missing
+    return starts
+
+def group_positions(starts):
+    """Row index within its group (0 on the first row)"""
+    idx = np.arange(len(starts))
+    return idx - np.maximum.accumulate(np.where(starts, idx, 0))
+
+def lag_values(values, pos, n):
+    """values shifted down by n runs, NaN where the group has no n-th earlier run"""
+    out = np.full(len(values), np.nan)
+    if n < len(values):
+        out[n:] = values[:len(values) - n]
+    out[pos < n] = np.nan
+    return out
+
+def add_lag_features(df, key, lags=LAGS, means=None, dtype='float64'):
+    """
+    Lag columns for a frame sorted by (key, Date), from one pass over the key:
+    group boundaries are found once and every lag is a shifted copy of its
+    source column with the first n rows of each group masked out.
+
+    lags:  {column: (source, n)}       n-th previous run (groupby(key).shift(n))
+    means: {column: (source, window)}  mean of the previous `window` runs,
+           missing values skipped (shift(1).rolling(window, min_periods=1).mean())
+    dtype: of the new columns (float32 in low-memory mode)
+    """
+    pos = group_positions(group_starts(df[key]))
+    shifted = {}
+
+    def lag(source, n):
+        if (source, n) not in shifted:
+            values = df[source].to_numpy(dtype='float64', na_value=np.nan)
+            shifted[(source, n)] = lag_values(values, pos, n)
+        return shifted[(source, n)]
+
+    new = {}
+    for col, (source, n) in lags.items():
+        new[col] = lag(source, n)
+    for col, (source, window) in (means or {}).items():
+        total = np.zeros(len(df))
+        count = np.zeros(len(df))
+        for n in range(1, window + 1):
+            values = lag(source, n)
+            ok = ~np.isnan(values)
+            total[ok] += values[ok]
+            count += ok
+        with np.errstate(invalid='ignore', divide='ignore'):
+            new[col] = np.where(count > 0, total / count, np.nan)
+    for col, values in new.items():
+        df[col] = values.astype(dtype, copy=False)
+    return df
+
+# horse_history column -> lag feature
+HISTORY_LAGS = {'last_pci': 'Prev_PCI', 'last_3f': 'Prev_3F', 'last_rank': 'Prev_Rank'}
+
+def horse_ids(s):
+    """血統登録番号 column -> 10-digit string keys (as in horse_history)"""
+    if pd.api.types.is_numeric_dtype(s.dtype):
+        s = s.astype('Int64')
+    return s.astype('string').str.strip().str.zfill(10)
+
+def fill_lags_from_history(df, history):
+    """
+    Fills lag features that shift(1) left empty (no earlier row in df) from the
+    feature store: history is indexed by horse_id with last_race_date and the
+    HISTORY_LAGS columns. Only runs dated before the row are used, and only a
+    horse's first row in df (later rows already have their lag, even if empty).
+    df must be sorted by (血統登録番号, Date).
+    """
+    ids = horse_ids(df['血統登録番号'])
+    last_date = pd.to_datetime(ids.map(history['last_race_date']), format='%Y%m%d', errors='coerce')
+    usable = (last_date < df['Date']).to_numpy(dtype=bool) & group_starts(df['血統登録番号'])
+    for col, lag in HISTORY_LAGS.items():
+        if col in history.columns:
+            stored = pd.to_numeric(ids.map(history[col]), errors='coerce').astype(df[lag].dtype)
+            df[lag] = df[lag].where(df[lag].notna() | ~usable, stored)
+    return df
+
+# Source column -> cleaned column process_features works with
+RAW_COLUMNS = {'PCI': 'PCI', '上がり3Fタイム': '上り3F', '確定着順': '着順'}
+CURRENT_COLUMNS = {'人気順': '人気', '単勝オッズ': '単勝オッズ', '頭数': '頭数', '馬番': '馬番', '斤量': '斤量'}
+DATE_COLUMNS = ['年', '月', '日']
+KEY_COLUMN = '血統登録番号'
+
+def _compact(df, keep=()):
+    """
+    Low-memory input: only the columns process_features reads (+ keep), Date
+    built numerically from 年 / 月 / 日, every source column cleaned to float32
+    under its feature name with the original dropped (unless in keep).
+    """
+    sources = [KEY_COLUMN, 'Date'] + DATE_COLUMNS + list(RAW_COLUMNS) + list(CURRENT_COLUMNS)
+    df = df[[c for c in dict.fromkeys(sources + list(keep)) if c in df.columns]]
+    if 'Date' not in df.columns and set(DATE_COLUMNS).issubset(df.columns):
+        parts = {k: df[c].to_numpy(dtype='float64', na_value=np.nan) for k, c in zip(('year', 'month', 'day'), DATE_COLUMNS)}
+        parts['year'] = 2000 + parts['year'] % 100   # 年 is 2-digit (%y)
+        df['Date'] = pd.to_datetime(pd.DataFrame(parts), errors='coerce')
+    for orig, alias in {**RAW_COLUMNS, **CURRENT_COLUMNS}.items():
+        if orig in df.columns:
+            values = clean_numeric_series(df[orig]).astype('float32')
+            if orig not in keep:
+                del df[orig]
+            df[alias] = values
+    return df.drop(columns=[c for c in DATE_COLUMNS if c in df.columns and c not in keep])
+
+def process_features(df, history=None, low_memory=False, keep=()):
     """
     Applies the exact feature engineering logic used in the winning model (Pattern C).
     Includes:
     - n-1 Lag Features (Prev_PCI, Prev_3F, Prev_Rank)
     - Current Race Conditions (Odds, Pop, Weight, etc.)
+
+    history: optional horse_history frame (see fill_lags_from_history) so
+    today's runners get lag features without concatenating their past races.
+    low_memory: keep only the needed columns (+ keep), replace source columns
+    by their cleaned float32 versions and sort without keeping the old index.
+    Values match the default path at float32 precision.
     """
-    # 1. Date Construction (if not already datetime)
-    if 'Date' not in df.columns:
-        if {'年', '月', '日'}.issubset(df.columns):
-            df['Date'] = pd.to_datetime(df['年'].astype(str).str.zfill(2) + 
-                                        df['月'].astype(str).str.zfill(2) + 
-                                        df['日'].astype(str).str.zfill(2), format='%y%m%d')
-        else:
-            # Assume 'Timestamp' or similar if coming from API, but for CSV flow:
-            pass
-
-    # 2. Clean Raw Columns (Numeric Conversion)
-    raw_cols = {
-        'PCI': 'PCI', 
-        '上り3F': '上がり3Fタイム', 
-        '着順': '確定着順'
-    }
-    for alias, orig in raw_cols.items():
-        if orig in df.columns:
-            df[alias] = df[orig].apply(clean_numeric)
+    if low_memory:
+        df = _compact(df, keep)
+    else:
+        # 1. Date Construction (if not already datetime)
+        if 'Date' not in df.columns:
+            if {'年', '月', '日'}.issubset(df.columns):
+                df['Date'] = pd.to_datetime(df['年'].astype(str).str.zfill(2) + 
+                                            df['月'].astype(str).str.zfill(2) + 
+                                            df['日'].astype(str).str.zfill(2), format='%y%m%d')
+            else:
+                # Assume 'Timestamp' or similar if coming from API, but for CSV flow:
+                pass
+
+        # 2. Clean Raw Columns (Numeric Conversion)
+        for orig, alias in RAW_COLUMNS.items():
+            if orig in df.columns:
+                df[alias] = clean_numeric_series(df[orig])
 
     # 3. Valid Horse ID Check
-    if '血統登録番号' not in df.columns:
+    if KEY_COLUMN not in df.columns:
         raise ValueError("Horse ID '血統登録番号' missing. Cannot calculate lag features.")
 
     # 4. Sort for Shift (Time-Series)
     # Ensure stable sort
-    df = df.sort_values(['血統登録番号', 'Date'])
+    df = df.sort_values([KEY_COLUMN, 'Date'], ignore_index=low_memory)
 
     # 5. Create Lag Features (Shift 1 -> n-1)
     # This assumes the dataframe contains PAST history for the horses.
     # For a "Single Race Prediction" in production, we must fetch history first.
-    df['Prev_PCI'] = df.groupby('血統登録番号')['PCI'].shift(1)
-    df['Prev_3F'] = df.groupby('血統登録番号')['上り3F'].shift(1)
-    df['Prev_Rank'] = df.groupby('血統登録番号')['着順'].shift(1)
+    df = add_lag_features(df, KEY_COLUMN, LAGS, dtype='float32' if low_memory else 'float64')
+    if history is not None and not history.empty:
+        df = fill_lags_from_history(df, history)
 
     # 6. Current info (Known before race)
-    feature_mapping = {
-        '人気': '人気順',
-        '単勝オッズ': '単勝オッズ',
-        '頭数': '頭数',
-        '馬番': '馬番',
-        '斤量': '斤量'
-    }
     current_features = []
-    for alias, original in feature_mapping.items():
-            df[alias] = df[original].apply(clean_numeric)
+    for original, alias in CURRENT_COLUMNS.items():
+            if not low_memory:   # Already cleaned by _compact
+                df[alias] = clean_numeric_series(df[original])
             current_features.append(alias)
 
     # 7. V3 New Feature: Odds Divergence Proxy (Odds / Popularity)
@@ -1,63 +1,62 @@
-import pandas as pd
-import lightgbm as lgb
 import joblib
 import sys
 import os
-from preprocess import process_features
+import argparse
+from train_pipeline import train, commit
+from tree_model import export_model
+from model_registry import register
 
 # Config
 DATA_PATH = r"C:\TFJV\TXT\20210101-20251231-2.csv"
 MODEL_PATH = r"final_model.pkl"
+# 2021-2024: 2025 is the evaluation period of analyze_backtest / simulate_funds
+TRAIN_UNTIL = "202412"
 
-def train_and_save():
+def train_and_save(full=False, first=None, until=TRAIN_UNTIL, activate=False):
     print(f"Loading data from {DATA_PATH}...")
     try:
-        df = pd.read_csv(DATA_PATH, encoding='cp932', low_memory=False)
+        # Shared logic: process_features, valid training rows only (must have
+        # history and '着順'), is_win target. Processed rows are cached per month
+        # and only new rows are trained on (warm start) when nothing else changed.
+        result = train(DATA_PATH, MODEL_PATH, first=first, until=until, full=full)
     except Exception as e:
-        print(f"Error loading CSV: {e}")
+        print(f"Error training model: {e}")
         return
 
-    print("Preprocessing...")
-    # Apply shared logic
-    df, features = process_features(df)
-    
-    # Filter for Valid Training Rows (Must have history)
-    df = df.dropna(subset=features + ['着順']) # '着順' is needed for target
-    
-    # Create Target
-    # Note: '着順' was cleaned in process_features if it existed as '確定着順' mapping
-    # But let's verify. process_features maps '着順' -> '確定着順' cleaned.
-    # Actually process_features updates 'PCI', '上り3F', '着順' columns.
-    df['target'] = df['着順'].apply(lambda x: 1 if x <= 1 else 0)
-
-    # Train/Test Split logic from Simulation
-    # Train on 2021-2024 (to reproduce the "Brain" that won in 2025)
-    train_df = df[df['Date'].dt.year < 2025]
-    print(f"Training Data: {len(train_df)} rows (2021-2024)")
-
-    if train_df.empty:
-        print("Error: No training data found.")
+    if result is None:
         return
+    model, features = result["model"], result["features"]
 
-    # Train Model
-    print("Training LightGBM...")
-    model = lgb.LGBMClassifier(
-        n_estimators=100, 
-        learning_rate=0.05, 
-        num_leaves=31, 
-        random_state=42
-    )
-    model.fit(train_df[features], train_df['target'])
-    
     # Save
     joblib.dump(model, MODEL_PATH)
-    print(f"✅ Model saved to {MODEL_PATH}")
+    commit(result, MODEL_PATH)
+    print(f"✅ Model saved to {MODEL_PATH} ({result['mode']} fit, {result['rows']:,} rows)")
+    # NumPy export for inference without lightgbm (Brain / app / workers)
+    export_model(MODEL_PATH)
+    # New registry version; with --activate running workers switch to it on their next batch
+    version = register(MODEL_PATH, features, activate_now=activate, info={
+        "mode": result["mode"],
+        "train_rows": result["rows"],
+        "train_months": result["months"],
+        "params": model.get_params(),
+        "timings": result["timings"],
+        "window": result["state"]["window"],
+    })
+    if not activate:
+        print(f"Not activated; go live with: python model_registry.py activate {version}")
     
     # Verify validity with a quick check
     print("Verifying model...")
-    test_sample = train_df[features].head(1)
-    pred = model.predict_proba(test_sample)
+    pred = model.predict_proba(result["sample"])
     print(f"Sample Prediction: {pred}")
 
 if __name__ == "__main__":
-    train_and_save()
+    parser = argparse.ArgumentParser(description="Train / refresh final_model.pkl")
+    parser.add_argument("--full", action="store_true", help="Full fit instead of a warm start")
+    parser.add_argument("--from", dest="first", help="First training month YYYYMM (default: start of the export)")
+    parser.add_argument("--until", default=TRAIN_UNTIL,
+                        help=f"Last training month YYYYMM, 'all' for the whole export (default: {TRAIN_UNTIL})")
+    parser.add_argument("--activate", action="store_true", help="Make the new model the active registry version")
+    args = parser.parse_args()
+    until = None if args.until == "all" else args.until
+    train_and_save(full=args.full, first=args.first, until=until, activate=args.activate)
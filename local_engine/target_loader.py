@@ -0,0 +1,171 @@
+"""
+TARGET CSV Loader
+=================
+Typed, column-projected reading of the TARGET frontier JV CSV export
+(cp932). Plain pd.read_csv(low_memory=False) materializes every column as
+Python objects; process_features and the reports use about a dozen.
+
+    - Only COLUMNS (+ any extra ones asked for) are parsed
+    - Names (馬名, 騎手, レース名 ...) are categoricals
+    - Dates, ranks and numbers become the smallest nullable int that fits
+      (values as clean_numeric sees them, so process_features is unchanged)
+    - Decimal columns keep read_csv's own float parsing
+    - Optional chunked / year-filtered reading (years=(2021, 2024))
+
+Usage:
+    from local_engine.target_loader import load_target
+    df = load_target(DATA_PATH)                        # Whole file
+    df = load_target(DATA_PATH, years=(2021, 2024))    # Chunked, filtered
+
+    python local_engine/target_loader.py C:\\TFJV\\TXT\\20210101-20251231-2.csv --compare
+"""
+
+import time
+import argparse
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+try:
+    from .preprocess import clean_numeric_series
+    from .memstat import peak_rss_mb
+except ImportError:
+    from preprocess import clean_numeric_series
+    from memstat import peak_rss_mb
+
+ENCODING = "cp932"
+CHUNK_ROWS = 250_000
+
+# Cleaned to small ints
+INT_COLUMNS = ["年", "月", "日", "確定着順", "人気順", "頭数", "馬番"]
+# Left to read_csv (float64, or text cleaned later by process_features)
+FLOAT_COLUMNS = ["PCI", "上がり3Fタイム", "単勝オッズ", "斤量"]
+# Kept as categoricals
+CATEGORY_COLUMNS = ["馬名", "騎手", "レース名", "グレード", "場所"]
+# Inferred by read_csv (10-digit numbers)
+KEY_COLUMNS = ["血統登録番号"]
+
+COLUMNS = KEY_COLUMNS + INT_COLUMNS + FLOAT_COLUMNS + CATEGORY_COLUMNS
+
+
+def _small_int(s):
+    """clean_numeric values as Int8 / Int16 / Int32 when all integral, else float64"""
+    values = clean_numeric_series(s)
+    valid = values.dropna()
+    if (valid % 1 != 0).any():
+        return values
+    lo, hi = (valid.min(), valid.max()) if len(valid) else (0, 0)
+    for dtype, bound in (("Int8", 2**7), ("Int16", 2**15), ("Int32", 2**31)):
+        if -bound <= lo and hi < bound:
+            return values.astype(dtype)
+    return values
+
+
+def _typed(chunk):
+    # Converting after the parse is faster than dtype='category' in read_csv
+    for col in INT_COLUMNS:
+        if col in chunk.columns:
+            chunk[col] = _small_int(chunk[col])
+    for col in CATEGORY_COLUMNS:
+        if col in chunk.columns:
+            chunk[col] = chunk[col].astype("category")
+    return chunk
+
+
+def _year_mask(df, years):
+    first, last = years
+    yy = df["年"].astype("Float64") % 100
+    return ((yy >= first % 100) & (yy <= last % 100)).fillna(False).to_numpy(dtype=bool)
+
+
+def concat_chunks(chunks):
+    """concat that keeps categoricals (categories differ between chunks)"""
+    if not chunks:
+        return pd.DataFrame()
+    if len(chunks) == 1:
+        return chunks[0]
+    cats = [c for c in chunks[0].columns if isinstance(chunks[0][c].dtype, pd.CategoricalDtype)]
+    merged = {c: union_categoricals([ch[c] for ch in chunks]) for c in cats}
+    df = pd.concat([ch.drop(columns=cats) for ch in chunks], ignore_index=True)
+    for c in cats:
+        df[c] = merged[c]
+    return df[chunks[0].columns]
+
+
+def _read_args(columns, usecols=None):
+    wanted = set(usecols) if usecols else set(COLUMNS) | set(columns or [])
+    return {"encoding": ENCODING, "usecols": lambda c: c in wanted}
+
+
+def iter_target(path, columns=None, years=None, chunksize=CHUNK_ROWS, usecols=None):
+    """
+    Typed frames of up to chunksize rows (only rows in years, if given).
+    usecols: exact columns to read instead of COLUMNS + columns
+    """
+    with pd.read_csv(path, chunksize=chunksize, **_read_args(columns, usecols)) as reader:
+        for chunk in reader:
+            chunk = _typed(chunk)
+            if years:
+                chunk = chunk[_year_mask(chunk, years)]
+            yield chunk
+
+
+def load_target(path, columns=None, years=None, chunksize=None, verbose=True):
+    """
+    TARGET CSV -> typed frame.
+    columns: extra columns to keep besides COLUMNS
+    years: (first, last) inclusive, e.g. (2021, 2024); reads in chunks
+    chunksize: rows per chunk (bounds parser memory on big files)
+    """
+    t0 = time.perf_counter()
+    if years or chunksize:
+        df = concat_chunks(list(iter_target(path, columns, years, chunksize or CHUNK_ROWS)))
+    else:
+        df = _typed(pd.read_csv(path, **_read_args(columns)))
+    if verbose:
+        report("LOAD", df, time.perf_counter() - t0)
+    return df
+
+
+def report(label, df, seconds):
+    frame_mb = df.memory_usage(deep=True).sum() / 2**20
+    peak = peak_rss_mb()
+    peak_str = f"{peak:,.0f} MB" if peak is not None else "n/a"
+    print(f"[{label}] {len(df):,} rows x {df.shape[1]} cols in {seconds:.1f}s | "
+          f"frame {frame_mb:,.0f} MB | peak RSS {peak_str}")
+
+
+def _plain_read(path):
+    t0 = time.perf_counter()
+    df = pd.read_csv(path, encoding=ENCODING, low_memory=False)
+    report("PLAIN", df, time.perf_counter() - t0)
+
+
+def _typed_read(path, years, chunksize):
+    t0 = time.perf_counter()
+    df = load_target(path, years=years, chunksize=chunksize, verbose=False)
+    report("TYPED", df, time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load the TARGET CSV with the typed loader")
+    parser.add_argument("path", help="TARGET CSV export")
+    parser.add_argument("--years", help="Year range, e.g. 2021-2024")
+    parser.add_argument("--chunksize", type=int, help="Rows per chunk")
+    parser.add_argument("--compare", action="store_true",
+                        help="Also time plain read_csv (each loader in its own process)")
+    args = parser.parse_args()
+    years = tuple(int(y) for y in args.years.split("-")) if args.years else None
+
+    if not args.compare:
+        load_target(args.path, years=years, chunksize=args.chunksize)
+        return
+    import multiprocessing
+    # Separate processes: peak RSS is per process
+    for target, extra in ((_plain_read, ()), (_typed_read, (years, args.chunksize))):
+        proc = multiprocessing.Process(target=target, args=(args.path,) + extra)
+        proc.start()
+        proc.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+Incremental Training Pipeline
+=============================
+save_final_model.py used to re-read the whole TARGET CSV, re-run
+process_features on every row and fit from scratch. The pipeline keeps the
+processed training rows as one Parquet partition per month and trains only
+on what changed:
+
+    cache/train/
+        manifest.json       CSV hash, month keys, last model (rows seen, params)
+        months/202401.parquet  features + 着順 / is_win for one month
+
+Month keys chain: key(M) = hash(raw rows of M, key(M-1), preprocess version),
+so a changed month (or changed feature code) invalidates it and every later
+month, whose lag features may depend on it. Only that suffix is re-processed,
+with each horse's last earlier run as context for the n-1 lags.
+
+Training:
+    - nothing new since the last model (same CSV, same window)  -> skipped
+    - new rows after the last model's date, older rows unchanged -> warm start:
+      WARM_ROUNDS trees fitted on the new rows on top of the previous booster
+    - anything else (first run, --full, feature / param change, window moved,
+      MAX_WARM_STARTS reached)                                    -> full fit
+
+Every stage (load, partition, features, assemble, train) is timed; the
+timings go to the console, the manifest and the registry meta.
+
+Usage:
+    from local_engine.train_pipeline import train, commit
+    result = train(DATA_PATH, MODEL_PATH)          # None when up to date
+    joblib.dump(result["model"], MODEL_PATH); commit(result, MODEL_PATH)
+
+    python local_engine/train_pipeline.py --status
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import pandas as pd
+
+try:
+    from .preprocess import process_features
+    from .target_loader import load_target
+    from .feature_cache import file_hash, preprocess_version
+except ImportError:
+    from preprocess import process_features
+    from target_loader import load_target
+    from feature_cache import file_hash, preprocess_version
+
+TRAIN_CACHE_DIR = os.getenv("TRAIN_CACHE_DIR", os.path.join("cache", "train"))
+MANIFEST = "manifest.json"
+
+PARAMS = {"n_estimators": 100, "learning_rate": 0.05, "num_leaves": 31, "random_state": 42}
+WARM_ROUNDS = 10         # Trees added per warm start
+MAX_WARM_STARTS = 12     # Then a full fit (warm-started trees only ever see new rows)
+KEEP_COLUMNS = ["Date", "着順", "is_win"]
+
+
+class StageTimer:
+    """Wall time per named stage"""
+
+    def __init__(self):
+        self.timings = {}
+
+    def __call__(self, name):
+        return _Stage(self, name)
+
+    def report(self):
+        total = sum(self.timings.values())
+        parts = " | ".join(f"{k} {v:.1f}s" for k, v in self.timings.items())
+        print(f"[TRAIN] {parts} | total {total:.1f}s")
+
+
+class _Stage:
+    def __init__(self, timer, name):
+        self.timer, self.name = timer, name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.timer.timings[self.name] = round(
+            self.timer.timings.get(self.name, 0.0) + time.perf_counter() - self.t0, 3)
+
+
+def _write_json(path, obj):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=1, default=str)
+    os.replace(tmp, path)
+
+
+def read_manifest(cache_dir=TRAIN_CACHE_DIR):
+    path = os.path.join(cache_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {"months": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def partition_path(month, cache_dir=TRAIN_CACHE_DIR):
+    return os.path.join(cache_dir, "months", f"{month}.parquet")
+
+
+def _date_key(df):
+    """年 / 月 / 日 -> YYYYMMDD int (年 is 2-digit, as in process_features)"""
+    year = 2000 + df["年"].astype("Int64") % 100
+    return (year * 10000 + df["月"].astype("Int64") * 100 + df["日"].astype("Int64")).to_numpy(dtype="int64")
+
+
+def _rows_hash(df):
+    return hashlib.md5(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()).hexdigest()
+
+
+def month_keys(raw, version):
+    """{YYYYMM: chained key} for the raw frame (needs a _date column)"""
+    keys, prev = {}, ""
+    months = raw["_date"] // 100
+    for month, rows in raw.groupby(months, sort=True):
+        h = hashlib.md5(f"{prev}|{_rows_hash(rows.drop(columns='_date'))}|{version}".encode())
+        prev = keys[str(month)] = h.hexdigest()[:16]
+    return keys
+
+
+def build_months(raw, months, cache_dir=TRAIN_CACHE_DIR):
+    """
+    process_features for the given months (a suffix, oldest first), with each
+    horse's last earlier run as context; writes one partition per month.
+    Returns the feature list.
+    """
+    start = int(months[0]) * 100
+    suffix = raw[raw["_date"] >= start]
+    prior = raw[(raw["_date"] < start) & raw["血統登録番号"].isin(suffix["血統登録番号"].unique())]
+    context = prior.loc[prior.groupby("血統登録番号", observed=True)["_date"].idxmax()]
+
+    df = pd.concat([context.assign(_context=True), suffix.assign(_context=False)], ignore_index=True)
+    df, features = process_features(df.drop(columns="_date"))
+    df = df[~df["_context"].astype(bool)].dropna(subset=features + ["着順"])
+    df["is_win"] = (df["着順"] <= 1).astype("int8")
+    df = df[features + KEEP_COLUMNS]
+
+    os.makedirs(os.path.join(cache_dir, "months"), exist_ok=True)
+    month_of = (df["Date"].dt.year * 100 + df["Date"].dt.month).astype(str)
+    for month in months:
+        # Written even when empty, so the month counts as cached
+        path = partition_path(month, cache_dir)
+        df[month_of == month].reset_index(drop=True).to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+    return features
+
+
+def _seen_tail_hash(raw, through):
+    """Hash of the raw rows in through's month up to and including through"""
+    month = through // 100
+    rows = raw[(raw["_date"] // 100 == month) & (raw["_date"] <= through)]
+    return _rows_hash(rows.drop(columns="_date"))
+
+
+def _full_fit_reason(prev, keys, raw, features, window, model_path, cache_dir):
+    """Why a warm start is impossible (None if it is possible)"""
+    if not prev:
+        return "no previous model"
+    if not os.path.exists(model_path) or file_hash(model_path, cache_dir) != prev["md5"]:
+        return "model file differs from the pipeline's last model"
+    if prev["features"] != features or prev["params"] != PARAMS or prev["window"] != list(window):
+        return "features / params / window changed"
+    if prev["warm_starts"] >= MAX_WARM_STARTS:
+        return f"{MAX_WARM_STARTS} warm starts since the last full fit"
+    if any(keys.get(m) != k for m, k in prev["seen_months"].items()):
+        return "rows the model was trained on changed"
+    if _seen_tail_hash(raw, prev["through"]) != prev["tail_hash"]:
+        return "rows the model was trained on changed"
+    return None
+
+
+def _load_months(months, cache_dir, after=None):
+    frames = [pd.read_parquet(partition_path(m, cache_dir)) for m in months]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if after is not None and not df.empty:
+        df = df[df["Date"] > pd.Timestamp(str(after))]
+    return df
+
+
+def train(data_path, model_path, first=None, until=None, full=False, cache_dir=TRAIN_CACHE_DIR):
+    """
+    Train on the months first..until (YYYYMM, inclusive; None = open).
+    Returns None when the model is up to date, else a result dict:
+    model, features, mode ('full' / 'warm'), rows, timings and the state
+    commit() records once the model is saved.
+    """
+    import lightgbm as lgb
+
+    timer = StageTimer()
+    manifest = read_manifest(cache_dir)
+    prev = manifest.get("model")
+    window = (first, until)
+    version = preprocess_version()
+
+    with timer("hash"):
+        csv_md5 = file_hash(data_path, cache_dir)
+    if (not full and prev and prev["csv_md5"] == csv_md5 and prev["preprocess"] == version
+            and prev["window"] == list(window) and prev["params"] == PARAMS
+            and os.path.exists(model_path) and file_hash(model_path, cache_dir) == prev["md5"]):
+        print(f"[TRAIN] Up to date (CSV unchanged since the model of {prev['trained_at']})")
+        return None
+
+    with timer("load"):
+        raw = load_target(data_path, verbose=False)
+        raw = raw.dropna(subset=["年", "月", "日"])
+        raw["_date"] = _date_key(raw)
+        if first:
+            raw = raw[raw["_date"] >= int(first) * 100]
+        if until:
+            raw = raw[raw["_date"] < (int(until) + 1) * 100]
+        raw = raw.reset_index(drop=True)
+
+    with timer("partition"):
+        keys = month_keys(raw, version)
+        cached = manifest.get("months", {})
+        stale = [m for m, k in keys.items()
+                 if cached.get(m) != k or not os.path.exists(partition_path(m, cache_dir))]
+    if not keys:
+        print("[TRAIN] No rows in the training window.")
+        return None
+
+    features = manifest.get("features")
+    with timer("features"):
+        if stale:
+            print(f"[TRAIN] Processing {len(stale)} of {len(keys)} months ({stale[0]}..{stale[-1]})")
+            features = build_months(raw, stale, cache_dir)
+            manifest["features"] = features
+        else:
+            print(f"[TRAIN] All {len(keys)} month partitions cached")
+        manifest["months"] = keys
+        os.makedirs(cache_dir, exist_ok=True)
+        _write_json(os.path.join(cache_dir, MANIFEST), manifest)
+
+    through = int(raw["_date"].max())
+    reason = "--full" if full else _full_fit_reason(prev, keys, raw, features, window, model_path, cache_dir)
+    mode = "full" if reason else "warm"
+
+    with timer("assemble"):
+        if mode == "warm":
+            months = [m for m in keys if int(m) >= prev["through"] // 100]
+            df = _load_months(months, cache_dir, after=prev["through"])
+        else:
+            df = _load_months(list(keys), cache_dir)
+    if df.empty:
+        print(f"[TRAIN] No new rows since {prev['through']}; keeping the current model.")
+        return None
+
+    X, y = df[features], df["is_win"]
+    with timer("train"):
+        if mode == "warm":
+            import joblib
+            base = joblib.load(model_path)
+            print(f"[TRAIN] Warm start: {WARM_ROUNDS} trees on {len(df):,} new rows "
+                  f"(after {prev['through']})")
+            model = lgb.LGBMClassifier(**dict(PARAMS, n_estimators=WARM_ROUNDS))
+            model.fit(X, y, init_model=base.booster_)
+        else:
+            print(f"[TRAIN] Full fit on {len(df):,} rows ({reason})")
+            model = lgb.LGBMClassifier(**PARAMS)
+            model.fit(X, y)
+
+    timer.report()
+    seen_months = {m: k for m, k in keys.items() if int(m) < through // 100}
+    return {
+        "model": model,
+        "features": features,
+        "mode": mode,
+        "rows": len(df),
+        "sample": X.head(1),
+        "months": f"{min(keys)}-{max(keys)}",
+        "timings": timer.timings,
+        "state": {
+            "csv_md5": csv_md5,
+            "preprocess": version,
+            "window": list(window),
+            "params": PARAMS,
+            "features": features,
+            "through": through,
+            "seen_months": seen_months,
+            "tail_hash": _seen_tail_hash(raw, through),
+            "warm_starts": prev["warm_starts"] + 1 if mode == "warm" else 0,
+        },
+    }
+
+
+def commit(result, model_path, cache_dir=TRAIN_CACHE_DIR):
+    """Record the saved model as the base for the next warm start"""
+    manifest = read_manifest(cache_dir)
+    manifest["model"] = dict(result["state"], md5=file_hash(model_path, cache_dir),
+                             mode=result["mode"], timings=result["timings"],
+                             trained_at=time.strftime("%Y-%m-%d %H:%M:%S"))
+    _write_json(os.path.join(cache_dir, MANIFEST), manifest)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the incremental training cache")
+    parser.add_argument("--dir", default=TRAIN_CACHE_DIR, help="Cache directory")
+    parser.add_argument("--status", action="store_true", help="Show partitions and the last model")
+    args = parser.parse_args()
+
+    manifest = read_manifest(args.dir)
+    months = manifest.get("months", {})
+    print(f"[TRAIN] {len(months)} month partitions" + (f" ({min(months)}..{max(months)})" if months else ""))
+    model = manifest.get("model")
+    if model:
+        print(f"[TRAIN] Last model {model['trained_at']}: {model['mode']} fit through {model['through']}, "
+              f"{model['warm_starts']} warm start(s) since the last full fit")
+        print("        " + ", ".join(f"{k} {v:.1f}s" for k, v in model["timings"].items()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,300 @@
+"""
+Pure-NumPy Tree Model
+=====================
+Runs final_model.pkl (LightGBM binary classifier) without lightgbm,
+sklearn or joblib. The exporter flattens the booster's trees into a few
+arrays, saved as .npy files next to the pickle:
+
+    final_model.trees/
+        meta.json        features, objective, source pickle md5
+        feature.npy      split feature per node
+        threshold.npy    split threshold (go left if x <= threshold)
+        left.npy         left child (global index; right child = left + 1,
+                         leaves point to themselves)
+        nan_left.npy     direction for NaN input
+        default_left.npy direction for zero input on missing_type Zero splits
+        missing.npy      0 = None, 1 = Zero, 2 = NaN (LightGBM missing_type)
+        value.npy        leaf values
+        roots.npy        root node of each tree
+
+TreeModel loads them memory-mapped and scores all rows in one vectorized
+pass per depth level. predict_proba matches LGBMClassifier.predict_proba
+to float tolerance (check with `verify`).
+
+Usage:
+    python local_engine/tree_model.py export              # needs lightgbm + joblib
+    python local_engine/tree_model.py verify --rows 50000 # needs lightgbm + joblib
+
+    from local_engine.tree_model import load_model
+    model = load_model("local_engine/final_model.pkl")    # TreeModel if exported
+    probs = model.predict_proba(df[features])[:, 1]
+    feature_importances("local_engine/final_model.pkl")  # {feature: split count}, from the export
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import numpy as np
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "final_model.pkl")
+
+MISSING_TYPES = {"None": 0, "Zero": 1, "NaN": 2}
+ZERO_THRESHOLD = 1e-35     # LightGBM kZeroThreshold
+ARRAYS = ("feature", "threshold", "left", "nan_left", "default_left", "missing", "value", "roots")
+ROW_BLOCK = 4_096          # Rows per pass (keeps the rows x trees node matrix in cache)
+
+
+def artifact_path(model_path):
+    return os.path.splitext(model_path)[0] + ".trees"
+
+
+def file_md5(path):
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def flatten_dump(dump):
+    """LightGBM dump_model() dict -> (arrays, meta)"""
+    objective = dump.get("objective", "")
+    if not objective.startswith("binary"):
+        raise ValueError(f"Only binary objectives are supported (got '{objective}')")
+    sigmoid = 1.0
+    for part in objective.split()[1:]:
+        if part.startswith("sigmoid:"):
+            sigmoid = float(part.split(":", 1)[1])
+
+    cols = {k: [] for k in ARRAYS if k != "roots"}
+
+    def alloc(count):
+        start = len(cols["feature"])
+        for k, v in cols.items():
+            v.extend([0] * count)
+        return start
+
+    roots, max_depth = [], 0
+    for tree in dump["tree_info"]:
+        root = alloc(1)
+        roots.append(root)
+        stack = [(tree["tree_structure"], root, 0)]
+        while stack:
+            node, i, depth = stack.pop()
+            if "split_feature" not in node:
+                # Leaves point to themselves and always "go left": the walk stays put
+                cols["threshold"][i] = np.inf
+                cols["nan_left"][i] = cols["default_left"][i] = True
+                cols["left"][i] = i
+                cols["value"][i] = node["leaf_value"]
+                max_depth = max(max_depth, depth)
+                continue
+            if node.get("decision_type", "<=") != "<=":
+                raise ValueError("Categorical splits are not supported")
+            missing = MISSING_TYPES[node.get("missing_type", "None")]
+            threshold = float(node["threshold"])
+            default_left = bool(node.get("default_left", True))
+            cols["feature"][i] = node["split_feature"]
+            cols["threshold"][i] = threshold
+            cols["missing"][i] = missing
+            cols["default_left"][i] = default_left
+            # NaN is treated as 0 unless missing_type is NaN (0 then may hit the Zero default)
+            cols["nan_left"][i] = default_left if missing else 0.0 <= threshold
+            child = alloc(2)   # Right child = left + 1
+            cols["left"][i] = child
+            stack.append((node["left_child"], child, depth + 1))
+            stack.append((node["right_child"], child + 1, depth + 1))
+
+    arrays = {
+        "feature": np.array(cols["feature"], dtype=np.int32),
+        "threshold": np.array(cols["threshold"], dtype=np.float64),
+        "left": np.array(cols["left"], dtype=np.int32),
+        "nan_left": np.array(cols["nan_left"], dtype=bool),
+        "default_left": np.array(cols["default_left"], dtype=bool),
+        "missing": np.array(cols["missing"], dtype=np.int8),
+        "value": np.array(cols["value"], dtype=np.float64),
+        "roots": np.array(roots, dtype=np.int32),
+    }
+    meta = {
+        "features": dump.get("feature_names", []),
+        "objective": objective,
+        "sigmoid": sigmoid,
+        "n_trees": len(roots),
+        "n_nodes": len(cols["feature"]),
+        "max_depth": max_depth,
+    }
+    return arrays, meta
+
+
+def save(arrays, meta, out_dir):
+    """Write the artifact; meta.json goes last and marks it complete"""
+    os.makedirs(out_dir, exist_ok=True)
+    for name in ARRAYS:
+        np.save(os.path.join(out_dir, name + ".npy"), arrays[name])
+    tmp = os.path.join(out_dir, "meta.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, os.path.join(out_dir, "meta.json"))
+
+
+def export_model(model_path=MODEL_PATH, out_dir=None):
+    """final_model.pkl -> final_model.trees/ (needs joblib + lightgbm)"""
+    import joblib
+    model = joblib.load(model_path)
+    booster = getattr(model, "booster_", model)
+    arrays, meta = flatten_dump(booster.dump_model())
+    meta["source_md5"] = file_md5(model_path)
+    out_dir = out_dir or artifact_path(model_path)
+    save(arrays, meta, out_dir)
+    print(f"[TREES] {meta['n_trees']} trees, {meta['n_nodes']:,} nodes, depth {meta['max_depth']} -> {out_dir}")
+    return out_dir
+
+
+class TreeModel:
+    """Vectorized evaluator for an exported tree artifact (predict_proba like sklearn)"""
+
+    def __init__(self, arrays, meta):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.meta = meta
+        self.features = meta["features"]
+        self.sigmoid = meta["sigmoid"]
+        self.max_depth = meta["max_depth"]
+        self.source_md5 = meta.get("source_md5")
+        self.n_features_ = len(self.features)
+        self.has_zero = bool((self.missing == 1).any())
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode=mode) for name in ARRAYS}
+        return cls(arrays, meta)
+
+    def _matrix(self, X):
+        """DataFrame (by feature name when possible) or array -> float64 matrix"""
+        if hasattr(X, "columns"):
+            if self.features and all(f in X.columns for f in self.features):
+                X = X[self.features]
+            X = X.to_numpy(dtype=np.float64, na_value=np.nan)
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2:
+            raise ValueError("Expected a 2-D feature matrix")
+        return X
+
+    def _raw_block(self, X):
+        n = X.shape[0]
+        node = np.tile(self.roots, (n, 1))
+        rows = np.arange(n)[:, None]
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[node]]
+            go_left = x <= self.threshold[node]
+            nan = np.isnan(x)
+            if nan.any():
+                go_left[nan] = self.nan_left[node[nan]]
+            if self.has_zero:
+                zero = (np.abs(x) <= ZERO_THRESHOLD) & (self.missing[node] == 1)
+                go_left[zero] = self.default_left[node[zero]]
+            node = self.left[node] + ~go_left
+        return self.value[node].sum(axis=1)
+
+    def predict_raw(self, X):
+        X = self._matrix(X)
+        if X.shape[0] == 0:
+            return np.zeros(0)
+        return np.concatenate([self._raw_block(X[i:i + ROW_BLOCK]) for i in range(0, X.shape[0], ROW_BLOCK)])
+
+    def predict_proba(self, X):
+        p = 1.0 / (1.0 + np.exp(-self.sigmoid * self.predict_raw(X)))
+        return np.column_stack([1.0 - p, p])
+
+    @property
+    def feature_importances_(self):
+        """Split counts per feature (LGBMClassifier's default importance_type)"""
+        internal = self.left != np.arange(len(self.left))   # Leaves point to themselves
+        return np.bincount(self.feature[internal], minlength=self.n_features_)
+
+
+def model_available(model_path=MODEL_PATH):
+    return os.path.exists(model_path) or os.path.exists(os.path.join(artifact_path(model_path), "meta.json"))
+
+
+def feature_importances(model_path=MODEL_PATH):
+    """
+    {feature: split count} from the NumPy export (no pickle load); None when
+    the export is missing or older than model_path.
+    """
+    trees = artifact_path(model_path)
+    if os.path.exists(os.path.join(trees, "meta.json")):
+        model = TreeModel.load(trees)
+        if not os.path.exists(model_path) or model.source_md5 == file_md5(model_path):
+            return dict(zip(model.features, model.feature_importances_.tolist()))
+    print(f"[TREES] No current export for {model_path}; run `python local_engine/tree_model.py export`")
+    return None
+
+
+def load_model(model_path=MODEL_PATH):
+    """
+    TreeModel when an up-to-date export exists next to model_path (or the
+    pickle is absent), otherwise the pickled model via joblib.
+    """
+    trees = artifact_path(model_path)
+    if os.path.exists(os.path.join(trees, "meta.json")):
+        model = TreeModel.load(trees)
+        if not os.path.exists(model_path) or model.source_md5 == file_md5(model_path):
+            return model
+        print(f"[TREES] {trees} is older than {model_path}; using the pickle (re-run export)")
+    import joblib
+    return joblib.load(model_path)
+
+
+def verify(model_path=MODEL_PATH, rows=50_000, seed=0):
+    """Compare TreeModel with the pickled model on random rows spanning every threshold"""
+    import time
+    import joblib
+    model = joblib.load(model_path)
+    trees = TreeModel.load(artifact_path(model_path))
+
+    rng = np.random.default_rng(seed)
+    n_features = len(trees.features)
+    X = np.empty((rows, n_features))
+    for f in range(n_features):
+        th = trees.threshold[trees.feature == f]
+        lo, hi = (th.min(), th.max()) if len(th) else (0.0, 1.0)
+        span = (hi - lo) or 1.0
+        X[:, f] = rng.uniform(lo - 0.1 * span, hi + 0.1 * span, rows)
+        X[rng.random(rows) < 0.05, f] = np.nan
+        X[rng.random(rows) < 0.02, f] = 0.0
+        if len(th):
+            # Exact threshold hits exercise the <= boundary
+            hits = rng.random(rows) < 0.02
+            X[hits, f] = rng.choice(th, hits.sum())
+
+    t0 = time.perf_counter()
+    expected = model.predict_proba(X)[:, 1]
+    t1 = time.perf_counter()
+    actual = trees.predict_proba(X)[:, 1]
+    t2 = time.perf_counter()
+    diff = np.abs(expected - actual).max()
+    print(f"[VERIFY] {rows:,} rows | max |diff| {diff:.2e} | lightgbm {t1 - t0:.2f}s | numpy {t2 - t1:.2f}s")
+    return diff < 1e-9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export / verify the pure-NumPy tree model")
+    parser.add_argument("command", choices=["export", "verify"])
+    parser.add_argument("--model", default=MODEL_PATH, help="Pickled LightGBM model")
+    parser.add_argument("--rows", type=int, default=50_000, help="Rows for verify")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_model(args.model)
+        return 0
+    return 0 if verify(args.model, args.rows) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
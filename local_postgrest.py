@@ -0,0 +1,532 @@
+"""
+Local PostgREST Stand-in
+========================
+A small HTTP server that speaks the subset of the PostgREST API used by the
+workers and the dashboard, on top of a SQLite file. Point SUPABASE_URL at it
+to run and benchmark the collector, predictor and dashboard data paths
+without the live project.
+
+Supported:
+    GET     select, filters, order, limit / offset, Range, Prefer: count=exact
+    POST    insert / upsert (Prefer: resolution=merge-duplicates, on_conflict),
+            single object or array, gzip request bodies
+    PATCH   update rows matching the filters
+    DELETE  delete rows matching the filters
+    Filters eq, neq, gt, gte, lt, lte, like, ilike, in, is, not.<op>, or=(...), and=(...)
+    RPC     get_day_snapshot (POST /rpc/, same columns, watermarks and paging
+            as supabase_schema.sql); other functions answer 404 PGRST202
+
+Not emulated: other RPC functions, resource embedding, JSON path operators.
+Watermarks compare the stored ISO timestamps as text (UTC offsets as written).
+JSON objects are stored as JSON text and returned as strings.
+Tables are created on first insert (columns are added as they appear), so the
+server can start from an empty file or from a worker_mirror.py snapshot.
+
+Usage:
+    python local_postgrest.py                              # local_mirror.db on :54321
+    python local_postgrest.py --db bench.db --latency 40 --jitter 10 --max-rows 1000
+
+    SUPABASE_URL=http://127.0.0.1:54321 python worker_predict.py
+"""
+
+import re
+import gzip
+import json
+import time
+import random
+import sqlite3
+import argparse
+import datetime
+import threading
+from urllib.parse import urlparse, parse_qsl
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from worker_mirror import MIRROR_PATH, MIRROR_TABLES, _quote, _columns, _to_sql
+
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+DEFAULT_COLUMNS = ("timestamp", "created_at", "updated_at")  # Filled with NOW() on insert
+
+
+class ApiError(Exception):
+    """Rendered as a PostgREST-style error body"""
+
+    def __init__(self, status, message, code="PGRST100"):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+
+# --- Filter parsing ---
+
+def _split_top(text):
+    """Split on commas that are not inside parentheses or quotes"""
+    parts, depth, quoted, buf = [], 0, False, ""
+    for ch in text:
+        if ch == '"':
+            quoted = not quoted
+        elif not quoted and ch == "(":
+            depth += 1
+        elif not quoted and ch == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and ch == ",":
+            parts.append(buf)
+            buf = ""
+            continue
+        buf += ch
+    if buf:
+        parts.append(buf)
+    return parts
+
+
+def _unquote(value):
+    return value[1:-1] if len(value) >= 2 and value[0] == value[-1] == '"' else value
+
+
+def _order_sql(order):
+    """'race_id.asc,horse_num.desc.nullslast' -> ' ORDER BY ...' ('' for none)"""
+    if not order:
+        return ""
+    terms = []
+    for term in order.split(","):
+        bits = term.strip().split(".")
+        direction = "DESC" if "desc" in bits[1:] else "ASC"
+        nulls = " NULLS FIRST" if "nullsfirst" in bits[1:] else (
+            " NULLS LAST" if "nullslast" in bits[1:] else "")
+        terms.append(f"{_quote(bits[0])} {direction}{nulls}")
+    return " ORDER BY " + ", ".join(terms)
+
+
+# get_day_snapshot (supabase_schema.sql) over the mirrored tables.
+# {name} sources are built by SqliteStore._source (NULL for missing tables / columns).
+DAY_SNAPSHOT_SQL = """
+    SELECT * FROM (
+        SELECT
+            e.race_id, e.horse_num, e.waku, e.horse_name, e.sex, e.age, e.weight, e.jockey,
+            o.odds AS odds_tan, o.pop AS pop_tan,
+            COALESCE(p.predict_score, 0) AS predict_score,
+            COALESCE(p.predict_flag, 0) AS predict_flag,
+            CASE e.horse_num
+                WHEN r.rank_1_horse_num THEN 1
+                WHEN r.rank_2_horse_num THEN 2
+                WHEN r.rank_3_horse_num THEN 3
+            END AS finish_rank,
+            e.updated_at AS entry_ts, o.snapshot_ts AS odds_ts, p.updated_at AS pred_ts, r.updated_at AS result_ts
+        FROM {entries} e
+        LEFT JOIN {odds} o
+            ON o.race_id = e.race_id AND o.horse_num = e.horse_num
+           AND o.snapshot_ts = (SELECT MAX(w.snapshot_ts) FROM {odds} w
+                                WHERE w.race_id = e.race_id AND w.horse_num = e.horse_num)
+        LEFT JOIN {preds} p
+            ON p.race_id = e.race_id AND p.horse_num = printf('%02d', e.horse_num)
+        LEFT JOIN {results} r
+            ON r.race_id = e.race_id
+        WHERE e.race_date = :p_race_date
+    ) s
+    WHERE COALESCE(s.entry_ts > COALESCE(:p_entries_since, ''), 0)
+       OR COALESCE(s.odds_ts > COALESCE(:p_odds_since, ''), 0)
+       OR COALESCE(s.pred_ts > COALESCE(:p_pred_since, ''), 0)
+       OR COALESCE(s.result_ts > COALESCE(:p_results_since, ''), 0)
+"""
+DAY_SNAPSHOT_SOURCES = {
+    "entries": ("race_entries", ["race_id", "race_date", "horse_num", "waku", "horse_name", "sex", "age",
+                                 "weight", "jockey", "updated_at"]),
+    "odds": ("win_odds", ["race_id", "horse_num", "odds", "pop", "snapshot_ts"]),
+    "preds": ("prediction_results", ["race_id", "horse_num", "predict_score", "predict_flag", "updated_at"]),
+    "results": ("race_results", ["race_id", "rank_1_horse_num", "rank_2_horse_num", "rank_3_horse_num",
+                                 "updated_at"]),
+}
+DAY_SNAPSHOT_ARGS = ("p_race_date", "p_entries_since", "p_odds_since", "p_pred_since", "p_results_since")
+
+
+class SqliteStore:
+    """SQLite table access with PostgREST semantics (one connection, serialized)"""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.lock = threading.Lock()
+        self._types = {}
+
+    # Stored values keep their JSON type (no column affinity), so filter values
+    # from the query string are coerced to the type already held by the column.
+    def _coerce(self, table, col, value):
+        key = (table, col)
+        if key not in self._types:
+            row = self.conn.execute(f"SELECT typeof({_quote(col)}) FROM {_quote(table)} "
+                                    f"WHERE {_quote(col)} IS NOT NULL LIMIT 1").fetchone()
+            if row is None:
+                return value
+            self._types[key] = row[0]
+        kind = self._types[key]
+        try:
+            if kind == "integer":
+                if value in ("true", "false"):
+                    return 1 if value == "true" else 0
+                return int(value)
+            if kind == "real":
+                return float(value)
+        except ValueError:
+            pass
+        return value
+
+    def _condition(self, table, col, expr, args):
+        negate = expr.startswith("not.")
+        if negate:
+            expr = expr[4:]
+        if "." not in expr:
+            raise ApiError(400, f'"failed to parse filter ({expr})"')
+        op, value = expr.split(".", 1)
+        c = _quote(col)
+
+        if op in ("eq", "neq", "gt", "gte", "lt", "lte"):
+            sql_op = {"eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}[op]
+            sql = f"{c} {sql_op} ?"
+            args.append(self._coerce(table, col, value))
+        elif op in ("like", "ilike"):
+            sql = f"{c} LIKE ?"
+            args.append(value.replace("*", "%"))
+        elif op == "in":
+            items = [_unquote(v) for v in _split_top(value.strip("()"))]
+            sql = f"{c} IN ({', '.join('?' for _ in items)})" if items else "0"
+            args.extend(self._coerce(table, col, v) for v in items)
+        elif op == "is":
+            sql = {"null": f"{c} IS NULL", "true": f"{c} = 1", "false": f"{c} = 0"}.get(value)
+            if sql is None:
+                raise ApiError(400, f'"failed to parse filter (is.{value})"')
+        else:
+            raise ApiError(400, f'"unsupported operator ({op})"')
+        return f"NOT ({sql})" if negate else sql
+
+    def _logic(self, table, joiner, tree, args):
+        """'(a.eq.1,or(b.is.null,b.gt.2))' -> SQL"""
+        parts = []
+        for item in _split_top(tree.strip()[1:-1]):
+            item = item.strip()
+            for nested in ("and", "or", "not.and", "not.or"):
+                if item.startswith(nested + "("):
+                    sql = self._logic(table, nested.split(".")[-1].upper(), item[len(nested):], args)
+                    parts.append(f"NOT ({sql})" if nested.startswith("not.") else sql)
+                    break
+            else:
+                col, expr = item.split(".", 1)
+                parts.append(self._condition(table, col, expr, args))
+        return "(" + f" {joiner} ".join(parts or ["1"]) + ")"
+
+    def where(self, table, params):
+        clauses, args = [], []
+        for key, value in params:
+            if key in RESERVED_PARAMS:
+                continue
+            if key in ("or", "and"):
+                clauses.append(self._logic(table, key.upper(), value, args))
+            else:
+                clauses.append(self._condition(table, key, value, args))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+    def _require(self, table):
+        if not _columns(self.conn, table):
+            raise ApiError(404, f'relation "public.{table}" does not exist', code="42P01")
+
+    # --- Verbs ---
+
+    def select(self, table, params, offset, limit, count):
+        with self.lock:
+            self._require(table)
+            query = dict(params)
+            where, args = self.where(table, params)
+
+            select = query.get("select", "*").replace(" ", "")
+            cols = "*" if select == "*" else ", ".join(_quote(c) for c in select.split(","))
+            order_sql = _order_sql(query.get("order"))
+
+            total = None
+            if count:
+                total = self.conn.execute(f"SELECT COUNT(*) FROM {_quote(table)}{where}", args).fetchone()[0]
+            limit_sql = f" LIMIT {int(limit) if limit is not None else -1} OFFSET {int(offset)}"
+            try:
+                rows = self.conn.execute(f"SELECT {cols} FROM {_quote(table)}{where}{order_sql}{limit_sql}",
+                                         args).fetchall()
+            except sqlite3.OperationalError as e:
+                raise ApiError(400, str(e), code="42703")
+            return [dict(r) for r in rows], total
+
+    def _source(self, table, columns):
+        """Subquery with exactly these columns (NULL where the mirror lacks the table / column)"""
+        existing = _columns(self.conn, table)
+        cols = ", ".join(_quote(c) if c in existing else f"NULL AS {_quote(c)}" for c in columns)
+        return f"(SELECT {cols} FROM {_quote(table)})" if existing else f"(SELECT {cols} WHERE 0)"
+
+    def day_snapshot(self, args, params, offset, limit, count):
+        """get_day_snapshot: entries + latest odds + prediction + finish rank per horse"""
+        if not (args or {}).get("p_race_date"):
+            raise ApiError(400, "get_day_snapshot requires p_race_date", code="PGRST202")
+        binds = {k: (args or {}).get(k) for k in DAY_SNAPSHOT_ARGS}
+        with self.lock:
+            sql = DAY_SNAPSHOT_SQL.format(**{name: self._source(table, cols)
+                                             for name, (table, cols) in DAY_SNAPSHOT_SOURCES.items()})
+            total = None
+            if count:
+                total = self.conn.execute(f"SELECT COUNT(*) FROM ({sql})", binds).fetchone()[0]
+            order_sql = _order_sql(dict(params).get("order")) or " ORDER BY race_id, horse_num"
+            limit_sql = f" LIMIT {int(limit) if limit is not None else -1} OFFSET {int(offset)}"
+            try:
+                rows = self.conn.execute(f"SELECT * FROM ({sql}){order_sql}{limit_sql}", binds).fetchall()
+            except sqlite3.OperationalError as e:
+                raise ApiError(400, str(e), code="42703")
+            return [dict(r) for r in rows], total
+
+    def _ensure(self, table, columns, pk):
+        existing = _columns(self.conn, table)
+        if not existing:
+            cols = ", ".join(_quote(c) for c in columns)
+            keys = f", PRIMARY KEY ({', '.join(_quote(c) for c in pk)})" if pk else ""
+            self.conn.execute(f"CREATE TABLE {_quote(table)} ({cols}{keys})")
+            return
+        for c in columns:
+            if c not in existing:
+                self.conn.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {_quote(c)}")
+
+    def insert(self, table, rows, on_conflict=None, merge=False, ignore=False):
+        if not rows:
+            return 0
+        conflict = [c.strip() for c in on_conflict.split(",")] if on_conflict else None
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        columns = list(rows[0].keys())  # PostgREST takes the columns of the first object
+        with self.lock:
+            if table in MIRROR_TABLES:
+                # Same layout as worker_mirror.py (generated id / watermark columns included)
+                ts_col, pk = MIRROR_TABLES[table]
+                self._ensure(table, columns + [c for c in [ts_col] + pk if c not in columns], pk)
+            else:
+                self._ensure(table, columns, conflict or (["id"] if "id" in columns else []))
+            existing = _columns(self.conn, table)
+            fill = [c for c in DEFAULT_COLUMNS if c in existing and c not in columns]
+            need_id = "id" in existing and "id" not in columns
+            all_cols = columns + fill + (["id"] if need_id else [])
+
+            next_id = None
+            if need_id:
+                next_id = (self.conn.execute(f"SELECT MAX(id) FROM {_quote(table)}").fetchone()[0] or 0) + 1
+            values = []
+            for i, row in enumerate(rows):
+                v = [_to_sql(row.get(c)) for c in columns] + [now] * len(fill)
+                if need_id:
+                    v.append(next_id + i)
+                values.append(tuple(v))
+
+            cols = ", ".join(_quote(c) for c in all_cols)
+            marks = ", ".join("?" for _ in all_cols)
+            sql = f"INSERT INTO {_quote(table)} ({cols}) VALUES ({marks})"
+            if (merge or ignore) and conflict:
+                # ON CONFLICT needs a unique index on exactly these columns
+                name = _quote(f"uq_{table}_{'_'.join(conflict)}")
+                self.conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {_quote(table)} "
+                                  f"({', '.join(_quote(c) for c in conflict)})")
+                target = ", ".join(_quote(c) for c in conflict)
+                if merge:
+                    updates = ", ".join([f"{_quote(c)} = excluded.{_quote(c)}" for c in columns if c not in conflict]
+                                        + [f"{_quote(c)} = excluded.{_quote(c)}" for c in fill if c == "updated_at"])
+                    sql += f" ON CONFLICT ({target}) DO " + (f"UPDATE SET {updates}" if updates else "NOTHING")
+                else:
+                    sql += f" ON CONFLICT ({target}) DO NOTHING"
+            elif merge:
+                sql = sql.replace("INSERT INTO", "INSERT OR REPLACE INTO", 1)
+            elif ignore:
+                sql = sql.replace("INSERT INTO", "INSERT OR IGNORE INTO", 1)
+            try:
+                self.conn.executemany(sql, values)
+                self.conn.commit()
+            except sqlite3.IntegrityError as e:
+                self.conn.rollback()
+                raise ApiError(409, str(e), code="23505")
+            return len(rows)
+
+    def update(self, table, values, params):
+        with self.lock:
+            self._require(table)
+            self._ensure(table, list(values.keys()), [])
+            if "updated_at" in _columns(self.conn, table) and "updated_at" not in values:
+                # touch_updated_at trigger
+                values = dict(values, updated_at=datetime.datetime.now(datetime.timezone.utc).isoformat())
+            where, args = self.where(table, params)
+            sets = ", ".join(f"{_quote(c)} = ?" for c in values)
+            cur = self.conn.execute(f"UPDATE {_quote(table)} SET {sets}{where}",
+                                    [_to_sql(v) for v in values.values()] + args)
+            self.conn.commit()
+            return cur.rowcount
+
+    def delete(self, table, params):
+        with self.lock:
+            self._require(table)
+            where, args = self.where(table, params)
+            cur = self.conn.execute(f"DELETE FROM {_quote(table)}{where}", args)
+            self.conn.commit()
+            return cur.rowcount
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True   # Headers and body are separate writes; avoid delayed-ACK stalls
+    store = None
+    latency = 0.0     # Seconds added to every request
+    jitter = 0.0
+    max_rows = None   # PostgREST db-max-rows
+    rpc_functions = {"get_day_snapshot": "day_snapshot"}   # RPC name -> SqliteStore method
+
+    def log_message(self, *args):
+        pass
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        if len(parts) < 3 or parts[:2] != ["rest", "v1"]:
+            raise ApiError(404, "not found", code="PGRST125")
+        if parts[2] == "rpc":
+            if len(parts) < 4 or parts[3] not in self.rpc_functions:
+                raise ApiError(404, f"RPC {parts[-1]} is not emulated", code="PGRST202")
+            return "rpc/" + parts[3], parse_qsl(url.query, keep_blank_values=True)
+        return parts[2], parse_qsl(url.query, keep_blank_values=True)
+
+    def _prefer(self):
+        return {p.strip() for p in self.headers.get("Prefer", "").split(",") if p.strip()}
+
+    def _body(self):
+        self.body_read = True
+        data = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.headers.get("Content-Encoding") == "gzip":
+            data = gzip.decompress(data)
+        return json.loads(data) if data else None
+
+    def _send(self, status, payload=None, headers=None):
+        body = b"" if payload is None else json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        if payload is not None:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self, verb):
+        self.body_read = False
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+        try:
+            table, params = self._route()
+            verb(table, params)
+        except ApiError as e:
+            self._send(e.status, {"code": e.code, "message": str(e), "details": None, "hint": None})
+        except (ValueError, KeyError) as e:
+            self._send(400, {"code": "PGRST102", "message": str(e), "details": None, "hint": None})
+        if not self.body_read:
+            # Unread request body would be parsed as the next request on this keep-alive connection
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _window(self, params):
+        """(offset, limit) from limit / offset params, the Range header and max_rows"""
+        query = dict(params)
+        offset = int(query.get("offset", 0))
+        limit = int(query["limit"]) if "limit" in query else None
+        rng = self.headers.get("Range")
+        if rng and re.fullmatch(r"\d+-\d*", rng):
+            start, end = rng.split("-")
+            offset += int(start)
+            if end:
+                span = int(end) - int(start) + 1
+                limit = span if limit is None else min(limit, span)
+        if self.max_rows:
+            limit = self.max_rows if limit is None else min(limit, self.max_rows)
+        return offset, limit
+
+    def _send_rows(self, rows, total, offset):
+        end = offset + len(rows) - 1
+        content_range = f"{offset}-{end}" if rows else "*"
+        content_range += f"/{total if total is not None else '*'}"
+        self._send(206 if total is not None and len(rows) < total else 200, rows,
+                   {"Content-Range": content_range})
+
+    def _get(self, table, params):
+        if table.startswith("rpc/"):
+            # GET /rpc/fn?arg=value (STABLE functions)
+            return self._rpc(table, params, {k: v for k, v in params if k not in RESERVED_PARAMS})
+        offset, limit = self._window(params)
+        rows, total = self.store.select(table, params, offset, limit, "count=exact" in self._prefer())
+        self._send_rows(rows, total, offset)
+
+    def _rpc(self, table, params, args):
+        offset, limit = self._window(params)
+        fn = getattr(self.store, self.rpc_functions[table[4:]])
+        rows, total = fn(args, params, offset, limit, "count=exact" in self._prefer())
+        self._send_rows(rows, total, offset)
+
+    def _post(self, table, params):
+        if table.startswith("rpc/"):
+            return self._rpc(table, params, self._body() or {})
+        body = self._body()
+        rows = body if isinstance(body, list) else [body]
+        prefer = self._prefer()
+        self.store.insert(table, rows, dict(params).get("on_conflict"),
+                          merge="resolution=merge-duplicates" in prefer,
+                          ignore="resolution=ignore-duplicates" in prefer)
+        if "return=representation" in prefer:
+            self._send(201, rows)
+        else:
+            self._send(201)
+
+    def _patch(self, table, params):
+        self.store.update(table, self._body() or {}, params)
+        self._send(204)
+
+    def _delete(self, table, params):
+        self.store.delete(table, params)
+        self._send(204)
+
+    def do_GET(self):
+        self._handle(self._get)
+
+    def do_POST(self):
+        self._handle(self._post)
+
+    def do_PATCH(self):
+        self._handle(self._patch)
+
+    def do_DELETE(self):
+        self._handle(self._delete)
+
+
+def serve(db=MIRROR_PATH, host="127.0.0.1", port=54321, latency_ms=0.0, jitter_ms=0.0, max_rows=1000):
+    """Returns a running server (serve_forever in a daemon thread); call .shutdown() to stop"""
+    handler = type("BoundHandler", (Handler,), {
+        "store": SqliteStore(db),
+        "latency": latency_ms / 1000,
+        "jitter": jitter_ms / 1000,
+        "max_rows": max_rows or None,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PostgREST-compatible stand-in on SQLite")
+    parser.add_argument("--db", default=MIRROR_PATH, help="SQLite file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--latency", type=float, default=0.0, help="Added latency per request (ms)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random extra latency, 0..N ms")
+    parser.add_argument("--max-rows", type=int, default=1000, help="Response row cap (0 = none)")
+    args = parser.parse_args()
+
+    server = serve(args.db, args.host, args.port, args.latency, args.jitter, args.max_rows)
+    print(f"[POSTGREST] {args.db} on http://{args.host}:{args.port} "
+          f"(latency {args.latency}+{args.jitter}ms, max-rows {args.max_rows or 'none'})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
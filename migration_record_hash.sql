@@ -0,0 +1,71 @@
+-- Migration: Fixed-width dedupe key for raw_race_data
+-- ============================================
+-- Purpose: Replace raw_string (long Base64 TEXT) / race_id packing as the
+-- dedupe key with a fixed-width record hash computed at ingest.
+--
+--   record_key   'SE07' (record type + horse number) for per-horse records,
+--                record type ('HR', 'O1') otherwise
+--   record_hash  md5 hex of the raw bytes stored in raw_string (32 chars)
+--
+--   UNIQUE (race_id, data_type, race_date, record_key, record_hash)
+--   (race_date is the partition key, so it must be part of every unique key)
+--
+-- All uploaders build rows with raw_records.build_raw_row() and upsert with
+-- on_conflict=race_id,data_type,race_date,record_key,record_hash.
+--
+-- Run in Supabase SQL Editor after partition_raw_race_data.sql.
+
+BEGIN;
+
+ALTER TABLE raw_race_data ADD COLUMN IF NOT EXISTS record_key TEXT NOT NULL DEFAULT '';
+ALTER TABLE raw_race_data ADD COLUMN IF NOT EXISTS record_hash TEXT;
+
+-- Old keys go first: unpacking race_id below would collide with them
+ALTER TABLE raw_race_data DROP CONSTRAINT IF EXISTS raw_race_data_race_id_data_type_race_date_key;
+ALTER TABLE raw_race_data DROP CONSTRAINT IF EXISTS raw_race_data_race_id_data_type_key;
+
+-- content is stored as a JSON string by the uploaders; unwrap it (NULL if unreadable)
+CREATE OR REPLACE FUNCTION pg_temp.raw_content(c JSONB) RETURNS JSONB
+LANGUAGE plpgsql IMMUTABLE
+AS $$
+BEGIN
+    IF jsonb_typeof(c) = 'string' THEN
+        RETURN (c #>> '{}')::jsonb;
+    END IF;
+    RETURN c;
+EXCEPTION WHEN OTHERS THEN
+    RETURN NULL;
+END $$;
+
+-- step2_upload packed '<race_id>_<data_type>_<horse_num>' into race_id
+UPDATE raw_race_data
+SET race_id = split_part(race_id, '_', 1)
+WHERE split_part(race_id, '_', 2) = data_type;
+
+-- Backfill (same definitions as raw_records.py)
+UPDATE raw_race_data r
+SET record_hash = CASE
+        WHEN r.raw_string ~ '^[A-Za-z0-9+/]*={0,2}$' AND length(r.raw_string) % 4 = 0
+            THEN md5(decode(r.raw_string, 'base64'))
+        ELSE md5(COALESCE(r.raw_string, ''))
+    END,
+    record_key = COALESCE(c.j->>'record_type', '')
+        || COALESCE(lpad(NULLIF(c.j->>'horse_num', ''), 2, '0'), c.j->>'Umaban', '')
+FROM (SELECT id, race_date, pg_temp.raw_content(content) AS j FROM raw_race_data) c
+WHERE c.id = r.id AND c.race_date = r.race_date;
+
+-- Keep the newest copy of each record
+DELETE FROM raw_race_data a
+USING raw_race_data b
+WHERE a.race_id = b.race_id
+  AND a.data_type = b.data_type
+  AND a.race_date = b.race_date
+  AND a.record_key = b.record_key
+  AND a.record_hash = b.record_hash
+  AND a.id < b.id;
+
+ALTER TABLE raw_race_data ALTER COLUMN record_hash SET NOT NULL;
+ALTER TABLE raw_race_data ADD CONSTRAINT raw_race_data_record_key
+    UNIQUE (race_id, data_type, race_date, record_key, record_hash);
+
+COMMIT;
@@ -0,0 +1,118 @@
+-- Migration: Partition raw_race_data by race_date (monthly)
+-- ============================================
+-- Purpose: Keep the hot table small. Each month lives in its own partition
+-- (raw_race_data_YYYYMM); worker_archive.py exports old months to local
+-- Parquet and drops the partition in one statement (drop_raw_partition).
+--
+-- Notes:
+--   - race_date is TEXT 'YYYYMMDD', so monthly ranges are ['YYYYMM01', next 'YYYYMM01').
+--   - Rows with an empty / malformed race_date land in raw_race_data_default.
+--   - A month's partition must exist before its rows arrive (a partition cannot be
+--     attached over rows already sitting in the default partition).
+--     worker_archive.py calls ensure_raw_partition for the coming months on every run;
+--     worker_backfill.py calls it for the months it loads before writing.
+--   - Run in Supabase SQL Editor. Takes a lock on raw_race_data while copying.
+
+BEGIN;
+
+ALTER TABLE raw_race_data RENAME TO raw_race_data_old;
+ALTER SEQUENCE raw_race_data_id_seq OWNED BY NONE;
+
+CREATE TABLE raw_race_data (
+    id BIGINT NOT NULL DEFAULT nextval('raw_race_data_id_seq'),
+    race_id TEXT NOT NULL,
+    data_type TEXT NOT NULL,
+    race_date TEXT NOT NULL DEFAULT '',
+    content JSONB,
+    raw_string TEXT,
+    status TEXT DEFAULT 'pending',
+    timestamp TIMESTAMPTZ DEFAULT NOW(),
+    updated_at TIMESTAMPTZ DEFAULT NOW(),     -- Bumped by trg_raw_race_data_touch (mirror watermark)
+    PRIMARY KEY (id, race_date),
+    UNIQUE (race_id, data_type, race_date)   -- Partition key must be part of unique keys
+) PARTITION BY RANGE (race_date);
+
+CREATE TABLE raw_race_data_default PARTITION OF raw_race_data DEFAULT;
+
+-- Create the partition for one month (YYYYMM) if missing
+CREATE OR REPLACE FUNCTION ensure_raw_partition(p_month TEXT) RETURNS TEXT
+LANGUAGE plpgsql SECURITY DEFINER
+AS $$
+DECLARE
+    part TEXT := 'raw_race_data_' || p_month;
+    next_month TEXT;
+BEGIN
+    IF p_month !~ '^\d{6}$' THEN
+        RAISE EXCEPTION 'invalid month: %', p_month;
+    END IF;
+    next_month := to_char(to_date(p_month, 'YYYYMM') + INTERVAL '1 month', 'YYYYMM');
+    IF to_regclass(part) IS NULL THEN
+        EXECUTE format('CREATE TABLE %I PARTITION OF raw_race_data FOR VALUES FROM (%L) TO (%L)',
+                       part, p_month || '01', next_month || '01');
+    END IF;
+    RETURN part;
+END;
+$$;
+
+-- Month partitions with their estimated row counts (oldest first)
+CREATE OR REPLACE FUNCTION list_raw_partitions()
+RETURNS TABLE (partition_name TEXT, race_month TEXT, row_estimate BIGINT)
+LANGUAGE sql STABLE SECURITY DEFINER
+AS $$
+    SELECT c.relname::TEXT, right(c.relname, 6), GREATEST(c.reltuples, 0)::BIGINT
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'raw_race_data'::regclass
+      AND c.relname ~ '^raw_race_data_\d{6}$'
+    ORDER BY 2;
+$$;
+
+-- Drop one archived month in a single statement
+CREATE OR REPLACE FUNCTION drop_raw_partition(p_month TEXT) RETURNS VOID
+LANGUAGE plpgsql SECURITY DEFINER
+AS $$
+BEGIN
+    IF p_month !~ '^\d{6}$' THEN
+        RAISE EXCEPTION 'invalid month: %', p_month;
+    END IF;
+    EXECUTE format('DROP TABLE IF EXISTS %I', 'raw_race_data_' || p_month);
+END;
+$$;
+
+-- DDL helpers are for the archive job (service role) only
+REVOKE EXECUTE ON FUNCTION ensure_raw_partition(TEXT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION drop_raw_partition(TEXT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION list_raw_partitions() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION ensure_raw_partition(TEXT) TO service_role;
+GRANT EXECUTE ON FUNCTION drop_raw_partition(TEXT) TO service_role;
+GRANT EXECUTE ON FUNCTION list_raw_partitions() TO service_role;
+
+-- Partitions for every month already stored
+DO $$
+DECLARE
+    m TEXT;
+BEGIN
+    FOR m IN SELECT DISTINCT left(race_date, 6) FROM raw_race_data_old WHERE race_date ~ '^\d{8}$' LOOP
+        PERFORM ensure_raw_partition(m);
+    END LOOP;
+END $$;
+
+INSERT INTO raw_race_data (id, race_id, data_type, race_date, content, raw_string, status, timestamp, updated_at)
+SELECT id, race_id, data_type, COALESCE(race_date, ''), content, raw_string, status, timestamp, timestamp
+FROM raw_race_data_old;
+
+DROP TABLE raw_race_data_old;
+ALTER SEQUENCE raw_race_data_id_seq OWNED BY raw_race_data.id;
+
+-- Indexes are created on every partition automatically
+CREATE INDEX IF NOT EXISTS idx_raw_race_data_type_date ON raw_race_data(data_type, race_date);
+CREATE INDEX IF NOT EXISTS idx_raw_race_data_timestamp ON raw_race_data(timestamp DESC);
+CREATE INDEX IF NOT EXISTS idx_raw_race_data_updated ON raw_race_data(updated_at);
+
+-- Row triggers on the parent apply to every partition (touch_updated_at: supabase_schema.sql)
+DROP TRIGGER IF EXISTS trg_raw_race_data_touch ON raw_race_data;
+CREATE TRIGGER trg_raw_race_data_touch
+    BEFORE UPDATE ON raw_race_data
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+COMMIT;
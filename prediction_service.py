@@ -0,0 +1,271 @@
+"""
+Prediction Service
+==================
+A resident process that keeps the model, the horse_history store and the
+pooled Supabase session warm, and runs prediction jobs submitted over local
+HTTP. Schedulers and the collector submit jobs instead of starting
+`py worker_predict.py` (interpreter + pandas import + model load) or building
+a new PredictorV4_1 every cycle.
+
+Jobs (POST /jobs, JSON body):
+    {"job": "predict", "date": "20260207"}                       worker_predict.run_inference (prediction_results)
+    {"job": "predict", "date": "20260207", "race_id": "2026..."}  one race only
+    {"job": "cycle", "date": "20260207"}                          PredictorV4_1.run (bet_queue)
+    "wait": false queues the job and returns at once (202).
+
+Jobs run one at a time in submission order; a job identical to one still
+queued is merged into it (a burst of odds updates predicts the race once).
+GET /health reports the loaded model, uptime and recent job timings.
+
+The client half (submit / service_alive) is standard library only, so the
+32bit collector and the autopilot can call it.
+
+Usage:
+    py prediction_service.py                                # http://127.0.0.1:8765
+    python prediction_service.py --submit predict --date 20260207
+    python prediction_service.py --health
+
+    from prediction_service import submit, ServiceUnavailable
+    submit("predict", date="20260207")                      # Waits for the result
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import datetime
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+SERVICE_URL = os.getenv("PREDICTION_SERVICE_URL", f"http://{SERVICE_HOST}:{SERVICE_PORT}")
+JOB_TIMEOUT = 300      # Seconds a waiting client gives a job
+RECENT_JOBS = 50       # Finished jobs kept for /health
+
+JOBS = ("predict", "cycle")
+
+
+# --- Client (standard library only) ---
+
+class ServiceUnavailable(Exception):
+    """The service is not running / not reachable"""
+
+
+def _request(method, path, payload=None, timeout=5.0, url=None):
+    data = None if payload is None else json.dumps(payload).encode("utf-8")
+    req = urllib.request.Request((url or SERVICE_URL) + path, data=data, method=method,
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return json.loads(resp.read() or b"null")
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read() or b"{}").get("error")
+        except ValueError:
+            message = None
+        raise RuntimeError(message or f"HTTP {e.code}") from None
+    except (urllib.error.URLError, ConnectionError, TimeoutError) as e:
+        raise ServiceUnavailable(f"{url or SERVICE_URL}: {e}") from None
+
+
+def service_alive(url=None, timeout=1.0):
+    try:
+        return bool(_request("GET", "/health", timeout=timeout, url=url).get("ready"))
+    except (ServiceUnavailable, RuntimeError, ValueError):
+        return False
+
+
+def submit(job, date=None, race_id=None, wait=True, timeout=JOB_TIMEOUT, url=None):
+    """
+    Submit a job; returns the finished job record (wait=True) or the queued one.
+    Raises ServiceUnavailable when no service answers, RuntimeError when the job failed.
+    """
+    payload = {"job": job, "date": date, "race_id": race_id, "wait": wait}
+    record = _request("POST", "/jobs", payload, timeout=timeout + 5 if wait else 5.0, url=url)
+    if record.get("status") == "failed":
+        raise RuntimeError(f"{job} {date or ''} failed: {record.get('error')}")
+    return record
+
+
+# --- Service ---
+
+class PredictionService:
+    """Warm model / predictor and a single job thread"""
+
+    def __init__(self):
+        # Heavy imports live here: the client half must stay importable without pandas
+        import worker_predict
+        from worker_predictor_v4_1 import PredictorV4_1
+
+        t0 = time.perf_counter()
+        self._predict_mod = worker_predict
+        worker_predict.load_prediction_model()   # Warm; ACTIVE switches are picked up per job
+        self.predictor = PredictorV4_1()
+        self.load_seconds = time.perf_counter() - t0
+        self.started_at = time.time()
+
+        self.queue = queue.Queue()
+        self.pending = {}             # (job, date, race_id) -> queued record
+        self.recent = []
+        self.lock = threading.Lock()
+        self.next_id = 1
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def enqueue(self, job, date=None, race_id=None):
+        """Queued (or merged) job record; record['done'] is set when it finishes"""
+        if job not in JOBS:
+            raise ValueError(f"Unknown job '{job}' (expected one of {', '.join(JOBS)})")
+        date = date or datetime.date.today().strftime("%Y%m%d")
+        key = (job, date, race_id or None)
+        with self.lock:
+            record = self.pending.get(key)
+            if record is not None:
+                record["merged"] += 1
+                return record
+            record = {"id": self.next_id, "job": job, "date": date, "race_id": race_id or None,
+                      "status": "queued", "queued_at": time.time(), "merged": 0,
+                      "done": threading.Event()}
+            self.next_id += 1
+            self.pending[key] = record
+        self.queue.put(record)
+        return record
+
+    def _run(self, record):
+        if record["job"] == "predict":
+            saved = self._predict_mod.run_inference(record["date"], record["race_id"])
+            return {"saved": saved or 0}
+        bets = self.predictor.run(record["date"])
+        return {"bets": len(bets or [])}
+
+    def _worker(self):
+        while True:
+            record = self.queue.get()
+            with self.lock:
+                self.pending.pop((record["job"], record["date"], record["race_id"]), None)
+            record["status"] = "running"
+            t0 = time.perf_counter()
+            try:
+                record["result"] = self._run(record)
+                record["status"] = "done"
+            except Exception as e:
+                record["error"] = f"{type(e).__name__}: {e}"
+                record["status"] = "failed"
+            record["seconds"] = round(time.perf_counter() - t0, 3)
+            record["wait_seconds"] = round(time.time() - record["queued_at"] - record["seconds"], 3)
+            print(f"[SERVICE] #{record['id']} {record['job']} {record['date']} {record['race_id'] or ''} "
+                  f"-> {record['status']} in {record['seconds']:.2f}s", flush=True)
+            with self.lock:
+                self.recent = (self.recent + [record])[-RECENT_JOBS:]
+            record["done"].set()
+
+    def health(self):
+        with self.lock:
+            recent = [public(r) for r in self.recent[-10:]]
+            queued = len(self.pending)
+        return {
+            "ready": True,
+            "model_version": self._predict_mod.ACTIVE_MODEL.current()[0],
+            "brain": getattr(self.predictor.brain, "model", None) is not None,
+            "load_seconds": round(self.load_seconds, 2),
+            "uptime_seconds": round(time.time() - self.started_at),
+            "queued": queued,
+            "recent": recent,
+        }
+
+
+def public(record):
+    return {k: v for k, v in record.items() if k != "done"}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    service = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/health":
+            self._send(200, self.service.health())
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            self._send(404, {"error": "not found"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            record = self.service.enqueue(body.get("job"), body.get("date"), body.get("race_id"))
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+            return
+        if body.get("wait", True) is False:
+            self._send(202, public(record))
+            return
+        record["done"].wait(JOB_TIMEOUT)
+        self._send(200 if record["done"].is_set() else 202, public(record))
+
+
+def serve(host=SERVICE_HOST, port=SERVICE_PORT, service=None):
+    """Returns a running server (serve_forever in a daemon thread); call .shutdown() to stop"""
+    handler = type("BoundHandler", (Handler,), {"service": service or PredictionService()})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resident prediction service")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--submit", choices=JOBS, help="Submit a job to a running service and wait")
+    parser.add_argument("--date", help="Target date YYYYMMDD (default today)")
+    parser.add_argument("--race", help="Race id (predict one race)")
+    parser.add_argument("--health", action="store_true", help="Print a running service's status")
+    args = parser.parse_args()
+    url = f"http://{args.host}:{args.port}"
+
+    try:
+        if args.health:
+            print(json.dumps(_request("GET", "/health", url=url), ensure_ascii=False, indent=1))
+            return 0
+        if args.submit:
+            record = submit(args.submit, args.date, args.race, url=url)
+            print(json.dumps(record, ensure_ascii=False, indent=1))
+            return 0
+    except (ServiceUnavailable, RuntimeError) as e:
+        print(f"[ERROR] {e}")
+        return 1
+
+    try:
+        sys.stdout.reconfigure(encoding="utf-8")
+    except Exception:
+        pass
+    print("[SERVICE] Loading model and predictor...")
+    server = serve(args.host, args.port)
+    print(f"[SERVICE] Ready on {url} (loaded in {server.RequestHandlerClass.service.load_seconds:.1f}s)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Typed Race Tables
+=================
+Converts JRAParser output into rows for the typed tables `race_entries`
+and `win_odds` (see supabase_schema.sql). Normalization happens once at
+ingest so readers can select typed columns without json.loads / zfill /
+odds scaling.
+
+Pure standard library: this runs inside the 32bit collector environment.
+"""
+
+import datetime
+
+ODDS_TYPES = ("0B30", "0B31")
+
+
+def _to_int(val):
+    """'07' -> 7, '' / '**' / None -> None"""
+    val = str(val or "").strip()
+    return int(val) if val.isdigit() else None
+
+
+def _to_tenths(val):
+    """10x integer string -> float ('0123' -> 12.3). 0 or masked -> None"""
+    num = _to_int(val)
+    if not num:
+        return None
+    return num / 10.0
+
+
+def to_entry_row(parsed: dict, race_date: str) -> dict:
+    """0B15 SE record -> race_entries row (None if not a horse entry)"""
+    if not parsed or parsed.get("record_type") != "SE":
+        return None
+    race_id = parsed.get("race_id")
+    horse_num = _to_int(parsed.get("horse_num"))
+    if not race_id or not horse_num:
+        return None
+    return {
+        "race_id": race_id,
+        "race_date": race_date,
+        "horse_num": horse_num,
+        "horse_id": parsed.get("horse_id") or None,  # 血統登録番号 (horse_history key)
+        "waku": _to_int(parsed.get("waku")),
+        "horse_name": parsed.get("horse_name", ""),
+        "sex": _to_int(parsed.get("sex_code")),
+        "age": _to_int(parsed.get("age")),
+        "weight": _to_tenths(parsed.get("weight")),  # 550 -> 55.0 kg
+        "jockey": parsed.get("jockey", ""),
+    }
+
+
+def to_odds_rows(race_id: str, race_date: str, parsed: dict, snapshot_ts: str = None) -> list:
+    """0B30/0B31 odds record -> list of win_odds rows"""
+    if not parsed or "odds" not in parsed:
+        return []
+    if snapshot_ts is None:
+        snapshot_ts = datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+    rows = []
+    for o in parsed["odds"]:
+        horse_num = _to_int(o.get("horse_num"))
+        if not horse_num:
+            continue
+        rows.append({
+            "race_id": race_id,
+            "race_date": race_date,
+            "horse_num": horse_num,
+            "odds": _to_tenths(o.get("odds_tan")),
+            "pop": _to_int(o.get("pop_tan")) or None,  # '0' = not parsed
+            "snapshot_ts": snapshot_ts,
+        })
+    return rows
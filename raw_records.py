@@ -0,0 +1,74 @@
+"""
+raw_race_data Row Builder
+=========================
+Single place that turns one JV-Link record into a raw_race_data row, used
+by every uploader (worker_collector, step2_upload, worker_reuploader).
+
+Dedupe key: (race_id, data_type, race_date, record_key, record_hash)
+    record_key  - record within the race: record type + horse number ('SE07', 'HR', 'O1')
+    record_hash - md5 of the stored raw bytes (32 hex chars, fixed width)
+
+The stored bytes are canonical (canonical_record): the cp932 fixed-width
+record as in the step1 download files, CR/LF stripped, untruncated. The
+collector's JVRead string and a file line therefore give the same key.
+
+Identical re-uploads hit the same key; a changed record (e.g. new odds)
+gets a new hash. Index size no longer depends on record length.
+md5 is used because Postgres computes it natively (backfill in
+migration_record_hash.sql).
+
+Rows are stamped with jra_parser.PARSER_VERSION; worker_reparse.py
+re-parses rows from older versions when the specs change.
+
+Pure standard library: this runs inside the 32bit collector environment.
+"""
+
+import json
+import base64
+import hashlib
+from jra_parser import PARSER_VERSION
+
+# PostgREST on_conflict target (must match the unique constraint)
+RAW_CONFLICT = "race_id,data_type,race_date,record_key,record_hash"
+RECORD_ENCODING = "cp932"  # JV-Link / download file encoding
+
+
+def canonical_record(raw) -> bytes:
+    """JVRead string or file line (str or bytes) -> the bytes stored and hashed"""
+    if isinstance(raw, str):
+        raw = raw.encode(RECORD_ENCODING, errors="replace")
+    return bytes(raw).rstrip(b"\r\n")
+
+
+def record_hash(raw_bytes: bytes) -> str:
+    return hashlib.md5(raw_bytes).hexdigest()
+
+
+def record_key(parsed: dict) -> str:
+    """'SE' + horse_num for per-horse records, record type otherwise"""
+    if not parsed:
+        return ""
+    rtype = parsed.get("record_type", "") or ""
+    horse_num = str(parsed.get("horse_num", "") or "").strip()
+    return f"{rtype}{horse_num.zfill(2)}" if horse_num else rtype
+
+
+def build_raw_row(race_id: str, race_date: str, data_type: str, parsed: dict,
+                  raw, key: str = None, parser_version: str = PARSER_VERSION) -> dict:
+    """
+    raw_race_data row; raw (str or bytes) is stored as canonical_record(raw)
+    and the hash covers exactly the bytes stored in raw_string.
+    parser_version is None for content not produced by JRAParser
+    (worker_reparse.py picks those rows up).
+    """
+    raw_bytes = canonical_record(raw)
+    return {
+        "race_id": race_id,
+        "race_date": race_date,
+        "data_type": data_type,
+        "record_key": record_key(parsed) if key is None else key,
+        "record_hash": record_hash(raw_bytes),
+        "content": json.dumps(parsed, ensure_ascii=False),
+        "raw_string": base64.b64encode(raw_bytes).decode("ascii"),
+        "parser_version": parser_version,
+    }
@@ -8,11 +8,13 @@ CREATE TABLE raw_race_data (
     race_id TEXT NOT NULL,
     race_date TEXT NOT NULL,
     data_type TEXT NOT NULL, -- '0B15', '0B30', '0B12' etc.
+    record_key TEXT NOT NULL DEFAULT '', -- 'SE07' (type + horse_num) / 'HR' (see raw_records.py)
+    record_hash TEXT NOT NULL, -- md5 hex of the raw bytes (fixed width, 32 chars)
     raw_string TEXT NOT NULL, -- Base64 encoded raw data (or direct text if possible, but safe to keep b64)
     content JSONB, -- Parsed data
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW(),
-    PRIMARY KEY (race_id, data_type, raw_string) -- Composite key to prevent exact duplicates
+    PRIMARY KEY (race_id, data_type, race_date, record_key, record_hash) -- Fixed-width key to prevent exact duplicates
 );
 
 CREATE INDEX idx_raw_race_data_date ON raw_race_data(race_date);
@@ -36,14 +36,12 @@ except ImportError as e:
     print(f"[WARN] JV-Link not available: {e}")
     JV_LINK_AVAILABLE = False
 
-from worker_predictor_v4_1 import PredictorV4_1, run_prediction_cycle
+from worker_predictor_v4_1 import PredictorV4_1
+from prediction_service import submit, ServiceUnavailable
 from worker_shopper import Shopper
 from cloud_manager import CloudManager
-from supabase import create_client
 
 # --- Configuration ---
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
 # Betting Schedule (JST)
 RACE_START_HOUR = 10  # First race around 10:00
@@ -56,10 +54,10 @@ class LocalRunner:
         print("JRA Automated Betting System - Local Mode")
         print("=" * 50)
         
-        self.supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-        self.cm = CloudManager(self.supabase)
-        self.shopper = Shopper(self.supabase)
+        self.cm = CloudManager()
+        self.shopper = Shopper()
         self.running = True
+        self.predictor = None  # Warm in-process predictor when no prediction service runs
         
         # Log startup
         self.cm.log_system_event("INFO", "Local Runner Started", 
@@ -86,7 +84,13 @@ class LocalRunner:
         """Run AI prediction cycle"""
         try:
             print("\n[AI] Running prediction cycle...")
-            run_prediction_cycle()
+            try:
+                record = submit("cycle")
+                print(f"[AI] Service: {record.get('result')} in {record.get('seconds', 0):.2f}s")
+            except ServiceUnavailable:
+                if self.predictor is None:
+                    self.predictor = PredictorV4_1()
+                self.predictor.run()
             self.cm.log_system_event("INFO", "Prediction Complete", "Bets queued")
             return True
         except Exception as e:
@@ -1,6 +1,3 @@
-import pandas as pd
-import numpy as np
-import joblib
 import sys
 import os
 # import matplotlib.pyplot as plt # Skipped
@@ -8,7 +5,7 @@ import os
 # Add local path
 sys.path.append(os.getcwd())
 
-from local_engine.preprocess import process_features
+from local_engine.feature_cache import load_features
 
 MODEL_PATH = r"C:\TFJV\my-racing-dashboard\local_engine\final_model.pkl"
 DATA_PATH = r"C:\TFJV\TXT\20210101-20251231-2.csv"
@@ -19,15 +16,8 @@ def simulate():
     # 1. Load & Prepare Data (Same as previous steps)
     print("Loading Data...")
     try:
-        df = pd.read_csv(DATA_PATH, encoding='cp932', low_memory=False)
-        df, features = process_features(df)
-        df = df.dropna(subset=features + ['着順'])
-        df['is_win'] = df['着順'].apply(lambda x: 1 if x <= 1 else 0)
-        
-        # Load Model & Predict
-        model = joblib.load(MODEL_PATH)
-        df['ai_prob'] = model.predict_proba(df[features])[:, 1]
-        df['ev'] = df['ai_prob'] * df['単勝オッズ']
+        # Features, is_win, ai_prob and ev (cached per CSV / preprocess / model)
+        df, features = load_features(DATA_PATH, MODEL_PATH)
         
         # Sort Chronologically
         if 'Date' in df.columns:
@@ -0,0 +1,161 @@
+"""
+Startup Profiler
+================
+Measures what each entry point costs before it does any work: every module
+is imported in a fresh interpreter with `python -X importtime`, repeated,
+and the fastest run is kept. Reports the module's cumulative import time,
+the interpreter wall time and the top-level packages that made it up.
+
+ENTRY_POINTS holds a budget per module plus packages it must not pull in
+at import time (pandas in the lightweight workers, sklearn / joblib /
+lightgbm anywhere, local_engine.brain in the predictors). --check turns a
+budget or forbidden-import violation into exit code 1, so a new top-level
+import in a worker shows up in CI / before a race day instead of as a
+slower cycle.
+
+Modules that cannot be imported here (a missing optional dependency, the
+Windows-only collector) are reported as SKIP, not as failures.
+
+Usage:
+    python startup_profile.py                       # All entry points
+    python startup_profile.py worker_predict app    # Selected modules
+    python startup_profile.py --check --json startup.json
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+REPEAT = 3
+TOP_PACKAGES = 6
+
+HEAVY_ML = ("sklearn", "joblib", "lightgbm")
+DATA_STACK = ("pandas", "numpy")
+
+# module: (budget ms for the import, packages it must not import)
+ENTRY_POINTS = {
+    "prediction_service": (150, DATA_STACK + HEAVY_ML),
+    "worker_autopilot": (150, DATA_STACK + HEAVY_ML),
+    "worker_collector": (400, DATA_STACK + HEAVY_ML),
+    "worker_mirror": (350, DATA_STACK + HEAVY_ML),
+    "worker_reparse": (400, DATA_STACK + HEAVY_ML),
+    "worker_backfill": (450, DATA_STACK + HEAVY_ML),
+    "worker_archive": (350, DATA_STACK + HEAVY_ML),
+    "horse_history": (350, DATA_STACK + HEAVY_ML),
+    "db_client": (300, DATA_STACK + HEAVY_ML + ("asyncio",)),
+    "worker_predict": (1200, HEAVY_ML),
+    "worker_predictor_v4_1": (1000, HEAVY_ML + ("local_engine.brain",)),
+    "worker_predictor": (1000, HEAVY_ML + ("local_engine.brain",)),
+    "worker_shopper": (1500, DATA_STACK + HEAVY_ML),
+    "run_local": (1500, HEAVY_ML),
+    "app": (2500, HEAVY_ML),
+}
+
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr):
+    """-X importtime output -> [(module, self_us, cumulative_us, depth)] in print order"""
+    rows = []
+    for line in stderr.splitlines():
+        m = LINE.match(line)
+        if m:
+            # Nesting is shown as 2 extra spaces per level after the bar
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), (len(m.group(3)) - 1) // 2))
+    return rows
+
+
+def import_once(module, python=sys.executable):
+    """One cold import in a new interpreter -> (rows, wall seconds, error or None)"""
+    t0 = time.perf_counter()
+    proc = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    wall = time.perf_counter() - t0
+    rows = parse_importtime(proc.stderr)
+    error = None
+    if proc.returncode != 0:
+        tail = [l for l in proc.stderr.splitlines() if not l.startswith("import time:")]
+        error = tail[-1] if tail else f"exit code {proc.returncode}"
+    return rows, wall, error
+
+
+def profile(module, repeat=REPEAT, python=sys.executable):
+    """Fastest of `repeat` cold imports, summarized"""
+    best = None
+    for _ in range(repeat):
+        rows, wall, error = import_once(module, python)
+        if error:
+            return {"module": module, "status": "skip", "error": error}
+        total = next((cum for name, _, cum, _ in rows if name == module), None)
+        if best is None or (total or 0) < best["import_ms"] * 1000:
+            by_package = {}
+            for name, self_us, _, _ in rows:
+                top = name.split(".")[0]
+                by_package[top] = by_package.get(top, 0) + self_us
+            best = {
+                "module": module,
+                "status": "ok",
+                "import_ms": round((total or 0) / 1000, 1),
+                "wall_ms": round(wall * 1000, 1),
+                "modules": [name for name, _, _, _ in rows],
+                "packages": {k: round(v / 1000, 1)
+                             for k, v in sorted(by_package.items(), key=lambda kv: -kv[1])},
+            }
+    return best
+
+
+def check(result, budget_ms, forbidden):
+    """Violations for one profiled module"""
+    if result["status"] != "ok":
+        return []
+    problems = []
+    if budget_ms is not None and result["import_ms"] > budget_ms:
+        problems.append(f"import {result['import_ms']:.0f} ms > budget {budget_ms} ms")
+    loaded = set(result["modules"])
+    for name in forbidden:
+        if name in loaded or any(m.startswith(name + ".") for m in loaded):
+            problems.append(f"imports {name}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile of the entry points")
+    parser.add_argument("modules", nargs="*", help="Modules to profile (default: ENTRY_POINTS)")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="Cold imports per module (fastest kept)")
+    parser.add_argument("--check", action="store_true", help="Exit 1 on a budget / forbidden-import violation")
+    parser.add_argument("--json", help="Write the results to this file")
+    args = parser.parse_args()
+
+    results, failed = [], 0
+    for module in args.modules or list(ENTRY_POINTS):
+        budget, forbidden = ENTRY_POINTS.get(module, (None, HEAVY_ML))
+        result = profile(module, args.repeat)
+        if result["status"] != "ok":
+            print(f"[SKIP] {module:<24} {result['error']}")
+            results.append(result)
+            continue
+        problems = check(result, budget, forbidden)
+        result["problems"] = problems
+        failed += bool(problems)
+        top = ", ".join(f"{k} {v:.0f}" for k, v in list(result["packages"].items())[:TOP_PACKAGES])
+        budget_str = f"/ {budget}" if budget is not None else ""
+        print(f"[{'FAIL' if problems else 'OK'}] {module:<24} {result['import_ms']:7.0f} ms {budget_str:<7} "
+              f"(wall {result['wall_ms']:.0f} ms) | {top}")
+        for p in problems:
+            print(f"       - {p}")
+        results.append(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([{k: v for k, v in r.items() if k != "modules"} for r in results], f, indent=1)
+    if failed:
+        print(f"[STARTUP] {failed} entry point(s) over budget or importing forbidden modules")
+    return 1 if args.check and failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
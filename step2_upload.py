@@ -1,18 +1,10 @@
 
 import os
 import glob
-import json
-import base64
-import datetime
-from dotenv import load_dotenv
-from supabase import create_client, Client
+from db_client import upsert_rows
 from jra_parser import JRAParser
+from raw_records import build_raw_row, RAW_CONFLICT
 
-# Load Environment Variables
-load_dotenv()
-url = os.environ.get("SUPABASE_URL")
-key = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
 
 def process_and_upload():
     print("=== Step 2: Specification-Driven Data Upload ===")
@@ -58,7 +50,8 @@ def process_and_upload():
             if not line.strip(): continue
             
             # ユーザー指示通りテキストで読み込んだが、パースとBase64保存のためにバイトに戻す
-            line_bytes = line.encode('cp932', errors='replace')
+            # 改行は除く (record_hash は worker_backfill と同じくレコード本体のみ)
+            line_bytes = line.rstrip('\r\n').encode('cp932', errors='replace')
             
             # JRAParser handles bytes (or strings) correctly now
             parser = JRAParser(line_bytes)
@@ -72,19 +65,9 @@ def process_and_upload():
             if not race_id or race_id == "UNKNOWN": 
                 continue
             
-            # 馬番を取得して一意キーに含める
-            horse_num = parsed_content.get("horse_num", "00")
-            unique_key = f"{race_id}_{data_type}_{horse_num}"
-            
-            # Content カラムに辞書データを格納 (ensure_ascii=False で日本語を維持)
-            # raw_string カラムにはオリジナルのバイナリをBase64で保存
-            record = {
-                "race_id": unique_key,  # race_id + data_type + horse_num で一意キーに
-                "race_date": date_str,
-                "data_type": data_type,
-                "content": json.dumps(parsed_content, ensure_ascii=False),
-                "raw_string": base64.b64encode(line_bytes).decode('utf-8')
-            }
+            # 馬ごとの区別は record_key (SE07 等) と record_hash で行う (raw_records.py)
+            # race_id には素の race_id をそのまま入れる
+            record = build_raw_row(race_id, date_str, data_type, parsed_content, line_bytes)
             records.append(record)
             
         if records:
@@ -94,7 +77,7 @@ def process_and_upload():
             try:
                 for i in range(0, len(records), BATCH_SIZE):
                     batch = records[i:i+BATCH_SIZE]
-                    supabase.table("raw_race_data").upsert(batch).execute()
+                    upsert_rows("raw_race_data", batch, on_conflict=RAW_CONFLICT)
                     success_count += len(batch)
                 print(f"   Successfully uploaded {success_count} records.")
             except Exception as e:
@@ -20,9 +20,12 @@ CREATE TABLE raw_race_data (
     race_date TEXT,
     content JSONB,
     raw_string TEXT,
+    record_key TEXT NOT NULL DEFAULT '',
+    record_hash TEXT NOT NULL,
+    parser_version TEXT,
     status TEXT DEFAULT 'pending',
     timestamp TIMESTAMPTZ DEFAULT NOW(),
-    UNIQUE(race_id, data_type)
+    CONSTRAINT raw_race_data_record_key UNIQUE(race_id, data_type, race_date, record_key, record_hash)
 );
 */
 
@@ -41,25 +44,17 @@ ADD COLUMN IF NOT EXISTS content JSONB;
 ALTER TABLE raw_race_data 
 ADD COLUMN IF NOT EXISTS raw_string TEXT;
 
+-- Add parser_version column if missing (jra_parser.PARSER_VERSION, see worker_reparse.py)
+ALTER TABLE raw_race_data 
+ADD COLUMN IF NOT EXISTS parser_version TEXT;
+
 -- Add status column if missing
 ALTER TABLE raw_race_data 
 ADD COLUMN IF NOT EXISTS status TEXT DEFAULT 'pending';
 
--- Update unique constraint (if needed)
--- Note: This may fail if constraint already exists - that's OK
-DO $$
-BEGIN
-    IF NOT EXISTS (
-        SELECT 1 FROM pg_constraint 
-        WHERE conname = 'raw_race_data_race_id_data_type_key'
-    ) THEN
-        ALTER TABLE raw_race_data 
-        ADD CONSTRAINT raw_race_data_race_id_data_type_key 
-        UNIQUE(race_id, data_type);
-    END IF;
-EXCEPTION WHEN OTHERS THEN
-    RAISE NOTICE 'Constraint may already exist, skipping...';
-END $$;
+-- Dedupe key (record_key / record_hash columns and backfill):
+-- run migration_record_hash.sql
+
 
 -- Create indexes (IF NOT EXISTS handles duplicates)
 CREATE INDEX IF NOT EXISTS idx_raw_race_data_date 
@@ -98,3 +93,348 @@ CREATE TABLE IF NOT EXISTS race_results (
 
 COMMENT ON TABLE race_results IS 'Scraped race results for verification';
 
+
+-- ============================================
+-- Typed Tables: race_entries / win_odds
+-- ============================================
+-- Purpose: Normalized copies of 0B15 (SE) and 0B30/0B31 (odds), written by
+-- worker_collector.py at ingest time (see race_tables.py).
+-- Readers select typed columns directly (no JSON parsing / zfill / odds / 10).
+
+CREATE TABLE IF NOT EXISTS race_entries (
+    race_id TEXT NOT NULL,        -- YYYYMMDDJJKKHHRR
+    race_date TEXT NOT NULL,      -- YYYYMMDD
+    horse_num SMALLINT NOT NULL,
+    horse_id TEXT,                -- 血統登録番号 (horse_history key)
+    waku SMALLINT,
+    horse_name TEXT,
+    sex SMALLINT,                 -- 1=牡 2=牝 3=セ
+    age SMALLINT,
+    weight REAL,                  -- 斤量 (kg)
+    jockey TEXT,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (race_id, horse_num)
+);
+
+CREATE INDEX IF NOT EXISTS idx_race_entries_date ON race_entries(race_date);
+
+-- Add horse_id column if missing (older race_entries)
+ALTER TABLE race_entries
+ADD COLUMN IF NOT EXISTS horse_id TEXT;
+
+-- Model registry version that produced each prediction (local_engine/models)
+ALTER TABLE prediction_results
+ADD COLUMN IF NOT EXISTS model_version TEXT;
+
+-- Upserts (merge-duplicates) do not re-apply DEFAULT NOW(); bump updated_at
+-- explicitly so incremental readers see changed entries (jockey, weight...).
+CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_race_entries_touch ON race_entries;
+CREATE TRIGGER trg_race_entries_touch
+    BEFORE UPDATE ON race_entries
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+-- Same for the tables worker_mirror.py follows: status PATCHes (bet_queue),
+-- re-scored upserts (prediction_results), re-parsed rows (raw_race_data) and
+-- corrected results keep their created_at / timestamp, so incremental readers
+-- use updated_at as the watermark. Existing rows get the migration time
+-- (one full re-pull by the mirror).
+ALTER TABLE raw_race_data ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+ALTER TABLE prediction_results ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+ALTER TABLE bet_queue ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+ALTER TABLE race_results ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ DEFAULT NOW();
+
+DROP TRIGGER IF EXISTS trg_raw_race_data_touch ON raw_race_data;
+CREATE TRIGGER trg_raw_race_data_touch
+    BEFORE UPDATE ON raw_race_data
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+DROP TRIGGER IF EXISTS trg_prediction_results_touch ON prediction_results;
+CREATE TRIGGER trg_prediction_results_touch
+    BEFORE UPDATE ON prediction_results
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+DROP TRIGGER IF EXISTS trg_bet_queue_touch ON bet_queue;
+CREATE TRIGGER trg_bet_queue_touch
+    BEFORE UPDATE ON bet_queue
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+DROP TRIGGER IF EXISTS trg_race_results_touch ON race_results;
+CREATE TRIGGER trg_race_results_touch
+    BEFORE UPDATE ON race_results
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+-- bet_queue dedupe key '<race_id>:<bet_type>:<horse_num>' (worker_predictor_v4_1.bet_key).
+-- The predictor re-scores the whole day every cycle and inserts with
+-- on_conflict=bet_key + ignore-duplicates, so a queued bet is never repeated
+-- and its status (approved / purchased) is never overwritten.
+-- Older rows keep NULL (NULLs do not conflict).
+ALTER TABLE bet_queue ADD COLUMN IF NOT EXISTS bet_key TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS uq_bet_queue_bet_key ON bet_queue(bet_key);
+
+CREATE INDEX IF NOT EXISTS idx_raw_race_data_updated ON raw_race_data(updated_at);
+CREATE INDEX IF NOT EXISTS idx_prediction_results_updated ON prediction_results(updated_at);
+CREATE INDEX IF NOT EXISTS idx_bet_queue_updated ON bet_queue(updated_at);
+CREATE INDEX IF NOT EXISTS idx_race_results_updated ON race_results(updated_at);
+
+CREATE TABLE IF NOT EXISTS win_odds (
+    race_id TEXT NOT NULL,
+    race_date TEXT NOT NULL,
+    horse_num SMALLINT NOT NULL,
+    odds REAL,                    -- 単勝オッズ (NULL = masked / not sold)
+    pop SMALLINT,                 -- 人気
+    snapshot_ts TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (race_id, horse_num, snapshot_ts)
+);
+
+CREATE INDEX IF NOT EXISTS idx_win_odds_date ON win_odds(race_date);
+CREATE INDEX IF NOT EXISTS idx_win_odds_latest ON win_odds(race_id, horse_num, snapshot_ts DESC);
+
+COMMENT ON TABLE race_entries IS 'Typed 0B15 horse entries, populated by collector';
+COMMENT ON TABLE win_odds IS 'Typed win odds snapshots (0B30/0B31), populated by collector';
+
+-- ============================================
+-- Feature Store: horse_history
+-- ============================================
+-- Purpose: Latest runs per horse for live lag features (see horse_history.py).
+-- One row per horse; predictors read a whole day's runners by primary key.
+-- Updated by worker_collector.py from 0B12 results, bootstrapped from TARGET CSV.
+
+CREATE TABLE IF NOT EXISTS horse_history (
+    horse_id TEXT PRIMARY KEY,    -- 血統登録番号
+    last_race_id TEXT,
+    last_race_date TEXT,          -- YYYYMMDD
+    last_pci REAL,                -- Previous run (= Prev_PCI / Prev_3F / Prev_Rank)
+    last_3f REAL,
+    last_rank SMALLINT,
+    prev_stale BOOLEAN DEFAULT FALSE,  -- last_pci / last_3f from the run before a rank-only live run
+    avg_pci REAL,                 -- Mean over the last 3 runs
+    avg_3f REAL,
+    avg_rank REAL,
+    recent JSONB,                 -- Last 5 runs, newest first
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+ALTER TABLE horse_history
+ADD COLUMN IF NOT EXISTS prev_stale BOOLEAN DEFAULT FALSE;
+
+CREATE INDEX IF NOT EXISTS idx_horse_history_updated ON horse_history(updated_at);
+
+COMMENT ON TABLE horse_history IS 'Per-horse recent runs and rolling aggregates (feature store)';
+
+-- ============================================
+-- Supabase Table: shadow_predictions
+-- ============================================
+-- Purpose: Scores of the registry's shadow models (local_engine/models/SHADOW),
+-- computed by PredictorV4_1 on the same feature rows as the active model.
+-- Latest score per race / horse / model. Only the active model writes bet_queue;
+-- would_bet_* record what the shadow model would have bet.
+
+CREATE TABLE IF NOT EXISTS shadow_predictions (
+    race_id TEXT NOT NULL,
+    race_date TEXT NOT NULL,      -- YYYYMMDD
+    horse_num SMALLINT NOT NULL,
+    model_version TEXT NOT NULL,  -- Shadow model
+    primary_version TEXT,         -- Active model of the same pass
+    ai_prob REAL,
+    primary_prob REAL,            -- Active model's probability for the same runner
+    odds REAL,
+    ev REAL,
+    prob_rank SMALLINT,
+    would_bet_win BOOLEAN,
+    would_bet_wide BOOLEAN,
+    scored_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (race_id, horse_num, model_version)
+);
+
+CREATE INDEX IF NOT EXISTS idx_shadow_predictions_date ON shadow_predictions(race_date, model_version);
+
+COMMENT ON TABLE shadow_predictions IS 'Shadow model scores next to the active model (live A/B), never bet on';
+
+-- Per shadow model: Brier score against the active model on the same runners,
+-- and what its win bets would have returned (race_results payouts)
+CREATE OR REPLACE VIEW shadow_model_summary AS
+SELECT
+    s.model_version,
+    count(DISTINCT s.race_id) AS races,
+    count(*) AS runners,
+    avg(power((r.rank_1_horse_num = s.horse_num)::INT - s.ai_prob, 2)) AS brier,
+    avg(power((r.rank_1_horse_num = s.horse_num)::INT - s.primary_prob, 2)) AS primary_brier,
+    count(*) FILTER (WHERE s.would_bet_win) AS win_bets,
+    count(*) FILTER (WHERE s.would_bet_win AND r.rank_1_horse_num = s.horse_num) AS win_hits,
+    coalesce(sum(r.pay_tan) FILTER (WHERE s.would_bet_win AND r.rank_1_horse_num = s.horse_num), 0) AS win_return
+FROM shadow_predictions s
+JOIN race_results r ON r.race_id = s.race_id
+GROUP BY s.model_version;
+
+-- ============================================
+-- RPC: get_day_snapshot(p_race_date, [since...])
+-- ============================================
+-- Purpose: One-call merged day view for app.py / worker_predict.py.
+-- Entries + latest odds snapshot + latest prediction + finish flags,
+-- deduplicated and joined server-side (only the columns the clients use).
+--
+-- Incremental refresh: pass the per-table high-water marks returned in
+-- entry_ts / odds_ts / pred_ts / result_ts. Only horses with a newer row in
+-- any source table are returned. NULL = no watermark (everything is new).
+--
+-- Usage (REST): POST /rest/v1/rpc/get_day_snapshot {"p_race_date": "20260207"}
+
+DROP FUNCTION IF EXISTS get_day_snapshot(TEXT);
+
+CREATE OR REPLACE FUNCTION get_day_snapshot(
+    p_race_date TEXT,
+    p_entries_since TIMESTAMPTZ DEFAULT NULL,
+    p_odds_since TIMESTAMPTZ DEFAULT NULL,
+    p_pred_since TIMESTAMPTZ DEFAULT NULL,
+    p_results_since TIMESTAMPTZ DEFAULT NULL
+)
+RETURNS TABLE (
+    race_id TEXT,
+    horse_num SMALLINT,
+    waku SMALLINT,
+    horse_name TEXT,
+    sex SMALLINT,
+    age SMALLINT,
+    weight REAL,
+    jockey TEXT,
+    odds_tan REAL,
+    pop_tan SMALLINT,
+    predict_score REAL,
+    predict_flag INTEGER,
+    finish_rank SMALLINT,         -- 1-3 from race_results, NULL otherwise
+    entry_ts TIMESTAMPTZ,         -- Source timestamps (client watermarks)
+    odds_ts TIMESTAMPTZ,
+    pred_ts TIMESTAMPTZ,
+    result_ts TIMESTAMPTZ
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT * FROM (
+        SELECT
+            e.race_id, e.horse_num, e.waku, e.horse_name, e.sex, e.age, e.weight, e.jockey,
+            o.odds, o.pop,
+            COALESCE(p.predict_score, 0)::REAL,
+            COALESCE(p.predict_flag, 0)::INTEGER,
+            (CASE e.horse_num
+                WHEN r.rank_1_horse_num THEN 1
+                WHEN r.rank_2_horse_num THEN 2
+                WHEN r.rank_3_horse_num THEN 3
+            END)::SMALLINT,
+            e.updated_at, o.snapshot_ts, p.updated_at, r.updated_at
+        FROM race_entries e
+        LEFT JOIN LATERAL (
+            SELECT w.odds, w.pop, w.snapshot_ts
+            FROM win_odds w
+            WHERE w.race_id = e.race_id AND w.horse_num = e.horse_num
+            ORDER BY w.snapshot_ts DESC
+            LIMIT 1
+        ) o ON TRUE
+        LEFT JOIN prediction_results p
+            ON p.race_id = e.race_id AND p.horse_num = LPAD(e.horse_num::TEXT, 2, '0')
+        LEFT JOIN race_results r
+            ON r.race_id = e.race_id
+        WHERE e.race_date = p_race_date
+    ) s (race_id, horse_num, waku, horse_name, sex, age, weight, jockey,
+         odds_tan, pop_tan, predict_score, predict_flag, finish_rank,
+         entry_ts, odds_ts, pred_ts, result_ts)
+    WHERE COALESCE(s.entry_ts > COALESCE(p_entries_since, '-infinity'), FALSE)
+       OR COALESCE(s.odds_ts > COALESCE(p_odds_since, '-infinity'), FALSE)
+       OR COALESCE(s.pred_ts > COALESCE(p_pred_since, '-infinity'), FALSE)
+       OR COALESCE(s.result_ts > COALESCE(p_results_since, '-infinity'), FALSE)
+    ORDER BY s.race_id, s.horse_num;
+$$;
+
+COMMENT ON FUNCTION get_day_snapshot(TEXT, TIMESTAMPTZ, TIMESTAMPTZ, TIMESTAMPTZ, TIMESTAMPTZ)
+    IS 'Merged day view (entries/odds/predictions/results) for dashboard and predictor, optionally incremental';
+
+-- ============================================
+-- Supabase Table: race_calendar
+-- ============================================
+-- Purpose: One row per race day for the dashboard date / venue selectors.
+-- Maintained by statement-level triggers on race_entries, win_odds and
+-- race_results, so every uploader keeps it current without extra calls.
+
+CREATE TABLE IF NOT EXISTS race_calendar (
+    race_date TEXT PRIMARY KEY,       -- YYYYMMDD
+    venues TEXT[] NOT NULL DEFAULT '{}',  -- Place codes ('05', '06', ...)
+    race_count INTEGER NOT NULL DEFAULT 0,
+    has_cards BOOLEAN NOT NULL DEFAULT FALSE,
+    has_odds BOOLEAN NOT NULL DEFAULT FALSE,
+    has_results BOOLEAN NOT NULL DEFAULT FALSE,
+    is_complete BOOLEAN GENERATED ALWAYS AS (has_cards AND has_odds AND has_results) STORED,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION refresh_race_calendar(p_dates TEXT[]) RETURNS VOID
+LANGUAGE sql
+AS $$
+    INSERT INTO race_calendar (race_date, venues, race_count, has_cards, has_odds, has_results, updated_at)
+    SELECT
+        d.race_date,
+        COALESCE((SELECT array_agg(DISTINCT substr(e.race_id, 9, 2) ORDER BY substr(e.race_id, 9, 2))
+                  FROM race_entries e WHERE e.race_date = d.race_date), '{}'),
+        (SELECT count(DISTINCT e.race_id) FROM race_entries e WHERE e.race_date = d.race_date),
+        EXISTS (SELECT 1 FROM race_entries e WHERE e.race_date = d.race_date),
+        EXISTS (SELECT 1 FROM win_odds w WHERE w.race_date = d.race_date),
+        EXISTS (SELECT 1 FROM race_results r WHERE replace(r.race_date::TEXT, '-', '') = d.race_date),
+        NOW()
+    FROM unnest(p_dates) AS d(race_date)
+    WHERE d.race_date IS NOT NULL
+    ON CONFLICT (race_date) DO UPDATE SET
+        venues = CASE WHEN EXCLUDED.race_count > 0 THEN EXCLUDED.venues ELSE race_calendar.venues END,
+        race_count = GREATEST(EXCLUDED.race_count, race_calendar.race_count),
+        has_cards = EXCLUDED.has_cards OR race_calendar.has_cards,
+        has_odds = EXCLUDED.has_odds OR race_calendar.has_odds,
+        has_results = EXCLUDED.has_results OR race_calendar.has_results,
+        updated_at = NOW();
+$$;
+
+CREATE OR REPLACE FUNCTION trg_refresh_race_calendar() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_race_calendar(ARRAY(
+        SELECT DISTINCT replace(n.race_date::TEXT, '-', '') FROM new_rows n
+    ));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_calendar_entries ON race_entries;
+CREATE TRIGGER trg_calendar_entries
+    AFTER INSERT ON race_entries REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_refresh_race_calendar();
+
+DROP TRIGGER IF EXISTS trg_calendar_odds ON win_odds;
+CREATE TRIGGER trg_calendar_odds
+    AFTER INSERT ON win_odds REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_refresh_race_calendar();
+
+DROP TRIGGER IF EXISTS trg_calendar_results ON race_results;
+CREATE TRIGGER trg_calendar_results
+    AFTER INSERT ON race_results REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION trg_refresh_race_calendar();
+
+-- One-off backfill for days ingested before the typed tables existed
+-- (raw_race_data.race_id may carry a suffix, so only the first 16 chars are used)
+INSERT INTO race_calendar (race_date, venues, race_count, has_cards, has_odds, has_results)
+SELECT
+    race_date,
+    array_agg(DISTINCT substr(race_id, 9, 2) ORDER BY substr(race_id, 9, 2))
+        FILTER (WHERE data_type = '0B15'),
+    count(DISTINCT substr(race_id, 1, 16)) FILTER (WHERE data_type = '0B15'),
+    bool_or(data_type = '0B15'),
+    bool_or(data_type IN ('0B30', '0B31')),
+    bool_or(data_type = '0B12')
+FROM raw_race_data
+WHERE race_date IS NOT NULL
+GROUP BY race_date
+HAVING bool_or(data_type = '0B15')
+ON CONFLICT (race_date) DO NOTHING;
+
+COMMENT ON TABLE race_calendar IS 'Per-day race summary for date/venue selectors, maintained by triggers';
@@ -0,0 +1,87 @@
+import json
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("pytz")
+pytest.importorskip("dotenv")
+
+import db_client
+import local_postgrest
+import startup_profile
+from local_engine import model_registry
+
+
+def test_app_cold_import_stays_off_the_ml_stack():
+    result = startup_profile.profile("app", repeat=1)
+    assert result["status"] == "ok", result.get("error")
+    _, forbidden = startup_profile.ENTRY_POINTS["app"]
+    assert startup_profile.check(result, None, forbidden) == []
+
+
+def test_first_render_does_not_load_the_model(monkeypatch):
+    import app
+
+    def fail(*args, **kwargs):
+        raise AssertionError("run_ai_prediction loaded a model")
+
+    monkeypatch.setattr(model_registry, "load_model", fail)
+    monkeypatch.setattr(model_registry.ActiveModel, "current", fail)
+    race = pd.DataFrame({
+        "horse_num": ["01", "02", "03"],
+        "odds_tan": ["2.1", "12.5", "150.0"],
+        "pop_tan": ["1", "4", "12"],
+    })
+    out = app.run_ai_prediction(race)
+    assert out["pred_mark"].tolist() == [0.0, 1.0, 0.0]
+    assert out.loc[1, "pred_score"] == pytest.approx(12.5 / 4)
+
+
+def test_payoffs_of_archived_months_come_from_parquet(tmp_path, monkeypatch):
+    import app
+    import worker_archive
+
+    monkeypatch.setattr(worker_archive, "ARCHIVE_DIR", str(tmp_path))
+    path = worker_archive.archive_path("202401")
+    (tmp_path / "raw_race_data").mkdir()
+    hr = {"record_type": "HR", "race_id": "2024010606010101", "win_payoff": 350}
+    pd.DataFrame([
+        {"id": 1, "race_id": hr["race_id"], "race_date": "20240106", "data_type": "0B12",
+         "content": json.dumps(hr), "timestamp": "2024-01-06T16:00:00+00:00",
+         "updated_at": "2024-01-06T16:00:00+00:00"},
+        {"id": 2, "race_id": hr["race_id"], "race_date": "20240106", "data_type": "0B15",
+         "content": "{}", "timestamp": "2024-01-06T09:00:00+00:00",
+         "updated_at": "2024-01-06T09:00:00+00:00"},
+    ]).to_parquet(path, index=False)
+
+    payoffs, watermark = app.fetch_payoffs("20240106", {}, None)
+    assert list(payoffs[hr["race_id"]].values()) == [hr]
+    # Nothing newer than the watermark on the next refresh
+    again, _ = app.fetch_payoffs("20240106", payoffs, watermark)
+    assert again == payoffs
+
+
+def test_reparsed_payoff_replaces_the_cached_one(tmp_path, monkeypatch):
+    import app
+
+    srv = local_postgrest.serve(str(tmp_path / "stand_in.db"), port=0)
+    monkeypatch.setattr(db_client, "SUPABASE_URL", f"http://127.0.0.1:{srv.server_address[1]}")
+    try:
+        race_id = "2026020705010201"
+        hr = {"record_type": "HR", "race_id": race_id, "win_payoff": 350}
+        db_client.upsert_rows("raw_race_data", [
+            {"id": 1, "race_id": race_id, "race_date": "20260207", "data_type": "0B12",
+             "content": json.dumps(hr), "timestamp": "2026-02-07T07:00:00+00:00",
+             "updated_at": "2026-02-07T07:00:00+00:00"},
+        ], on_conflict="id")
+        payoffs, watermark = app.fetch_payoffs("20260207", {}, None)
+        assert list(payoffs[race_id].values()) == [hr]
+
+        # worker_reparse rewrites content in place: timestamp stays, updated_at moves
+        fixed = dict(hr, win_payoff=360)
+        db_client.update_rows("raw_race_data", {"content": json.dumps(fixed)}, {"id": 1})
+        payoffs, _ = app.fetch_payoffs("20260207", payoffs, watermark)
+        assert list(payoffs[race_id].values()) == [fixed]
+    finally:
+        srv.shutdown()
@@ -0,0 +1,60 @@
+"""horse_history merge: live rank-only runs keep the bootstrapped PCI / 上り3F"""
+
+import numpy as np
+import pandas as pd
+
+from horse_history import merge_runs, to_history_run
+from local_engine.preprocess import fill_lags_from_history
+
+HORSE = "2021100001"
+
+
+def bootstrapped_row():
+    """Row as written by `horse_history.py --csv` (TARGET runs carry PCI and 上り3F)"""
+    return merge_runs(None, [
+        {"horse_id": HORSE, "race_id": "2026011005010101", "race_date": "20260110",
+         "pci": 52.0, "last_3f": 34.5, "rank": 3},
+        {"horse_id": HORSE, "race_id": "2025122805010101", "race_date": "20251228",
+         "pci": 48.0, "last_3f": 35.5, "rank": 6},
+    ])
+
+
+def live_run():
+    """0B12 SE result as worker_collector passes it: rank only"""
+    parsed = {"record_type": "SE", "horse_id": HORSE, "race_id": "2026020705010211", "rank": "01"}
+    return to_history_run(parsed, "20260207")
+
+
+def test_rank_only_run_keeps_previous_pci_and_3f():
+    row = merge_runs(bootstrapped_row(), [live_run()])
+    assert (row["last_race_date"], row["last_race_id"]) == ("20260207", "2026020705010211")
+    assert row["last_rank"] == 1
+    assert (row["last_pci"], row["last_3f"]) == (52.0, 34.5)
+    assert row["prev_stale"] is True
+    assert row["avg_rank"] == (1 + 3 + 6) / 3
+    assert row["avg_pci"] == (52.0 + 48.0) / 2
+
+
+def test_merged_row_fills_every_live_lag():
+    row = merge_runs(bootstrapped_row(), [live_run()])
+    history = pd.DataFrame([row]).set_index("horse_id")
+    df = pd.DataFrame({"血統登録番号": [HORSE], "Date": [pd.Timestamp("2026-02-14")],
+                       "Prev_PCI": [np.nan], "Prev_3F": [np.nan], "Prev_Rank": [np.nan]})
+    df = fill_lags_from_history(df, history)
+    assert df.loc[0, ["Prev_PCI", "Prev_3F", "Prev_Rank"]].tolist() == [52.0, 34.5, 1.0]
+
+
+def test_second_rank_only_run_leaves_pci_and_3f_empty():
+    later = to_history_run({"record_type": "SE", "horse_id": HORSE, "race_id": "2026030105010211",
+                            "rank": "04"}, "20260301")
+    row = merge_runs(merge_runs(bootstrapped_row(), [live_run()]), [later])
+    assert row["last_rank"] == 4
+    assert (row["last_pci"], row["last_3f"], row["prev_stale"]) == (None, None, False)
+
+
+def test_csv_refresh_of_the_live_run_clears_the_stale_flag():
+    row = merge_runs(bootstrapped_row(), [live_run()])
+    row = merge_runs(row, [{"horse_id": HORSE, "race_id": "2026020705010211", "race_date": "20260207",
+                            "pci": 55.0, "last_3f": 33.9, "rank": 1}])
+    assert (row["last_pci"], row["last_3f"], row["prev_stale"]) == (55.0, 33.9, False)
+    assert not bootstrapped_row()["prev_stale"]
@@ -0,0 +1,70 @@
+"""get_day_snapshot emulation in the local PostgREST stand-in"""
+
+import pytest
+import requests
+
+import db_client
+import local_postgrest
+
+DAY = "20260207"
+R1, R2 = "2026020705010201", "2026020705010202"
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    srv = local_postgrest.serve(str(tmp_path / "stand_in.db"), port=0, max_rows=2)
+    monkeypatch.setattr(db_client, "SUPABASE_URL", f"http://127.0.0.1:{srv.server_address[1]}")
+    yield srv
+    srv.shutdown()
+
+
+def seed():
+    db_client.upsert_rows("race_entries", [
+        {"race_id": rid, "race_date": DAY, "horse_num": n, "horse_name": f"H{n}", "weight": 57.0,
+         "updated_at": "2026-02-07T09:00:00+00:00"}
+        for rid in (R1, R2) for n in (1, 2)
+    ], on_conflict="race_id,horse_num")
+    db_client.upsert_rows("win_odds", [
+        {"race_id": R1, "race_date": DAY, "horse_num": 1, "odds": 5.0, "pop": 2,
+         "snapshot_ts": "2026-02-07T09:00:00+00:00"},
+        {"race_id": R1, "race_date": DAY, "horse_num": 1, "odds": 3.2, "pop": 1,
+         "snapshot_ts": "2026-02-07T09:30:00+00:00"},
+    ], on_conflict="race_id,horse_num,snapshot_ts")
+    db_client.upsert_rows("prediction_results", [
+        {"race_id": R1, "horse_num": "02", "predict_score": 0.4, "predict_flag": 1,
+         "updated_at": "2026-02-07T09:10:00+00:00"},
+    ], on_conflict="race_id,horse_num")
+
+
+def snapshot(**args):
+    return db_client.fetch_rpc("get_day_snapshot", dict(args, p_race_date=DAY), order="race_id.asc,horse_num.asc")
+
+
+def test_day_snapshot_joins_latest_odds_predictions_and_results(server):
+    seed()
+    db_client.upsert_rows("race_results", [{"race_id": R1, "race_date": DAY, "rank_1_horse_num": 2,
+                                             "rank_2_horse_num": 1}], on_conflict="race_id")
+    rows = snapshot()   # 4 rows over max_rows=2 pages
+    assert [(r["race_id"], r["horse_num"]) for r in rows] == [(R1, 1), (R1, 2), (R2, 1), (R2, 2)]
+    first, second = rows[0], rows[1]
+    assert (first["odds_tan"], first["pop_tan"], first["finish_rank"]) == (3.2, 1, 2)
+    assert (second["predict_score"], second["predict_flag"], second["finish_rank"]) == (0.4, 1, 1)
+    assert rows[2]["odds_tan"] is None and rows[2]["predict_score"] == 0 and rows[2]["finish_rank"] is None
+
+
+def test_day_snapshot_watermarks_return_only_changed_horses(server):
+    seed()
+    since = {"p_entries_since": "2026-02-07T09:00:00+00:00", "p_odds_since": "2026-02-07T09:30:00+00:00",
+             "p_pred_since": "2026-02-07T09:10:00+00:00"}
+    assert snapshot(**since) == []
+    db_client.upsert_rows("prediction_results", [{"race_id": R2, "horse_num": "01", "predict_score": 0.9}],
+                          on_conflict="race_id,horse_num")
+    assert [(r["race_id"], r["horse_num"]) for r in snapshot(**since)] == [(R2, 1)]
+
+
+def test_day_snapshot_without_tables_and_unknown_rpc(server):
+    assert snapshot() == []
+    with pytest.raises(requests.HTTPError) as err:
+        db_client.call_rpc("refresh_race_calendar", {"p_dates": [DAY]})
+    assert err.value.response.status_code == 404
+    assert err.value.response.json()["code"] == "PGRST202"
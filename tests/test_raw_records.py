@@ -0,0 +1,70 @@
+"""Every uploader path stores and hashes the same bytes for one JV-Link record"""
+
+import os
+import base64
+
+import step2_upload
+import worker_backfill
+import worker_reuploader
+from raw_records import build_raw_row, canonical_record
+from jra_parser import JRAParser
+
+RACE_DATE = "20260207"
+
+
+def se_record():
+    """0B15 SE record as JVRead returns it: fixed width, trailing blanks, CR/LF"""
+    name = "テストホース".encode("cp932").ljust(28)
+    body = b"SE7" + b"0" * 8 + b"2026020705010211" + b"3" + b"07" + b"2021100001" + name
+    return (body.ljust(555) + b"\r\n").decode("cp932")
+
+
+def write_download(tmp_path, record):
+    """The file step1_download.py writes for the same record"""
+    jv_dir = tmp_path / "jv_data"
+    jv_dir.mkdir()
+    path = jv_dir / f"0B15_{RACE_DATE}.txt"
+    path.write_bytes(record.encode("cp932"))
+    return path
+
+
+def key(row):
+    return row["race_id"], row["data_type"], row["race_date"], row["record_key"], row["record_hash"]
+
+
+def test_canonical_record_forms_agree():
+    record = se_record()
+    forms = [record, record.rstrip("\r\n"), record.encode("cp932"), record.rstrip("\r\n").encode("cp932")]
+    assert len({canonical_record(f) for f in forms}) == 1
+    # Untruncated and fixed width (trailing blanks kept)
+    assert len(canonical_record(record)) == 555
+
+
+def test_uploader_paths_share_the_dedupe_key(tmp_path, monkeypatch):
+    record = se_record()
+    path = write_download(tmp_path, record)
+
+    # worker_collector: the unstripped JVRead string
+    parsed = JRAParser(record.strip()).parse("0B15")
+    collector = build_raw_row(parsed["race_id"], RACE_DATE, "0B15", parsed, record)
+
+    # worker_backfill: binary file lines
+    backfill = [row for table, _, row in worker_backfill.parse_file(str(path), "0B15", RACE_DATE)
+                if table == "raw_race_data"]
+
+    # step2_upload / worker_reuploader: text file lines (uploads captured)
+    uploaded = {}
+    capture = lambda name: lambda table, rows, on_conflict: uploaded.setdefault(name, []).extend(rows)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(step2_upload, "upsert_rows", capture("step2"))
+    monkeypatch.setattr(worker_reuploader, "upsert_rows", capture("reuploader"))
+    step2_upload.process_and_upload()
+    worker_reuploader.process_file(os.path.join("jv_data", path.name))
+
+    rows = [collector, backfill[0], uploaded["step2"][0], uploaded["reuploader"][0]]
+    assert len(backfill) == len(uploaded["step2"]) == len(uploaded["reuploader"]) == 1
+    assert len({r["record_hash"] for r in rows}) == 1
+    assert len({r["raw_string"] for r in rows}) == 1
+    assert base64.b64decode(collector["raw_string"]) == record.rstrip("\r\n").encode("cp932")
+    # Every path agrees on the whole dedupe key
+    assert len({key(r) for r in rows}) == 1, [key(r) for r in rows]
@@ -0,0 +1,75 @@
+"""train_pipeline: full fit, up-to-date skip and warm start on a small TARGET-like CSV"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("lightgbm")
+joblib = pytest.importorskip("joblib")
+
+from local_engine import train_pipeline
+from local_engine.train_pipeline import train, commit
+
+HORSES = 48
+PER_RACE = 12
+
+
+def month_rows(year, month, rng):
+    """One meeting day: every horse runs once, PER_RACE runners per race"""
+    rows = []
+    horses = rng.permutation(HORSES)
+    for race in range(HORSES // PER_RACE):
+        runners = horses[race * PER_RACE:(race + 1) * PER_RACE]
+        for pos, horse in enumerate(runners, start=1):
+            pop = int(rng.integers(1, PER_RACE + 1))
+            rows.append({
+                "血統登録番号": 2020100000 + int(horse),
+                "年": year % 100, "月": month, "日": 10,
+                "確定着順": pos, "人気順": pop, "頭数": PER_RACE, "馬番": pos,
+                "PCI": round(float(rng.normal(50, 3)), 1),
+                "上がり3Fタイム": round(float(rng.normal(35, 1)), 1),
+                "単勝オッズ": round(float(pop * 2.5 + rng.random()), 1),
+                "斤量": 56.0,
+                "馬名": f"ホース{horse}", "場所": "東京",
+            })
+    return rows
+
+
+def write_csv(path, months, seed=0):
+    rng = np.random.default_rng(seed)
+    rows = [r for year, month in months for r in month_rows(year, month, rng)]
+    pd.DataFrame(rows).to_csv(path, index=False, encoding="cp932")
+
+
+def test_full_fit_then_skip_then_warm_start(tmp_path):
+    csv, model_path, cache = tmp_path / "target.csv", tmp_path / "final_model.pkl", tmp_path / "train"
+    first_half = [(2024, m) for m in range(1, 7)]
+    write_csv(csv, first_half)
+
+    result = train(str(csv), str(model_path), cache_dir=str(cache))
+    assert result["mode"] == "full"
+    assert result["months"] == "202401-202406"
+    joblib.dump(result["model"], model_path)
+    commit(result, str(model_path), cache_dir=str(cache))
+
+    assert train(str(csv), str(model_path), cache_dir=str(cache)) is None
+
+    # Same rows plus one new month -> only the new month is trained on
+    write_csv(csv, first_half + [(2024, 7)])
+    warm = train(str(csv), str(model_path), cache_dir=str(cache))
+    assert warm["mode"] == "warm"
+    assert warm["rows"] == HORSES
+    base_trees = result["model"].booster_.num_trees()
+    assert warm["model"].booster_.num_trees() == base_trees + train_pipeline.WARM_ROUNDS
+    assert warm["model"].predict_proba(warm["sample"]).shape == (1, 2)
+    assert warm["state"]["warm_starts"] == 1
+
+
+def test_until_keeps_later_months_out(tmp_path):
+    csv, model_path, cache = tmp_path / "target.csv", tmp_path / "final_model.pkl", tmp_path / "train"
+    write_csv(csv, [(2024, m) for m in range(9, 13)] + [(2025, 1), (2025, 2)])
+
+    result = train(str(csv), str(model_path), until="202412", cache_dir=str(cache))
+    assert result["mode"] == "full"
+    assert result["months"] == "202409-202412"
+    assert result["state"]["through"] == 20241210
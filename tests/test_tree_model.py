@@ -0,0 +1,33 @@
+"""tree_model: split-count feature importances from the NumPy export"""
+
+import numpy as np
+import pytest
+
+lgb = pytest.importorskip("lightgbm")
+joblib = pytest.importorskip("joblib")
+
+from local_engine.tree_model import export_model, feature_importances
+
+
+def test_importances_match_lightgbm_without_loading_the_pickle(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, 4))
+    y = (X[:, 0] + 0.5 * X[:, 2] + rng.normal(scale=0.5, size=400) > 0).astype(int)
+    model = lgb.LGBMClassifier(n_estimators=20, num_leaves=7, verbose=-1).fit(X, y)
+    path = str(tmp_path / "model.pkl")
+    joblib.dump(model, path)
+    export_model(path)
+
+    monkeypatch.setattr(joblib, "load", lambda *a, **k: pytest.fail("pickle loaded"))
+    imp = feature_importances(path)
+    assert list(imp.values()) == model.feature_importances_.tolist()
+    assert list(imp) == model.booster_.feature_name()
+
+
+def test_stale_export_is_not_used(tmp_path):
+    X = np.random.default_rng(1).normal(size=(200, 3))
+    path = str(tmp_path / "model.pkl")
+    joblib.dump(lgb.LGBMClassifier(n_estimators=5, verbose=-1).fit(X, X[:, 0] > 0), path)
+    export_model(path)
+    joblib.dump(lgb.LGBMClassifier(n_estimators=6, verbose=-1).fit(X, X[:, 1] > 0), path)
+    assert feature_importances(path) is None
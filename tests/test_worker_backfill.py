@@ -0,0 +1,55 @@
+"""worker_backfill: month partitions are created before any row is written"""
+
+import pytest
+
+import worker_backfill
+
+FILES = [("a", "0B15", "20240106"), ("b", "0B12", "20240107"), ("c", "0B15", "20240203"),
+         ("d", "0B15", "bad")]
+
+
+@pytest.fixture
+def calls(tmp_path, monkeypatch):
+    log = []
+    for name, _, _ in FILES:
+        (tmp_path / f"{name}.txt").write_bytes(b"")
+    monkeypatch.setattr(worker_backfill, "SUPABASE_SERVICE_KEY", "service")
+
+    def upsert(table, rows, on_conflict):
+        log.append(("upsert", table))
+        return len(rows)
+
+    monkeypatch.setattr(worker_backfill, "upsert_rows", upsert)
+    monkeypatch.setattr(worker_backfill, "iter_batches",
+                        lambda path, *a, **k: iter([("raw_race_data", "id", [{"id": path}])]))
+    monkeypatch.chdir(tmp_path)
+    return log
+
+
+def files():
+    return [(f"{name}.txt", dtype, date) for name, dtype, date in FILES]
+
+
+def test_partitions_before_writers(calls, monkeypatch):
+    monkeypatch.setattr(worker_backfill, "call_rpc",
+                        lambda fn, args, key: calls.append((fn, args["p_month"], key)))
+    assert worker_backfill.run(files(), writers=2, checkpoint_path="cp.json") == 0
+    assert calls[:2] == [("ensure_raw_partition", "202401", "service"),
+                         ("ensure_raw_partition", "202402", "service")]
+    assert [c[0] for c in calls[2:]] == ["upsert"] * len(FILES)
+
+
+def test_partition_failure_stops_before_writing(calls, monkeypatch):
+    def fail(fn, args, key):
+        raise RuntimeError("404 PGRST202")
+
+    monkeypatch.setattr(worker_backfill, "call_rpc", fail)
+    assert worker_backfill.run(files(), writers=2, checkpoint_path="cp.json") == 1
+    assert calls == []
+
+
+def test_missing_service_key_stops(calls, monkeypatch):
+    monkeypatch.setattr(worker_backfill, "SUPABASE_SERVICE_KEY", None)
+    monkeypatch.setattr(worker_backfill, "call_rpc", lambda *a, **k: calls.append("rpc"))
+    assert worker_backfill.run(files(), writers=2, checkpoint_path="cp.json") == 1
+    assert calls == []
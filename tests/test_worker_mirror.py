@@ -0,0 +1,35 @@
+"""worker_mirror: rows committed late (updated_at behind the watermark) are still mirrored"""
+
+import pytest
+
+import db_client
+import local_postgrest
+from worker_mirror import MirrorSync
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    srv = local_postgrest.serve(str(tmp_path / "stand_in.db"), port=0, max_rows=2)
+    monkeypatch.setattr(db_client, "SUPABASE_URL", f"http://127.0.0.1:{srv.server_address[1]}")
+    yield srv
+    srv.shutdown()
+
+
+def result(race_id, updated_at):
+    return {"race_id": race_id, "race_date": "20260207", "rank_1_horse_num": 1, "updated_at": updated_at}
+
+
+def test_late_commit_inside_safety_lag_is_pulled(server, tmp_path):
+    mirror = MirrorSync(str(tmp_path / "mirror.db"))
+    db_client.upsert_rows("race_results", [result("2026020705010201", "2026-02-07T10:00:00+00:00")],
+                          on_conflict="race_id")
+    assert mirror.sync_table("race_results") == 1
+
+    # Stamped at 09:58 by a transaction that committed after the first pass
+    db_client.upsert_rows("race_results", [result("2026020705010202", "2026-02-07T09:58:00+00:00")],
+                          on_conflict="race_id")
+    mirror.sync_table("race_results")
+
+    rows = mirror.conn.execute("SELECT race_id FROM race_results ORDER BY race_id").fetchall()
+    assert [r[0] for r in rows] == ["2026020705010201", "2026020705010202"]
+    assert mirror.get_watermark("race_results") == "2026-02-07T10:00:00+00:00"
@@ -0,0 +1,64 @@
+"""worker_reparse write-back: dedupe-key collisions and single-row failures"""
+
+import pytest
+
+import worker_reparse
+from worker_reparse import Reparser
+
+RACE = "2026020705010211"
+
+
+def row(id, key, hash="a" * 32):
+    return {"id": id, "race_id": RACE, "data_type": "0B15", "race_date": "20260207",
+            "record_key": key, "record_hash": hash, "content": "{}", "parser_version": "new"}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    state = {"stored": [], "upserts": [], "deleted": [], "stamped": [], "bad_ids": set()}
+
+    def upsert(table, rows, on_conflict):
+        if any(r.get("id") in state["bad_ids"] for r in rows):
+            raise RuntimeError("409 duplicate key value violates unique constraint")
+        state["upserts"].append((table, [r.get("id") for r in rows]))
+        return len(rows)
+
+    monkeypatch.setattr(worker_reparse, "fetch_all", lambda table, **kw: list(state["stored"]))
+    monkeypatch.setattr(worker_reparse, "upsert_rows", upsert)
+    monkeypatch.setattr(worker_reparse, "delete_rows", lambda table, f: state["deleted"].extend(f["id"]))
+    monkeypatch.setattr(worker_reparse, "update_rows", lambda table, v, f: state["stamped"].extend(f["id"]))
+    return state
+
+
+def test_new_key_held_by_another_row_is_deleted_not_written(db):
+    # id 3 already holds SE07 for the same bytes; id 5 re-parses to SE07 too
+    db["stored"] = [row(3, "SE07"), row(5, "SE")]
+    reparser = Reparser()
+    reparser.apply(([row(5, "SE07"), row(6, "SE08", hash="b" * 32)], [9], [], 0))
+    assert db["deleted"] == [5]
+    assert db["upserts"] == [("raw_race_data", [6])]   # No race_entries call without entries
+    assert db["stamped"] == [9]
+    assert (reparser.stats["changed"], reparser.stats["duplicates"], reparser.stats["failed"]) == (1, 1, 0)
+
+
+def test_same_new_key_twice_in_a_batch_keeps_the_lower_id(db):
+    reparser = Reparser()
+    reparser.apply(([row(8, "SE07"), row(4, "SE07")], [], [], 0))
+    assert db["deleted"] == [8]
+    assert db["upserts"] == [("raw_race_data", [4])]
+
+
+def test_one_failing_row_does_not_lose_the_page(db):
+    db["bad_ids"] = {2}
+    reparser = Reparser()
+    reparser.apply(([row(1, "SE01", "1" * 32), row(2, "SE02", "2" * 32), row(3, "SE03", "3" * 32)], [], [], 0))
+    assert db["upserts"] == [("raw_race_data", [1]), ("raw_race_data", [3])]
+    assert reparser.stats["failed"] == 1
+
+
+def test_dry_run_counts_duplicates_without_writing(db):
+    db["stored"] = [row(3, "SE07")]
+    reparser = Reparser(dry_run=True)
+    reparser.apply(([row(5, "SE07")], [9], [], 0))
+    assert (db["deleted"], db["upserts"], db["stamped"]) == ([], [], [])
+    assert reparser.stats["duplicates"] == 1
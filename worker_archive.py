@@ -0,0 +1,183 @@
+"""
+raw_race_data Retention / Archive
+=================================
+raw_race_data is partitioned by month (see partition_raw_race_data.sql).
+This job exports every month older than the retention window to local
+compressed Parquet, verifies the row count, then drops the month's
+partition server-side in one statement.
+
+Readers use iter_raw_rows(), which serves archived months from Parquet and
+everything else from Supabase, so callers do not need to know the tier.
+
+Requirements:
+    - pyarrow (pip install pyarrow)
+    - SUPABASE_SERVICE_KEY in .env (partition DDL is granted to the service role only)
+
+Usage:
+    python worker_archive.py                  # Archive months older than 6 months
+    python worker_archive.py --keep-months 3
+    python worker_archive.py --dry-run        # Export only, keep partitions
+"""
+
+import os
+import sys
+import json
+import glob
+import argparse
+import datetime
+from dotenv import load_dotenv
+from db_client import iter_rows, iter_pages, count_rows, call_rpc, DEFAULT_ORDER
+
+load_dotenv()
+SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+KEEP_MONTHS = 6       # Hot tier retention
+AHEAD_MONTHS = 2      # Partitions pre-created for upcoming months
+
+
+def archive_path(month: str) -> str:
+    return os.path.join(ARCHIVE_DIR, "raw_race_data", f"race_month={month}.parquet")
+
+
+def archived_months() -> set:
+    files = glob.glob(os.path.join(ARCHIVE_DIR, "raw_race_data", "race_month=*.parquet"))
+    return {os.path.basename(f)[len("race_month="):-len(".parquet")] for f in files}
+
+
+def _shift_month(month: str, delta: int) -> str:
+    y, m = int(month[:4]), int(month[4:6])
+    total = y * 12 + (m - 1) + delta
+    return f"{total // 12:04d}{total % 12 + 1:02d}"
+
+
+# --- Tiered reader ---
+
+def _match(series, value):
+    if isinstance(value, list):
+        return series.astype(str).isin([str(v) for v in value])
+    if isinstance(value, tuple):
+        op, val = value
+        if op == "like":
+            return series.astype(str).str.startswith(str(val).rstrip("*%"))
+        if op in ("gt", "gte", "lt", "lte"):
+            # ISO timestamps / YYYYMMDD strings compare in order as text
+            text = series.astype(str)
+            return {"gt": text > str(val), "gte": text >= str(val),
+                    "lt": text < str(val), "lte": text <= str(val)}[op] & series.notna()
+        raise ValueError(f"Unsupported archive filter: {op}")
+    return series.astype(str) == str(value)
+
+
+def read_archive(month: str, select="*", filters=None):
+    """Archived month as a DataFrame (pandas is only imported for this tier)"""
+    import pandas as pd
+    df = pd.read_parquet(archive_path(month))
+    for col, value in (filters or {}).items():
+        df = df[_match(df[col], value)]
+    df = df.sort_values(["race_id", "id"])
+    if select != "*":
+        df = df[[c.strip() for c in select.split(",")]]
+    return df
+
+
+def iter_raw_rows(select="*", filters=None, order=DEFAULT_ORDER):
+    """
+    raw_race_data rows from whichever tier holds them.
+    A plain race_date filter on an archived month is served from Parquet.
+    """
+    race_date = (filters or {}).get("race_date")
+    if isinstance(race_date, str) and race_date[:6] in archived_months():
+        yield from read_archive(race_date[:6], select, filters).to_dict("records")
+        return
+    yield from iter_rows("raw_race_data", select=select, filters=filters, order=order)
+
+
+# --- Retention job ---
+
+def _to_text(value):
+    # JSONB comes back as str or dict depending on how it was written; archive as text
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False)
+
+
+def export_month(month: str):
+    """
+    Stream one month from Supabase page by page into a zstd Parquet file next
+    to its archive path. Returns (tmp path, rows written), tmp None when the
+    month is empty. Not published: archived_months() would serve it at once.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = archive_path(month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+
+    writer = None
+    written = 0
+    for page in iter_pages("raw_race_data", filters={"race_date": ("like", f"{month}*")}):
+        if not page:
+            continue
+        if writer is None:
+            columns = list(page[0].keys())
+            schema = pa.schema([(c, pa.int64() if c == "id" else pa.string()) for c in columns])
+            writer = pq.ParquetWriter(tmp, schema, compression="zstd")
+        data = {c: [r.get(c) if c == "id" else _to_text(r.get(c)) for r in page] for c in columns}
+        writer.write_table(pa.table(data, schema=schema))
+        written += len(page)
+
+    if writer is None:
+        return None, 0
+    writer.close()
+    return tmp, written
+
+
+def run(keep_months=KEEP_MONTHS, dry_run=False):
+    import pyarrow.parquet as pq
+    if not SUPABASE_SERVICE_KEY:
+        print("[ERROR] SUPABASE_SERVICE_KEY missing (required for partition management).")
+        return 1
+
+    this_month = datetime.date.today().strftime("%Y%m")
+    cutoff = _shift_month(this_month, -keep_months)
+
+    # Upcoming partitions first, so new data never lands in the default partition
+    for i in range(AHEAD_MONTHS + 1):
+        call_rpc("ensure_raw_partition", {"p_month": _shift_month(this_month, i)}, key=SUPABASE_SERVICE_KEY)
+
+    parts = call_rpc("list_raw_partitions", key=SUPABASE_SERVICE_KEY) or []
+    targets = [p["race_month"] for p in parts if p["race_month"] < cutoff]
+    print(f"[ARCHIVE] {len(parts)} partitions, {len(targets)} older than {cutoff}")
+
+    for month in targets:
+        expected = count_rows("raw_race_data", {"race_date": ("like", f"{month}*")})
+        tmp, written = export_month(month)
+        archived = pq.read_metadata(tmp).num_rows if tmp else 0
+        print(f"[ARCHIVE] {month}: {written} rows exported (server count {expected})")
+
+        # Publish only a verified file: reads switch to the archive as soon as it exists
+        if archived != expected or dry_run:
+            if tmp:
+                os.remove(tmp)
+            if archived != expected:
+                print(f"[ERROR] {month}: row count mismatch, partition kept.")
+            continue
+        if tmp:
+            os.replace(tmp, archive_path(month))
+        call_rpc("drop_raw_partition", {"p_month": month}, key=SUPABASE_SERVICE_KEY)
+        print(f"[ARCHIVE] {month}: partition dropped.")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive old raw_race_data partitions to Parquet")
+    parser.add_argument("--keep-months", type=int, default=KEEP_MONTHS, help="Months kept in Supabase")
+    parser.add_argument("--dry-run", action="store_true", help="Export and verify only")
+    args = parser.parse_args()
+    sys.exit(run(args.keep_months, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
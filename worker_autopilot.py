@@ -5,6 +5,10 @@ Hybrid Mode Auto-Pilot:
 - Data Collection (JRA-VAN): 32bit Python (required by JVLink SDK)
 - AI Prediction (Pandas/Scikit-learn): 64bit Python (modern standard)
 
+Prediction runs in a resident prediction_service.py (64bit) started on the
+first cycle, so the model stays loaded between cycles; if it cannot start,
+worker_predict.py is run as a subprocess as before.
+
 Usage: py worker_autopilot.py
 """
 
@@ -13,9 +17,10 @@ import subprocess
 import datetime
 import sys
 import os
+from prediction_service import submit, service_alive, ServiceUnavailable
 
-# Change to the script directory
-os.chdir(r"C:\TFJV\my-racing-dashboard")
+# Script directory (main() changes into it)
+BASE_DIR = r"C:\TFJV\my-racing-dashboard"
 
 # === Environment Configuration ===
 # Collection: 32bit Python (JRA-VAN requires 32bit)
@@ -24,6 +29,9 @@ CMD_COLLECT = ["py", "-3.11-32"]
 # Prediction: 64bit Python (default, better for ML libraries)
 CMD_PREDICT = ["py"] 
 
+SERVICE_START_TIMEOUT = 120  # Seconds to wait for the prediction service to load
+service_proc = None
+
 def log(message):
     # Windows cp932 safe output
     try:
@@ -56,12 +64,48 @@ def run_script(cmd, script_name, args=None):
     except Exception as e:
         log(f"[ERROR] Error running {script_name}: {e}")
 
+def ensure_service():
+    """Start prediction_service.py once; later cycles reuse the warm process"""
+    global service_proc
+    if service_alive():
+        return True
+    if service_proc is None or service_proc.poll() is not None:
+        log("Starting prediction service...")
+        service_proc = subprocess.Popen(CMD_PREDICT + ["prediction_service.py"], cwd=BASE_DIR)
+    deadline = time.time() + SERVICE_START_TIMEOUT
+    while time.time() < deadline:
+        if service_alive():
+            return True
+        if service_proc.poll() is not None:
+            break
+        time.sleep(1)
+    log("[WARN] Prediction service did not come up.")
+    return False
+
+def run_prediction(date_str):
+    if ensure_service():
+        try:
+            record = submit("predict", date=date_str)
+            log(f"[OK] Prediction {date_str} ({record['status']}): {record.get('result')} "
+                f"in {record.get('seconds', 0):.2f}s (service)")
+            return
+        except (ServiceUnavailable, RuntimeError) as e:
+            log(f"[WARN] Prediction service: {e}")
+    log("Falling back to worker_predict.py")
+    run_script(CMD_PREDICT, "worker_predict.py", args=["--date", date_str])
+
+def stop_service():
+    if service_proc is not None and service_proc.poll() is None:
+        log("Stopping prediction service...")
+        service_proc.terminate()
+
 import argparse
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--force-friday", action="store_true", help="Force run Friday sequence")
     args = parser.parse_args()
+    os.chdir(BASE_DIR)
 
     log("=" * 60)
     log("AI Auto-Pilot Started (Hybrid Mode: 32bit/64bit)")
@@ -108,7 +152,7 @@ def main():
             run_script(CMD_COLLECT, "worker_collector.py", args=["--mode", "cards", "--date", today_str])
             
             log("Phase 3: AI Prediction")
-            run_script(CMD_PREDICT, "worker_predict.py", args=["--date", today_str])
+            run_prediction(today_str)
             
             log("Friday Sequence Completed. Exiting to wait for weekend.")
             break
@@ -120,8 +164,8 @@ def main():
         # 1. Data Collection (32bit Python for JRA-VAN)
         run_script(CMD_COLLECT, "worker_collector.py", args=["--mode", "auto", "--date", today_str])
 
-        # 2. AI Prediction (64bit Python for ML libraries)
-        run_script(CMD_PREDICT, "worker_predict.py", args=["--date", today_str])
+        # 2. AI Prediction (64bit Python for ML libraries, resident service)
+        run_prediction(today_str)
 
         log("Waiting 10 minutes for next update...")
         log("-" * 40)
@@ -133,3 +177,5 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("\n[Interrupted by user]")
         sys.exit(0)
+    finally:
+        stop_service()
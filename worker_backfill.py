@@ -0,0 +1,242 @@
+"""
+Bulk Backfill Loader
+====================
+Uploads historical JV-Link dumps (jv_data/<data_type>_<YYYYMMDD>.txt) into
+raw_race_data, plus race_entries for race cards.
+
+Files are parsed locally and their rows are sent as gzip batch upserts by a
+bounded pool of concurrent writers (db_client.upsert_rows, with retries).
+Before any writer starts, the month partition of every race date in the
+file set is created (ensure_raw_partition, service key): rows of a month
+without a partition would land in raw_race_data_default and block that
+partition for good (see partition_raw_race_data.sql).
+
+A failed batch is reported and the run continues. Finished files are recorded
+in a checkpoint file, so an interrupted or partly failed run resumes where it
+stopped. Rows/sec and ETA are printed while the run is going.
+
+Usage:
+    python worker_backfill.py --from 20250101 --to 20251231
+    python worker_backfill.py --files "jv_data/0B12_2025*.txt"
+    python worker_backfill.py --from 20250101 --to 20251231 --types 0B15,0B12
+    python worker_backfill.py ... --restart        # Ignore the checkpoint
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from jra_parser import JRAParser
+from raw_records import build_raw_row, RAW_CONFLICT
+from race_tables import to_entry_row
+from db_client import upsert_rows, call_rpc
+
+SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")   # .env is loaded by db_client
+
+JV_DIR = "jv_data"
+TARGET_TYPES = ["0B15", "0B12", "0B30", "0B31"]
+CHECKPOINT_PATH = "backfill_checkpoint.json"
+
+BATCH_SIZE = 500      # Rows per upsert request
+WRITERS = 8           # Concurrent batch writers
+
+
+def list_files(jv_dir=JV_DIR, date_from=None, date_to=None, types=TARGET_TYPES, pattern=None):
+    """(path, data_type, race_date) for every dump file in range, oldest first"""
+    paths = glob.glob(pattern) if pattern else glob.glob(os.path.join(jv_dir, "*.txt"))
+    files = []
+    for path in paths:
+        name = os.path.basename(path)
+        if "_" not in name:
+            continue
+        data_type, date_str = name[:-len(".txt")].split("_", 1)
+        if data_type not in types:
+            continue
+        if date_from and date_str < date_from:
+            continue
+        if date_to and date_str > date_to:
+            continue
+        files.append((path, data_type, date_str))
+    return sorted(files, key=lambda f: (f[2], f[1]))
+
+
+def ensure_partitions(files, key=None):
+    """Create the raw_race_data month partition for every race date in files; returns the months"""
+    key = key or SUPABASE_SERVICE_KEY
+    if not key:
+        raise RuntimeError("SUPABASE_SERVICE_KEY missing (required to create month partitions)")
+    months = sorted({date_str[:6] for _, _, date_str in files if len(date_str) == 8 and date_str.isdigit()})
+    for month in months:
+        try:
+            call_rpc("ensure_raw_partition", {"p_month": month}, key=key)
+        except Exception as e:
+            raise RuntimeError(f"ensure_raw_partition({month}) failed: {e}") from e
+    return months
+
+
+def load_checkpoint(path=CHECKPOINT_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(done, path=CHECKPOINT_PATH):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(done, f, indent=1)
+    os.replace(tmp, path)
+
+
+def count_lines(path):
+    with open(path, "rb") as f:
+        return sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+
+
+def parse_file(path, data_type, date_str):
+    """Yields (table, on_conflict, row) for every accepted record"""
+    with open(path, "rb") as f:
+        for line in f:
+            raw = line.rstrip(b"\r\n")
+            if not raw.strip():
+                continue
+            parsed = JRAParser(raw).parse(data_type)
+            if not parsed:
+                continue
+            race_id = parsed.get("race_id")
+            if not race_id or race_id == "UNKNOWN":
+                continue
+            yield "raw_race_data", RAW_CONFLICT, build_raw_row(race_id, date_str, data_type, parsed, raw)
+            if data_type == "0B15":
+                entry = to_entry_row(parsed, date_str)
+                if entry:
+                    yield "race_entries", "race_id,horse_num", entry
+
+
+def iter_batches(path, data_type, date_str, batch_size=BATCH_SIZE):
+    """
+    (table, on_conflict, rows) batches, one table per batch.
+    Rows are deduplicated on the conflict key within a batch (last wins):
+    Postgres rejects an upsert that touches the same row twice.
+    """
+    buffers = {}
+    for table, on_conflict, row in parse_file(path, data_type, date_str):
+        buf = buffers.setdefault((table, on_conflict), {})
+        buf[tuple(row[c] for c in on_conflict.split(","))] = row
+        if len(buf) >= batch_size:
+            yield table, on_conflict, list(buf.values())
+            buffers[(table, on_conflict)] = {}
+    for (table, on_conflict), buf in buffers.items():
+        if buf:
+            yield table, on_conflict, list(buf.values())
+
+
+class Progress:
+    """Live rows/sec and ETA (ETA is based on source lines, known up front)"""
+
+    def __init__(self, total_lines):
+        self.total_lines = total_lines
+        self.done_lines = 0
+        self.rows = 0
+        self.t0 = time.perf_counter()
+
+    def update(self, rows=0, lines=0):
+        self.rows += rows
+        self.done_lines += lines
+        elapsed = time.perf_counter() - self.t0
+        rate = self.rows / elapsed if elapsed > 0 else 0
+        line_rate = self.done_lines / elapsed if elapsed > 0 else 0
+        remaining = self.total_lines - self.done_lines
+        eta = remaining / line_rate if line_rate > 0 else 0
+        pct = 100 * self.done_lines / self.total_lines if self.total_lines else 100
+        print(f"   {self.rows:,} rows | {rate:,.0f} rows/s | {pct:5.1f}% | ETA {eta:,.0f}s   ", end="\r")
+
+
+def run(files, writers=WRITERS, batch_size=BATCH_SIZE, checkpoint_path=CHECKPOINT_PATH):
+    done = load_checkpoint(checkpoint_path)
+    pending_files = [f for f in files if f[0] not in done]
+    print(f"[BACKFILL] {len(files)} files, {len(files) - len(pending_files)} already done, "
+          f"{writers} writers x {batch_size} rows")
+    if not pending_files:
+        return 0
+    try:
+        months = ensure_partitions(pending_files)
+    except RuntimeError as e:
+        # Writing anyway would fill raw_race_data_default (see partition_raw_race_data.sql)
+        print(f"[ERROR] {e}; nothing was written.")
+        return 1
+    print(f"[BACKFILL] Partitions ready for {len(months)} month(s)")
+
+    line_counts = {path: count_lines(path) for path, _, _ in pending_files}
+    progress = Progress(sum(line_counts.values()))
+    failed = {}
+
+    def drain(item):
+        future, path, is_last, file_rows = item
+        try:
+            progress.update(rows=future.result())
+        except Exception as e:
+            failed.setdefault(path, str(e))
+        # FIFO: once a file's last batch is drained, all of its batches are done
+        if is_last:
+            progress.update(lines=line_counts[path])
+            if path not in failed:
+                done[path] = file_rows
+                save_checkpoint(done, checkpoint_path)
+
+    with ThreadPoolExecutor(max_workers=writers) as pool:
+        window = deque()
+        for path, data_type, date_str in pending_files:
+            file_rows = 0
+            batches = iter_batches(path, data_type, date_str, batch_size)
+            batch = next(batches, None)
+            if batch is None:
+                window.append((pool.submit(lambda: 0), path, True, 0))
+            while batch is not None:
+                table, on_conflict, rows = batch
+                file_rows += len(rows)
+                batch = next(batches, None)
+                future = pool.submit(upsert_rows, table, rows, on_conflict)
+                window.append((future, path, batch is None, file_rows))
+                while len(window) >= writers * 2:
+                    drain(window.popleft())
+        while window:
+            drain(window.popleft())
+
+    elapsed = time.perf_counter() - progress.t0
+    print(f"\n[BACKFILL] {progress.rows:,} rows in {elapsed:.1f}s "
+          f"({progress.rows / elapsed if elapsed else 0:,.0f} rows/s)")
+    for path, error in failed.items():
+        print(f"[ERROR] {os.path.basename(path)}: {error}")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel bulk backfill of JV-Link dumps")
+    parser.add_argument("--from", dest="date_from", help="First race date (YYYYMMDD)")
+    parser.add_argument("--to", dest="date_to", help="Last race date (YYYYMMDD)")
+    parser.add_argument("--files", help="Glob of dump files (instead of jv_data/)")
+    parser.add_argument("--dir", default=JV_DIR, help="Dump directory")
+    parser.add_argument("--types", default=",".join(TARGET_TYPES), help="Data types to load")
+    parser.add_argument("--writers", type=int, default=WRITERS, help="Concurrent batch writers")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows per request")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="Checkpoint file")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint")
+    args = parser.parse_args()
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    files = list_files(args.dir, args.date_from, args.date_to, args.types.split(","), args.files)
+    sys.exit(run(files, args.writers, args.batch_size, args.checkpoint))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n[Interrupted by user] Finished files are in the checkpoint; re-run to resume.")
+        sys.exit(1)
@@ -20,27 +20,25 @@ For Windows Task Scheduler:
 
 import os
 import sys
-import json
 import datetime
 import argparse
-import urllib.request
-import urllib.error
 from dotenv import load_dotenv
 from jra_parser import JRAParser
+from race_tables import to_entry_row, to_odds_rows, ODDS_TYPES
+from raw_records import build_raw_row, RAW_CONFLICT
+from horse_history import HorseHistoryStore, to_history_run
+from db_client import iter_rows, upsert_rows
+from prediction_service import submit, ServiceUnavailable
 
 # Load environment
 load_dotenv()
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-
 # Check for Windows
 if sys.platform != "win32":
     print("[ERROR] This script requires Windows (JV-Link uses COM).")
     sys.exit(1)
 
 import win32com.client
-# Note: Using direct HTTP instead of supabase client for encoding control
 
 class DataUploader:
     """Collects JRA data via JV-Link and uploads to Supabase"""
@@ -49,10 +47,7 @@ class DataUploader:
         print("=" * 50)
         print("JRA Data Collector - Local Uploader")
         print("=" * 50)
-        
-        # Store Supabase credentials for direct HTTP calls
-        self.supabase_url = SUPABASE_URL
-        self.supabase_key = SUPABASE_KEY
+        self.prediction_service = True  # Push odds arrivals to prediction_service.py
         
         # Initialize JV-Link
         try:
@@ -88,6 +83,17 @@ class DataUploader:
         except Exception as e:
             return {"raw": raw_data[:100], "parse_error": str(e)}
     
+    def post_rows(self, table: str, rows: list, on_conflict: str, quiet: bool = False) -> int:
+        """Batch upsert via the shared pooled client (retries transient errors)"""
+        if not rows:
+            return 0
+        try:
+            return upsert_rows(table, rows, on_conflict)
+        except Exception as e:
+            if not quiet:
+                print(f"\n[ERROR] {table} upload failed: {e}")
+        return 0
+
     def fetch_and_upload(self, dataspec: str, target_date: datetime.date):
         """Fetch data from JV-Link and upload to Supabase"""
         date_str = target_date.strftime("%Y%m%d")
@@ -133,6 +139,8 @@ class DataUploader:
         
         count = 0
         uploaded = 0
+        entry_rows = {}  # (race_id, horse_num) -> race_entries row
+        history_runs = {}  # horse_id -> 0B12 run for horse_history
         
         while True:
             try:
@@ -166,71 +174,27 @@ class DataUploader:
                     # Parse odds/card data
                     parsed_data = self.parse_odds_data(raw_data, dataspec)
                     
-                    # Encode raw_data as Base64 to avoid encoding issues
-                    import base64
-                    try:
-                        if isinstance(raw_data, bytes):
-                            raw_bytes = raw_data
-                        else:
-                            raw_bytes = str(raw_data).encode('utf-8', errors='replace')
-                        # Store as Base64 string (ASCII-safe)
-                        safe_raw = base64.b64encode(raw_bytes[:2000]).decode('ascii')
-                    except Exception as enc_err:
-                        safe_raw = f"[encoding error: {enc_err}]"
+                    # Typed row for race_entries (flushed once per session)
+                    if dataspec == "0B15":
+                        entry = to_entry_row(parsed_data, date_str)
+                        if entry:
+                            entry_rows[(entry["race_id"], entry["horse_num"])] = entry
+                    elif dataspec == "0B12":
+                        run = to_history_run(parsed_data, date_str)
+                        if run:
+                            history_runs[run["horse_id"]] = run
                     
                     if not safe_race_id:
                         safe_race_id = f"UNKNOWN_{count:06d}"
                     
-                    # Prepare payload for Supabase - all ASCII-safe now
-                    payload = {
-                        "race_id": safe_race_id,
-                        "data_type": dataspec,
-                        "race_date": date_str,
-                        "content": json.dumps(parsed_data, ensure_ascii=False),
-                        "raw_string": safe_raw,  # Base64 encoded
-                    }
-                    
-                    # DEBUG: Verify all fields are ASCII
-                    for key, val in payload.items():
-                        try:
-                            str(val).encode('ascii')
-                        except UnicodeEncodeError as ue:
-                            print(f"\n[DEBUG] Field '{key}' has non-ASCII: {ue}")
-                            print(f"[DEBUG] Value preview: {repr(str(val)[:50])}")
+                    # Base64 raw + fixed-width dedupe key (record_key, record_hash)
+                    # The unstripped JVRead record: build_raw_row stores the canonical
+                    # cp932 bytes, so step2 / backfill uploads of the same record dedupe
+                    payload = build_raw_row(safe_race_id, date_str, dataspec, parsed_data, read_res[1])
                     
-                    # Use direct HTTP to Supabase REST API (bypass client encoding issues)
-                    try:
-                        # Serialize to JSON with ensure_ascii=True
-                        json_data = json.dumps(payload, ensure_ascii=True)
-                        json_bytes = json_data.encode('ascii')
-                        
-                        # Supabase REST API endpoint for upsert
-                        url = f"{self.supabase_url}/rest/v1/raw_race_data"
-                        
-                        req = urllib.request.Request(
-                            url,
-                            data=json_bytes,
-                            headers={
-                                "Content-Type": "application/json",
-                                "apikey": self.supabase_key,
-                                "Authorization": f"Bearer {self.supabase_key}",
-                                "Prefer": "resolution=merge-duplicates"  # upsert
-                            },
-                            method="POST"
-                        )
-                        
-                        with urllib.request.urlopen(req, timeout=30) as resp:
-                            if resp.status in (200, 201):
-                                uploaded += 1
-                                print(f"   Uploaded {uploaded} records...", end="\r")
-                            else:
-                                print(f"\n[WARN] HTTP {resp.status}")
-                                
-                    except urllib.error.HTTPError as he:
-                        err_body = he.read().decode('utf-8', errors='replace')[:200]
-                        print(f"\n[ERROR] HTTP {he.code}: {err_body}")
-                    except Exception as e:
-                        print(f"\n[ERROR] Upload failed: {e}")
+                    if self.post_rows("raw_race_data", [payload], RAW_CONFLICT):
+                        uploaded += 1
+                        print(f"   Uploaded {uploaded} records...", end="\r")
                         
             except Exception as e:
                 print(f"\n[ERROR] Read loop: {e}")
@@ -239,6 +203,16 @@ class DataUploader:
         # Close this data session
         self.jv.JVClose()
         print(f"\n   >> {dataspec}: {uploaded}/{count} records uploaded.")
+        
+        if entry_rows:
+            saved = self.post_rows("race_entries", list(entry_rows.values()), "race_id,horse_num")
+            print(f"   >> race_entries: {saved} rows upserted.")
+        if history_runs:
+            try:
+                saved = HorseHistoryStore().update(history_runs.values())
+                print(f"   >> horse_history: {saved} horses updated.")
+            except Exception as e:
+                print(f"[ERROR] horse_history update failed: {e}")
         return uploaded
     
     def fetch_odds_by_race(self, dataspec: str, race_key: str, date_str: str):
@@ -259,6 +233,8 @@ class DataUploader:
             return 0
         
         uploaded = 0
+        odds_rows = {}  # horse_num -> win_odds row (one snapshot per call)
+        snapshot_ts = datetime.datetime.now(datetime.timezone.utc).isoformat()
         while True:
             try:
                 read_res = self.jv.JVRead("", 200000, "")
@@ -289,53 +265,21 @@ class DataUploader:
                     # Parse odds data using REAL spec
                     parsed_data = self.parse_odds_data(raw_data, real_dataspec)
                     
-                    import base64
-                    try:
-                        if isinstance(raw_data, bytes):
-                            raw_bytes = raw_data
-                        else:
-                            raw_bytes = str(raw_data).encode('utf-8', errors='replace')
-                        safe_raw = base64.b64encode(raw_bytes[:2000]).decode('ascii')
-                    except Exception:
-                        safe_raw = "[encoding error]"
+                    if real_dataspec in ODDS_TYPES:
+                        for o in to_odds_rows(race_key[:16], date_str, parsed_data, snapshot_ts):
+                            odds_rows[o["horse_num"]] = o
                     
-                    payload = {
-                        "race_id": race_key[:16],  # Use full race key as ID
-                        "data_type": real_dataspec, # Use Correct Data Type
-                        "race_date": date_str,
-                        "content": json.dumps(parsed_data, ensure_ascii=False),
-                        "raw_string": safe_raw,
-                    }
+                    # race_id: full race key; data_type: the real spec (canonical bytes as above)
+                    payload = build_raw_row(race_key[:16], date_str, real_dataspec, parsed_data, read_res[1])
                     
-                    try:
-                        json_data = json.dumps(payload, ensure_ascii=True)
-                        json_bytes = json_data.encode('ascii')
-                        
-                        url = f"{self.supabase_url}/rest/v1/raw_race_data"
-                        
-                        req = urllib.request.Request(
-                            url,
-                            data=json_bytes,
-                            headers={
-                                "Content-Type": "application/json",
-                                "apikey": self.supabase_key,
-                                "Authorization": f"Bearer {self.supabase_key}",
-                                "Prefer": "resolution=merge-duplicates"
-                            },
-                            method="POST"
-                        )
-                        
-                        with urllib.request.urlopen(req, timeout=30) as resp:
-                            if resp.status in (200, 201):
-                                uploaded += 1
-                                
-                    except Exception:
-                        pass
+                    if self.post_rows("raw_race_data", [payload], RAW_CONFLICT, quiet=True):
+                        uploaded += 1
                         
             except Exception:
                 break
         
         self.jv.JVClose()
+        self.post_rows("win_odds", list(odds_rows.values()), "race_id,horse_num,snapshot_ts")
         return uploaded
 
     def fetch_race_results(self, start_date: datetime.date, end_date: datetime.date):
@@ -354,6 +298,18 @@ class DataUploader:
         print(f"\n   >> 0B12 Total: {total} records uploaded.")
         return total
 
+    def notify_prediction(self, date_str: str, race_key: str):
+        """Queue a prediction for a race whose odds just arrived (no-op without prediction_service)"""
+        if not self.prediction_service:
+            return
+        try:
+            submit("predict", date=date_str, race_id=race_key, wait=False)
+        except ServiceUnavailable:
+            print("   [INFO] prediction_service not running; odds are not pushed to it this session.")
+            self.prediction_service = False
+        except RuntimeError as e:
+            print(f"   [WARN] prediction_service: {e}")
+
     def run(self, target_date: datetime.date = None, mode: str = "auto"):
         """Main execution with mode support"""
         if target_date is None:
@@ -383,17 +339,10 @@ class DataUploader:
             # Query DB for keys
             race_keys = set()
             try:
-                url = f"{self.supabase_url}/rest/v1/raw_race_data"
-                req = urllib.request.Request(
-                    f"{url}?select=race_id&data_type=eq.0B15&race_date=eq.{date_str}",
-                    headers={"apikey": self.supabase_key, "Authorization": f"Bearer {self.supabase_key}"},
-                    method="GET"
-                )
-                with urllib.request.urlopen(req, timeout=30) as resp:
-                    data = json.loads(resp.read().decode('utf-8'))
-                    for row in data:
-                        rid = row.get('race_id', '')
-                        if rid and len(rid) >= 16: race_keys.add(rid[:16])
+                for row in iter_rows("raw_race_data", select="race_id",
+                                     filters={"data_type": "0B15", "race_date": date_str}):
+                    rid = row.get('race_id', '')
+                    if rid and len(rid) >= 16: race_keys.add(rid[:16])
             except: pass
             
             if race_keys:
@@ -401,7 +350,10 @@ class DataUploader:
                 for dataspec in ["0B31", "0B32"]:
                     spec_uploaded = 0
                     for race_key in sorted(race_keys):
-                        spec_uploaded += self.fetch_odds_by_race(dataspec, race_key, date_str)
+                        uploaded = self.fetch_odds_by_race(dataspec, race_key, date_str)
+                        spec_uploaded += uploaded
+                        if uploaded and dataspec == "0B31":
+                            self.notify_prediction(date_str, race_key)
                     print(f"   >> {dataspec}: {spec_uploaded} uploaded.")
                     total_uploaded += spec_uploaded
         
@@ -0,0 +1,200 @@
+"""
+Local Mirror Sync
+=================
+Mirrors Supabase tables into a local SQLite file so the predictor, the
+analysis scripts and offline replays can query in-process instead of over
+the network.
+
+Each table is pulled incrementally: rows with a timestamp >= the last seen
+high-water mark minus SAFETY_LAG are fetched (paged, see db_client.py) and
+upserted on the table's primary key, then the watermark advances.
+
+Usage:
+    python worker_mirror.py                 # One sync pass
+    python worker_mirror.py --loop 60       # Sync every 60 seconds
+    python worker_mirror.py --full          # Ignore watermarks (re-pull all)
+
+Reading:
+    from worker_mirror import open_mirror
+    conn = open_mirror()
+    conn.execute("SELECT * FROM raw_race_data WHERE race_date = ?", ("20260207",))
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import datetime
+from db_client import iter_rows
+
+MIRROR_PATH = os.getenv("MIRROR_PATH", "local_mirror.db")
+# updated_at is set when a transaction writes the row, not when it commits:
+# re-read this far behind the watermark so late commits are not skipped
+SAFETY_LAG = datetime.timedelta(seconds=int(os.getenv("MIRROR_SAFETY_LAG", "300")))
+
+# table -> (watermark column, primary key columns)
+# Watermarks are updated_at (bumped by touch_updated_at on every UPDATE, see
+# supabase_schema.sql), so status changes and re-written rows are pulled too.
+MIRROR_TABLES = {
+    "raw_race_data":      ("updated_at",  ["id"]),
+    "prediction_results": ("updated_at",  ["race_id", "horse_num"]),
+    "race_results":       ("updated_at",  ["race_id"]),
+    "bet_queue":          ("updated_at",  ["id"]),
+    "race_entries":       ("updated_at",  ["race_id", "horse_num"]),
+    "win_odds":           ("snapshot_ts", ["race_id", "horse_num", "snapshot_ts"]),
+    "horse_history":      ("updated_at",  ["horse_id"]),
+}
+
+
+def open_mirror(path=MIRROR_PATH):
+    """Open the local mirror (rows as sqlite3.Row)"""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS _sync_state (
+            table_name TEXT PRIMARY KEY,
+            watermark TEXT,
+            synced_at TEXT
+        )
+    """)
+    return conn
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _columns(conn, table):
+    return [r[1] for r in conn.execute(f"PRAGMA table_info({_quote(table)})")]
+
+
+def _ensure_table(conn, table, columns, pk):
+    """Create the mirror table on first sight, add new columns as they appear"""
+    existing = _columns(conn, table)
+    if not existing:
+        cols = ", ".join(_quote(c) for c in columns)
+        keys = ", ".join(_quote(c) for c in pk)
+        conn.execute(f"CREATE TABLE {_quote(table)} ({cols}, PRIMARY KEY ({keys}))")
+        if "race_date" in columns:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {_quote('idx_' + table + '_date')} "
+                         f"ON {_quote(table)}(race_date)")
+        return
+    for c in columns:
+        if c not in existing:
+            conn.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {_quote(c)}")
+
+
+def _rewind(watermark, lag=SAFETY_LAG):
+    """ISO timestamp watermark moved back by lag (unchanged if it does not parse)"""
+    try:
+        return (datetime.datetime.fromisoformat(watermark) - lag).isoformat()
+    except (TypeError, ValueError):
+        return watermark
+
+
+def _to_sql(value):
+    # JSONB / arrays are stored as JSON text
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+class MirrorSync:
+    """Incremental Supabase -> SQLite mirror"""
+
+    def __init__(self, path=MIRROR_PATH):
+        self.conn = open_mirror(path)
+
+    def get_watermark(self, table):
+        row = self.conn.execute("SELECT watermark FROM _sync_state WHERE table_name = ?", (table,)).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, table, watermark):
+        now = datetime.datetime.now().isoformat()
+        self.conn.execute(
+            "INSERT INTO _sync_state (table_name, watermark, synced_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(table_name) DO UPDATE SET watermark = excluded.watermark, synced_at = excluded.synced_at",
+            (table, watermark, now)
+        )
+
+    def sync_table(self, table, full=False):
+        ts_col, pk = MIRROR_TABLES[table]
+        watermark = None if full else self.get_watermark(table)
+
+        # The window starts SAFETY_LAG before the watermark: a transaction that
+        # stamped updated_at earlier but committed after the last pass is still
+        # picked up. Re-pulled rows just replace themselves (primary key upsert).
+        filters = {ts_col: ("gte", _rewind(watermark))} if watermark else None
+        order = ",".join([f"{ts_col}.asc"] + [f"{c}.asc" for c in pk if c != ts_col])
+
+        count = 0
+        high = watermark
+        batch = []
+        for row in iter_rows(table, filters=filters, order=order):
+            batch.append(row)
+            if len(batch) >= 1000:
+                high = self._write(table, pk, ts_col, batch, high)
+                count += len(batch)
+                batch = []
+        if batch:
+            high = self._write(table, pk, ts_col, batch, high)
+            count += len(batch)
+
+        if high:
+            self.set_watermark(table, high)
+        self.conn.commit()
+        return count
+
+    def _write(self, table, pk, ts_col, rows, high):
+        columns = list(rows[0].keys())
+        _ensure_table(self.conn, table, columns, pk)
+        cols = ", ".join(_quote(c) for c in columns)
+        marks = ", ".join("?" for _ in columns)
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO {_quote(table)} ({cols}) VALUES ({marks})",
+            [tuple(_to_sql(r.get(c)) for c in columns) for r in rows]
+        )
+        for r in rows:
+            ts = r.get(ts_col)
+            if ts and (high is None or ts > high):
+                high = ts
+        return high
+
+    def run(self, full=False):
+        total = 0
+        for table in MIRROR_TABLES:
+            t0 = time.perf_counter()
+            try:
+                n = self.sync_table(table, full=full)
+                total += n
+                print(f"[MIRROR] {table}: {n} rows ({time.perf_counter() - t0:.1f}s)")
+            except Exception as e:
+                # Missing tables (e.g. typed tables not created yet) should not stop the rest
+                self.conn.rollback()
+                print(f"[WARN] {table}: sync failed: {e}")
+        return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Supabase -> SQLite mirror")
+    parser.add_argument("--db", default=MIRROR_PATH, help="SQLite file path")
+    parser.add_argument("--loop", type=int, default=0, help="Repeat every N seconds (0 = once)")
+    parser.add_argument("--full", action="store_true", help="Ignore watermarks and re-pull everything")
+    args = parser.parse_args()
+
+    sync = MirrorSync(args.db)
+    sync.run(full=args.full)
+    while args.loop > 0:
+        time.sleep(args.loop)
+        sync.run()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n[Interrupted by user]")
+        sys.exit(0)
@@ -5,69 +5,57 @@ import json
 import argparse
 import datetime
 import pandas as pd
-import joblib
 from dotenv import load_dotenv
-import requests
+from db_client import fetch_all, fetch_rpc, upsert_rows, DEFAULT_ORDER
+from worker_archive import iter_raw_rows
+from local_engine.model_registry import active_model
 
 # --- 1. Setup ---
 load_dotenv()
-url = os.environ.get("SUPABASE_URL")
-key = os.environ.get("SUPABASE_KEY")
 
-MODEL_PATH = "local_engine/final_model.pkl"
+# 有効なモデル (local_engine/models の ACTIVE)。常駐時は ACTIVE の切替をジョブ間で反映
+ACTIVE_MODEL = active_model()
+RULE_BASE_VERSION = "rule_base"
 
-def supabase_query(table, select="*", filters=None):
-    """requests を使用して Supabase API を直接叩く"""
-    headers = {
-        "apikey": key,
-        "Authorization": f"Bearer {key}",
-    }
-    # 簡易的なクエリ構築 (eq フィルタのみサポート)
-    params = {"select": select}
-    if filters:
-        for k, v in filters.items():
-            if isinstance(v, list):
-                # in フィルタ構文: in.(value1,value2)
-                params[k] = f"in.({','.join(v)})"
-            else:
-                params[k] = f"eq.{v}"
-    
-    rest_url = f"{url}/rest/v1/{table}"
+def supabase_query(table, select="*", filters=None, order=DEFAULT_ORDER):
+    """Supabase REST API を直接叩く (Range ページングで全件取得)"""
     try:
-        response = requests.get(rest_url, headers=headers, params=params)
-        response.raise_for_status()
-        data = response.json()
-        # print(f"[DEBUG] API Query: {table} -> {len(data)} records") # Debugging line, commented out as per instruction snippet
+        data = fetch_all(table, select=select, filters=filters, order=order)
+        # print(f"[DEBUG] API Query: {table} -> {len(data)} records")
         return data
     except Exception as e:
         print(f"[ERROR] API Query Fail: {e}")
         return []
 
 def load_prediction_model():
-    """学習済みモデルをロードする。存在しない場合は None を返す。"""
-    if os.path.exists(MODEL_PATH):
-        try:
-            import sklearn # scikit-learn モデルのロードに必要
-            model = joblib.load(MODEL_PATH)
-            print(f"[INFO] モデルをロードしました: {MODEL_PATH}")
-            return model
-        except Exception as e:
-            print(f"[WARN] モデルのロードに失敗しました: {e}")
-    else:
-        print("[INFO] モデルファイルが見つかりません。ルールベースロジックを使用します。")
-    return None
+    """有効なモデルを (version, model) で返す。存在しない場合は (None, None)。"""
+    # ACTIVE が変わっていなければロード済みモデルをそのまま返す (stat 1 回)
+    version, model = ACTIVE_MODEL.current()
+    if model is None:
+        print("[INFO] モデルが見つかりません。ルールベースロジックを使用します。")
+    return version, model
 
-def fetch_data(date_str):
-    """指定日のデータを取得し、結合したDataFrameを返す"""
-    print(f"[INFO] データ取得中 (REST API): {date_str}")
-    
+def fetch_snapshot(date_str):
+    """RPC get_day_snapshot: 出馬表 + 最新オッズをサーバー側で結合済みで取得"""
+    try:
+        rows = fetch_rpc("get_day_snapshot", {"p_race_date": date_str}, order="race_id.asc,horse_num.asc")
+    except Exception as e:
+        print(f"[WARN] Snapshot RPC Fail: {e}")
+        return pd.DataFrame()
+    df = pd.DataFrame(rows)
+    if not df.empty:
+        df['horse_num'] = df['horse_num'].astype(int).astype(str).str.zfill(2)
+    return df
+
+def fetch_legacy_data(date_str):
+    """race_entries / win_odds 導入前の日付用 (raw_race_data の JSON を結合)"""
     # 0B15 (出馬表)
-    res_h = supabase_query("raw_race_data", select="race_id, content", filters={"data_type": "0B15", "race_date": date_str})
+    # (アーカイブ済みの月はローカル Parquet から読む)
+    res_h = list(iter_raw_rows(select="race_id, content", filters={"data_type": "0B15", "race_date": date_str}))
     # 0B30 (オッズ)
-    res_o = supabase_query("raw_race_data", select="race_id, content", filters={"data_type": ["0B30", "0B31"], "race_date": date_str})
+    res_o = list(iter_raw_rows(select="race_id, content", filters={"data_type": ["0B30", "0B31"], "race_date": date_str}))
     
     if not res_h:
-        print(f"[ERROR] {date_str} の出馬表データが見つかりません。")
         return pd.DataFrame()
 
     # Horses
@@ -83,10 +71,7 @@ def fetch_data(date_str):
     
     df_h = pd.DataFrame(horses)
     # Deduplicate db_h: Keep last entry for each (race_id, horse_num)
-    # Assuming the API returns data in vague insertion order, but explicit sort by something would be better if available.
-    # Since we can't easily sort by created_at here without adding it to the list, we assume the list 'horses' 
-    # reflects the fetch order. Typically Supabase returns oldest first or newest first. 
-    # Let's trust insertion order for now and keep 'last'.
+    # supabase_query は race_id, id 順で返すので 'last' が最新
     if not df_h.empty:
         df_h = df_h.drop_duplicates(subset=['race_id', 'horse_num'], keep='last')
     
@@ -110,17 +95,35 @@ def fetch_data(date_str):
     # Merge
     if not df_h.empty and not df_o.empty:
         df = pd.merge(df_h, df_o[['race_id', 'horse_num', 'odds_tan', 'pop_tan']], on=['race_id', 'horse_num'], how='left')
-    elif not df_h.empty:
+        # 10倍整数 -> 実数 (スナップショットと単位を揃える)
+        df['odds_tan'] = pd.to_numeric(df['odds_tan'], errors='coerce') / 10.0
+    else:
+        df = df_h
+        if not df.empty:
+            df['odds_tan'] = None
+            df['pop_tan'] = None
+    return df
+
+def fetch_data(date_str):
+    """指定日のデータを取得し、結合したDataFrameを返す (オッズは実数値)"""
+    print(f"[INFO] データ取得中 (REST API): {date_str}")
+    
+    df = fetch_snapshot(date_str)
+    if df.empty:
+        df = fetch_legacy_data(date_str)
+    
+    if df.empty:
+        print(f"[ERROR] {date_str} の出馬表データが見つかりません。")
+        return pd.DataFrame()
+
+    if pd.to_numeric(df['odds_tan'], errors='coerce').isna().all():
         # データが取れない場合のデモモード (開発・検証用)
         print("[WARN] オッズデータが見つからないため、検証用ダミーデータを生成します。")
         import numpy as np
-        df = df_h.copy()
-        # 単勝オッズ (1.0 - 50.0 相当の整数値)
-        df['odds_tan'] = np.random.randint(10, 500, size=len(df))
+        # 単勝オッズ (1.0 - 50.0)
+        df['odds_tan'] = np.random.randint(10, 500, size=len(df)) / 10.0
         # 人気 (1 - 18)
         df['pop_tan'] = np.random.randint(1, 19, size=len(df))
-    else:
-        df = df_h
         
     return df
 
@@ -128,8 +131,8 @@ def feature_engineering(df):
     """特徴量エンジニアリングを行う"""
     if df.empty: return df
     
-    # 型変換とスケーリング (10倍整数 -> 実数)
-    df['odds_tan'] = pd.to_numeric(df['odds_tan'], errors='coerce') / 10.0
+    # 型変換 (オッズは fetch_data で実数化済み)
+    df['odds_tan'] = pd.to_numeric(df['odds_tan'], errors='coerce')
     df['pop_tan'] = pd.to_numeric(df['pop_tan'], errors='coerce')
     df['horse_num_int'] = pd.to_numeric(df['horse_num'], errors='coerce')
     
@@ -165,14 +168,21 @@ def rule_base_predict_mark(row):
         pass
     return 0.0
 
-def run_inference(date_str):
-    """メイン推論フロー"""
+def run_inference(date_str, race_id=None):
+    """
+    メイン推論フロー
+    race_id: 指定時はそのレースのみ推論・保存
+    戻り値: 保存件数
+    """
     df = fetch_data(date_str)
-    if df.empty: return
+    if race_id and not df.empty:
+        df = df[df['race_id'].astype(str).str.startswith(str(race_id))].copy()
+    if df.empty: return 0
     
     df = feature_engineering(df)
     
-    model = load_prediction_model()
+    version, model = load_prediction_model()
+    df['model_version'] = version or RULE_BASE_VERSION
     
     if model:
         # モデルがある場合 (必須特徴量: odds_tan, pop_tan, odds_per_pop, horse_num_int)
@@ -190,6 +200,7 @@ def run_inference(date_str):
             df['pred_mark'] = (df['pred_score'] > 0.5).astype(float)
         except Exception as e:
             print(f"[WARN] モデル推論中にエラーが発生しました。ルールベースに切り替えます: {e}")
+            df['model_version'] = RULE_BASE_VERSION
             df['pred_score'] = df.apply(rule_base_predict_score, axis=1)
             df['pred_mark'] = df.apply(rule_base_predict_mark, axis=1)
     else:
@@ -231,11 +242,11 @@ def run_inference(date_str):
 
     # --- DB 保存処理 ---
     print("\n[INFO] Saving prediction results to Supabase...")
-    save_prediction_results(df)
+    return save_prediction_results(df)
 
 def save_prediction_results(df):
     """予測結果を prediction_results テーブルに保存する"""
-    if df.empty: return
+    if df.empty: return 0
 
     # 保存用リスト作成
     payload = []
@@ -257,41 +268,29 @@ def save_prediction_results(df):
             "horse_num": str(row['horse_num']),
             "predict_score": round(float(score), 3), # 小数点第3位まで保持
             "predict_flag": p_mark,
+            "model_version": row.get('model_version'),
             "created_at": now_iso
         }
         payload.append(item)
     
     if not payload:
-        return
+        return 0
 
     # SupabaseへUpsert (一括)
     # 実際にはデータ量が多いと分割が必要だが、1日分なら数千件なので分割推奨
     batch_size = 500
     total_saved = 0
     
-    url = os.environ.get("SUPABASE_URL")
-    key = os.environ.get("SUPABASE_KEY")
-    rest_url = f"{url}/rest/v1/prediction_results"
-    
-    headers = {
-        "apikey": key,
-        "Authorization": f"Bearer {key}",
-        "Content-Type": "application/json",
-        "Prefer": "resolution=merge-duplicates" # upsert based on primary key (race_id, horse_num)
-    }
-
     for i in range(0, len(payload), batch_size):
         batch = payload[i:i+batch_size]
         try:
-            resp = requests.post(rest_url, headers=headers, json=batch)
-            if resp.status_code in (200, 201, 204):
-                total_saved += len(batch)
-            else:
-                print(f"[ERROR] Save failed: {resp.status_code} {resp.text}")
+            # upsert based on primary key (race_id, horse_num)
+            total_saved += upsert_rows("prediction_results", batch, on_conflict="race_id,horse_num")
         except Exception as e:
-            print(f"[ERROR] Save request error: {e}")
+            print(f"[ERROR] Save failed: {e}")
             
     print(f"[INFO] Saved {total_saved} prediction records.")
+    return total_saved
 
 if __name__ == "__main__":
     # Windows用エンコーディング対策
@@ -8,22 +8,12 @@ import smtplib
 from email.mime.text import MIMEText
 import pandas as pd
 import numpy as np
-from supabase import create_client
+from db_client import fetch_page, insert_rows, fan_out
 from dotenv import load_dotenv
 
-# Try importing Brain (Simulated if missing in dev env)
-try:
-    from local_engine.brain import Brain
-    BRAIN_AVAILABLE = True
-except ImportError:
-    BRAIN_AVAILABLE = False
-    print("[WARN] Brain module missing. Running in Logic-Only Check Mode.")
-
 # --- Config ---
 load_dotenv()
 
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 MAIL_SENDER = os.getenv("MAIL_SENDER")
 MAIL_APP_PASS = os.getenv("MAIL_APP_PASS")
 MAIL_RECEIVER = os.getenv("MAIL_RECEIVER")
@@ -90,9 +80,14 @@ class JVParser:
 class Predictor:
     def __init__(self):
         print("[PREDICTOR] Initializing...")
-        self.supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-        if BRAIN_AVAILABLE:
-            self.brain = Brain(model_path="local_engine/final_model.pkl")
+        # Brain (simulated if missing in dev env); imported here, not at module import
+        try:
+            from local_engine.brain import Brain
+        except ImportError:
+            Brain = None
+            print("[WARN] Brain module missing. Running in Logic-Only Check Mode.")
+        if Brain is not None:
+            self.brain = Brain()
         else:
             self.brain = None
             
@@ -134,22 +129,26 @@ class Predictor:
         # We need 0B15 (Card) and 0B31 (Odds)
         # Sort by timestamp desc to get latest
         try:
-            res_card = self.supabase.table("raw_race_data").select("*").eq("data_type", "0B15").order("timestamp", desc=True).limit(20).execute() # Get all horses for race
-            res_odds = self.supabase.table("raw_race_data").select("*").eq("data_type", "0B31").order("timestamp", desc=True).limit(1).execute() # Get latest odds set
+            # Card and odds are independent queries; fetch them in parallel
+            res = fan_out({
+                "card": lambda: fetch_page("raw_race_data", filters={"data_type": "0B15"}, order="timestamp.desc", limit=20), # Get all horses for race
+                "odds": lambda: fetch_page("raw_race_data", filters={"data_type": "0B31"}, order="timestamp.desc", limit=1), # Get latest odds set
+            })
+            card_rows, odds_rows = res["card"], res["odds"]
             
-            if not res_card.data or not res_odds.data:
+            if not card_rows or not odds_rows:
                 print(f"[SKIP] Missing data for {race_id}")
                 return
 
             # 2. Parse & Align
-            odds_data = JVParser.parse_0B31(res_odds.data[0]['content']['raw_string'])
+            odds_data = JVParser.parse_0B31(odds_rows[0]['content']['raw_string'])
             if not odds_data:
                 print("[SKIP] Failed to parse Odds")
                 return
 
             candidates = []
             
-            for row in res_card.data:
+            for row in card_rows:
                 card_info = JVParser.parse_0B15(row['content']['raw_string'])
                 if not card_info: continue
                 
@@ -221,7 +220,7 @@ class Predictor:
                 })
                 
             if queue_items:
-                 self.supabase.table("bet_queue").insert(queue_items).execute()
+                 insert_rows("bet_queue", queue_items)
                  print(f"[QUEUE] Inserted {len(queue_items)} bets.")
 
         except Exception as e:
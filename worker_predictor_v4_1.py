@@ -7,42 +7,44 @@ generates betting predictions.
 This runs on Streamlit Cloud or locally.
 """
 
-import os
-import sys
 import json
 import datetime
 import pandas as pd
 import numpy as np
 from dotenv import load_dotenv
-from supabase import create_client
-
-# Try importing local AI brain (optional)
-try:
-    from local_engine.brain import Brain
-    BRAIN_AVAILABLE = True
-except ImportError:
-    BRAIN_AVAILABLE = False
+from db_client import fetch_page, fetch_all, fetch_rpc, fan_out, upsert_rows
+from horse_history import HorseHistoryStore
 
 # --- Config ---
 load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
 # V4.1 Thresholds
 SINGLE_EV_THRESH = 2.0
 WIDE_EV_THRESH = 1.34
 WIDE_ODDS_FACTOR = 0.75
 
+# bet_queue dedupe: every cycle re-scores the whole day, so a bet is queued
+# once per race / type / selection and later cycles leave it (and its status) as is
+BET_CONFLICT = "bet_key"
+
+
+def bet_key(bet: dict) -> str:
+    return f"{bet['race_id']}:{bet['bet_type']}:{bet['horse_num']}"
+
 
 class PredictorV4_1:
     """Hybrid Strategy Predictor: Spear (Single) + Shield (Wide)"""
     
     def __init__(self):
         print("[PREDICTOR V4.1] Initializing Hybrid Strategy...")
-        self.supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-        
-        if BRAIN_AVAILABLE:
-            self.brain = Brain(model_path="local_engine/final_model.pkl")
+        # Local AI brain (optional); imported here, not at module import
+        try:
+            from local_engine.brain import Brain
+        except ImportError:
+            Brain = None
+        if Brain is not None:
+            # Active registry model, hot-reloaded between batches
+            self.brain = Brain(history_store=HorseHistoryStore())
         else:
             self.brain = None
             print("[WARN] AI Brain not available. Using probability estimation.")
@@ -50,15 +52,10 @@ class PredictorV4_1:
     def fetch_latest_data(self, data_type: str, race_date: str = None) -> list:
         """Fetch latest data from Supabase raw_race_data table"""
         try:
-            query = self.supabase.table("raw_race_data")\
-                .select("*")\
-                .eq("data_type", data_type)
-            
+            filters = {"data_type": data_type}
             if race_date:
-                query = query.eq("race_date", race_date)
-            
-            res = query.order("timestamp", desc=True).limit(100).execute()
-            return res.data if res.data else []
+                filters["race_date"] = race_date
+            return fetch_page("raw_race_data", filters=filters, order="timestamp.desc", limit=100)
         except Exception as e:
             print(f"[ERROR] Failed to fetch {data_type}: {e}")
             return []
@@ -166,6 +163,10 @@ class PredictorV4_1:
             )
             race_df.at[idx, 'ai_prob'] = prob
         
+        return self.recommend(race_id, race_df)
+    
+    def recommend(self, race_id: str, race_df: pd.DataFrame) -> list:
+        """bet_queue items for one race (race_df: horse_num, odds, ai_prob in %)"""
         # Calculate value metrics
         race_df = self.calculate_odds_per_pop(race_df)
         race_df['ev'] = (race_df['ai_prob'] / 100) * race_df['odds']
@@ -210,6 +211,65 @@ class PredictorV4_1:
         
         return queue_items
     
+    def fetch_day_frame(self, race_date: str) -> pd.DataFrame:
+        """
+        Every runner of race_date with its latest win odds, in the TARGET
+        columns Brain.predict_day expects (lags come from horse_history).
+        """
+        data = fan_out({
+            "entries": lambda: fetch_all("race_entries", select="race_id,horse_num,horse_id,weight",
+                                         filters={"race_date": race_date}, order="race_id.asc,horse_num.asc"),
+            "snapshot": lambda: fetch_rpc("get_day_snapshot", {"p_race_date": race_date},
+                                          order="race_id.asc,horse_num.asc"),
+        })
+        entries = pd.DataFrame(data["entries"])
+        if entries.empty:
+            return entries
+        odds = pd.DataFrame(data["snapshot"], columns=["race_id", "horse_num", "odds_tan", "pop_tan"])
+        df = entries.merge(odds, on=["race_id", "horse_num"], how="left")
+        return pd.DataFrame({
+            "race_id": df["race_id"],
+            "馬番": df["horse_num"],
+            "血統登録番号": df["horse_id"],
+            "Date": pd.to_datetime(race_date, format="%Y%m%d"),
+            "単勝オッズ": pd.to_numeric(df["odds_tan"], errors="coerce"),
+            "人気順": pd.to_numeric(df["pop_tan"], errors="coerce"),
+            "頭数": df.groupby("race_id")["horse_num"].transform("size"),
+            "斤量": pd.to_numeric(df["weight"], errors="coerce"),
+            # Today's results are unknown (shift(1) reads them only for later rows)
+            "PCI": np.nan,
+            "上がり3Fタイム": np.nan,
+            "確定着順": np.nan,
+        })
+    
+    def run_day_model(self, target_date: str):
+        """All races of the day through Brain.predict_day (one model call); None -> fall back"""
+        if self.brain is None or self.brain.model is None:
+            return None
+        try:
+            frame = self.fetch_day_frame(target_date)
+            if frame.empty:
+                print("[DAY] No race_entries for this date.")
+                return None
+            day, shadow = self.brain.predict_day_with_shadows(frame)
+        except Exception as e:
+            print(f"[ERROR] Day prediction failed: {e}")
+            return None
+        if day.empty:
+            return None
+        # Shadow models are only recorded; bets below come from the active model
+        self.save_shadow_scores(target_date, shadow, day["model_version"].iloc[0])
+        
+        print(f"[DAY] Scored {len(day)} runners in {day.index.get_level_values('race_id').nunique()} races "
+              f"(model {day['model_version'].iloc[0]})")
+        all_bets = []
+        for race_id, race in day.groupby(level="race_id", sort=True):
+            race_df = race.reset_index()[["horse_num", "odds", "ai_prob"]].dropna(subset=["odds"])
+            race_df["ai_prob"] = race_df["ai_prob"] * 100  # recommend() works in %
+            if not race_df.empty:
+                all_bets.extend(self.recommend(race_id, race_df))
+        return all_bets
+    
     def run(self, target_date: str = None):
         """Main prediction cycle"""
         print("\n" + "="*50)
@@ -221,6 +281,12 @@ class PredictorV4_1:
         
         print(f"[TARGET] Date: {target_date}")
         
+        # Model path: every race of the day in one batch
+        all_bets = self.run_day_model(target_date)
+        if all_bets is not None:
+            self.queue_bets(all_bets, target_date)
+            return all_bets
+        
         # Fetch data from Supabase
         odds_data = self.fetch_latest_data("0B31", target_date)
         card_data = self.fetch_latest_data("0B15", target_date)
@@ -246,17 +312,76 @@ class PredictorV4_1:
             bets = self.process_race(race_id, odds_data, card_data)
             all_bets.extend(bets)
         
-        # Queue bets to Supabase
+        self.queue_bets(all_bets, target_date)
+        return all_bets
+    
+    def save_shadow_scores(self, race_date: str, shadow: pd.DataFrame, primary_version: str = None):
+        """
+        Shadow model scores -> shadow_predictions (latest per race / horse / model),
+        with the bets each would have placed. Failures never block the cycle.
+        """
+        if shadow is None or shadow.empty:
+            return 0
+        now_iso = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        rows = []
+        for (version, race_id), race in shadow.groupby(level=["model_version", "race_id"], sort=False):
+            race = race.reset_index()
+            race_df = race[["horse_num", "odds", "ai_prob"]].dropna(subset=["odds"]).copy()
+            race_df["ai_prob"] = race_df["ai_prob"] * 100  # recommend() works in %
+            bets = self.recommend(race_id, race_df) if not race_df.empty else []
+            win = {b["horse_num"] for b in bets if b["bet_type"] == "WIN"}
+            wide = {n for b in bets if b["bet_type"] == "WIDE" for n in b["horse_num"].split("-")}
+            for r in race.itertuples(index=False):
+                num = str(int(r.horse_num))
+                rows.append({
+                    "race_id": race_id,
+                    "race_date": race_date,
+                    "horse_num": int(r.horse_num),
+                    "model_version": version,
+                    "primary_version": primary_version,
+                    "ai_prob": round(float(r.ai_prob), 5),
+                    "primary_prob": None if pd.isna(r.primary_prob) else round(float(r.primary_prob), 5),
+                    "odds": None if pd.isna(r.odds) else float(r.odds),
+                    "ev": None if pd.isna(r.ev) else round(float(r.ev), 4),
+                    "prob_rank": None if pd.isna(r.prob_rank) else int(r.prob_rank),
+                    "would_bet_win": num in win,
+                    "would_bet_wide": num in wide,
+                    "scored_at": now_iso,
+                })
+        try:
+            saved = upsert_rows("shadow_predictions", rows, on_conflict="race_id,horse_num,model_version")
+            print(f"[SHADOW] {saved} scores from {shadow.index.get_level_values('model_version').nunique()} shadow model(s)")
+            return saved
+        except Exception as e:
+            print(f"[WARN] Failed to save shadow scores: {e}")
+            return 0
+    
+    def finished_races(self, race_date: str) -> set:
+        """race_ids of race_date that already have a result (too late to bet)"""
+        try:
+            return {r["race_id"] for r in fetch_all("race_results", select="race_id",
+                                                    filters={"race_date": race_date})}
+        except Exception as e:
+            print(f"[WARN] Failed to fetch race_results: {e}")
+            return set()
+    
+    def queue_bets(self, all_bets: list, race_date: str = None):
+        """
+        Queue bets to Supabase. Bets on finished races are dropped; a bet
+        already queued (same bet_key) is skipped, keeping its status.
+        """
+        if all_bets and race_date:
+            finished = self.finished_races(race_date)
+            all_bets = [b for b in all_bets if b["race_id"] not in finished]
         if all_bets:
+            rows = list({bet_key(b): dict(b, bet_key=bet_key(b)) for b in all_bets}.values())
             try:
-                self.supabase.table("bet_queue").insert(all_bets).execute()
-                print(f"\n[QUEUED] {len(all_bets)} bets added to queue.")
+                upsert_rows("bet_queue", rows, on_conflict=BET_CONFLICT, ignore_duplicates=True)
+                print(f"\n[QUEUED] {len(rows)} bets offered to the queue (already queued ones skipped).")
             except Exception as e:
                 print(f"[ERROR] Failed to queue bets: {e}")
         else:
             print("\n[INFO] No bets generated this cycle.")
-        
-        return all_bets
 
 
 def run_prediction_cycle():
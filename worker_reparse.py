@@ -0,0 +1,250 @@
+"""
+Bulk Re-parse of raw_race_data
+==============================
+Re-derives `content` from the stored raw bytes with the current parser
+(jra_specs.SPECS + jra_parser) after a spec change, for the whole history.
+
+Rows whose parser_version differs from jra_parser.PARSER_VERSION are streamed
+page by page (keyset on id, so stamping rows while paging cannot skip any)
+and parsed across a process pool.
+    - content changed   -> row written back with the new content and version
+                           (timestamp and, via its trigger, updated_at bumped)
+    - content unchanged -> only parser_version is stamped (STAMP_CHUNK ids per PATCH)
+    - rejected by the parser -> left as is, stamped so it is not retried
+Changed race cards also refresh race_entries.
+
+A re-derived record_key can make a row equal on the dedupe key (RAW_CONFLICT)
+to another stored row: same race, type, date and raw bytes, so a duplicate.
+It is deleted instead of written (the row already holding the key stays).
+A write-back that still fails is retried row by row, so one bad row does
+not cost the page.
+
+Supersedes the one-off fix_0b15_se.py script (removed).
+
+Usage:
+    python worker_reparse.py                          # All stale rows
+    python worker_reparse.py --from 20250101 --to 20251231
+    python worker_reparse.py --types 0B15 --dry-run   # Count changes only
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import datetime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from jra_parser import JRAParser, PARSER_VERSION
+from jra_specs import SPECS
+from raw_records import record_key, RAW_CONFLICT
+from race_tables import to_entry_row
+from db_client import fetch_all, fetch_page, upsert_rows, update_rows, delete_rows
+
+PAGE_SIZE = 1000
+STAMP_CHUNK = 200   # ids per parser_version stamp (in.(...) list stays well under URL limits)
+WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+SELECT = "id,race_id,data_type,race_date,record_key,record_hash,raw_string,content,status,parser_version"
+KEY_COLUMNS = RAW_CONFLICT.split(",")
+
+
+def raw_bytes(raw_string):
+    """
+    Bytes as JRAParser expects them (Shift-JIS). New rows are stored as cp932
+    (raw_records.canonical_record); older collector / reuploader rows as UTF-8.
+    """
+    data = base64.b64decode(raw_string)
+    try:
+        return data.decode("utf-8").encode("cp932")
+    except (UnicodeDecodeError, UnicodeEncodeError):
+        return data
+
+
+def _loads(content):
+    if isinstance(content, str):
+        try:
+            return json.loads(content)
+        except ValueError:
+            return None
+    return content
+
+
+def reparse_page(rows):
+    """
+    Runs in a worker process.
+    Returns (changed rows, unchanged ids, entry rows, rejected count).
+    """
+    changed, unchanged, entries = [], [], []
+    rejected = 0
+    for row in rows:
+        try:
+            parsed = JRAParser(raw_bytes(row["raw_string"])).parse(row["data_type"])
+        except Exception:
+            parsed = None
+        if not parsed:
+            rejected += 1
+            unchanged.append(row["id"])
+            continue
+        if parsed == _loads(row["content"]):
+            unchanged.append(row["id"])
+            continue
+
+        new_row = dict(row)
+        new_row["content"] = json.dumps(parsed, ensure_ascii=False)
+        new_row["record_key"] = record_key(parsed)
+        new_row["parser_version"] = PARSER_VERSION
+        new_row["timestamp"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        changed.append(new_row)
+        if row["data_type"] == "0B15":
+            entry = to_entry_row(parsed, row["race_date"])
+            if entry:
+                entries.append(entry)
+    return changed, unchanged, entries, rejected
+
+
+def stale_filters(types, date_from=None, date_to=None, after_id=0):
+    filters = {
+        "id": ("gt", after_id),
+        "data_type": list(types),
+        "raw_string": ("not.is", "null"),
+        "or": f"(parser_version.is.null,parser_version.neq.{PARSER_VERSION})",
+    }
+    dates = []
+    if date_from:
+        dates.append(f"race_date.gte.{date_from}")
+    if date_to:
+        dates.append(f"race_date.lte.{date_to}")
+    if dates:
+        filters["and"] = f"({','.join(dates)})"
+    return filters
+
+
+def _key(row):
+    return tuple(str(row[c]) for c in KEY_COLUMNS)
+
+
+def split_collisions(changed):
+    """
+    (rows to write, ids of duplicates): rows whose new dedupe key is already
+    held by a stored row outside the batch, or by a lower id in the batch.
+    """
+    batch_ids = {row["id"] for row in changed}
+    hashes = sorted({row["record_hash"] for row in changed})
+    taken = {}
+    for i in range(0, len(hashes), STAMP_CHUNK):
+        for row in fetch_all("raw_race_data", select="id," + RAW_CONFLICT, order="id.asc",
+                             filters={"record_hash": hashes[i:i + STAMP_CHUNK]}):
+            # Rows of this batch are checked on their new keys below
+            if row["id"] not in batch_ids:
+                taken.setdefault(_key(row), row["id"])
+    keep, duplicates = [], []
+    for row in sorted(changed, key=lambda r: r["id"]):
+        if _key(row) in taken:
+            duplicates.append(row["id"])
+        else:
+            taken[_key(row)] = row["id"]
+            keep.append(row)
+    return keep, duplicates
+
+
+class Reparser:
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.stats = {"scanned": 0, "changed": 0, "unchanged": 0, "rejected": 0,
+                      "duplicates": 0, "failed": 0}
+
+    def _write_changed(self, rows):
+        """Upsert on the primary key (record_key itself may change with the spec); returns failures"""
+        try:
+            upsert_rows("raw_race_data", rows, on_conflict="id,race_date")
+            return 0
+        except Exception as e:
+            print(f"\n[WARN] Write-back of {len(rows)} rows failed ({e}); retrying row by row")
+        failed = 0
+        for row in rows:
+            try:
+                upsert_rows("raw_race_data", [row], on_conflict="id,race_date")
+            except Exception as e:
+                failed += 1
+                print(f"\n[ERROR] Row {row['id']} ({row['race_id']} {row['record_key']}): {e}")
+        return failed
+
+    def apply(self, result):
+        changed, unchanged, entries, rejected = result
+        self.stats["unchanged"] += len(unchanged) - rejected
+        self.stats["rejected"] += rejected
+        try:
+            changed, duplicates = split_collisions(changed) if changed else ([], [])
+        except Exception as e:
+            self.stats["failed"] += len(changed) + len(unchanged)
+            print(f"\n[ERROR] Duplicate check failed: {e}")
+            return
+        self.stats["changed"] += len(changed)
+        self.stats["duplicates"] += len(duplicates)
+        if self.dry_run:
+            return
+        for i in range(0, len(duplicates), STAMP_CHUNK):
+            try:
+                delete_rows("raw_race_data", {"id": duplicates[i:i + STAMP_CHUNK]})
+            except Exception as e:
+                self.stats["failed"] += len(duplicates[i:i + STAMP_CHUNK])
+                print(f"\n[ERROR] Deleting duplicates failed: {e}")
+        if changed:
+            self.stats["failed"] += self._write_changed(changed)
+        try:
+            if entries:
+                upsert_rows("race_entries", list({(e["race_id"], e["horse_num"]): e for e in entries}.values()),
+                            on_conflict="race_id,horse_num")
+            for i in range(0, len(unchanged), STAMP_CHUNK):
+                update_rows("raw_race_data", {"parser_version": PARSER_VERSION},
+                            {"id": unchanged[i:i + STAMP_CHUNK]})
+        except Exception as e:
+            self.stats["failed"] += len(entries) + len(unchanged)
+            print(f"\n[ERROR] Write-back failed: {e}")
+
+    def run(self, types, date_from=None, date_to=None, workers=WORKERS, page_size=PAGE_SIZE):
+        print(f"[REPARSE] parser_version {PARSER_VERSION}, types {','.join(types)}, {workers} workers")
+        t0 = time.perf_counter()
+        last_id = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            window = deque()
+            while True:
+                page = fetch_page("raw_race_data", select=SELECT, order="id.asc", limit=page_size,
+                                  filters=stale_filters(types, date_from, date_to, last_id))
+                if not page:
+                    break
+                last_id = page[-1]["id"]
+                self.stats["scanned"] += len(page)
+                window.append(pool.submit(reparse_page, page))
+                while len(window) >= workers * 2:
+                    self.apply(window.popleft().result())
+                elapsed = time.perf_counter() - t0
+                print(f"   {self.stats['scanned']:,} scanned | {self.stats['changed']:,} changed | "
+                      f"{self.stats['scanned'] / elapsed:,.0f} rows/s   ", end="\r")
+            while window:
+                self.apply(window.popleft().result())
+
+        elapsed = time.perf_counter() - t0
+        print(f"\n[REPARSE] Done in {elapsed:.1f}s: " + ", ".join(f"{k} {v:,}" for k, v in self.stats.items()))
+        return 1 if self.stats["failed"] else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-parse stored raw_race_data with the current specs")
+    parser.add_argument("--from", dest="date_from", help="First race date (YYYYMMDD)")
+    parser.add_argument("--to", dest="date_to", help="Last race date (YYYYMMDD)")
+    parser.add_argument("--types", default=",".join(SPECS), help="Data types to re-parse")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Parser processes")
+    parser.add_argument("--dry-run", action="store_true", help="Count changes without writing")
+    args = parser.parse_args()
+    sys.exit(Reparser(args.dry_run).run(args.types.split(","), args.date_from, args.date_to, args.workers))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n[Interrupted by user] Stamped rows are skipped on the next run.")
+        sys.exit(1)
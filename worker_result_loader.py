@@ -5,7 +5,7 @@ import datetime
 import traceback
 import argparse
 from dotenv import load_dotenv
-from supabase import create_client
+from db_client import upsert_rows
 
 # Windows only
 if os.name == 'nt':
@@ -25,10 +25,8 @@ class JVResultLoader:
             print(f"[ERROR] JVLink Init Failed: {e}")
             sys.exit(1)
             
-        if SUPABASE_URL and SUPABASE_KEY:
-            self.supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-        else:
-            self.supabase = None
+        self.upload = bool(SUPABASE_URL and SUPABASE_KEY)
+        if not self.upload:
             print("[WARN] No Supabase credentials. Dry run only.")
 
     def parse_hr_record(self, line):
@@ -141,12 +139,12 @@ class JVResultLoader:
         self.jv.JVClose()
         print(f"Processed {len(updates)} HR records.")
         
-        if updates and self.supabase:
+        if updates and self.upload:
             print("Upserting to Supabase...")
             # Upsert
             chunks = [updates[i:i+50] for i in range(0, len(updates), 50)]
             for chunk in chunks:
-                self.supabase.table("race_results").upsert(chunk).execute()
+                upsert_rows("race_results", chunk, on_conflict="race_id")
             print("Done.")
 
 def main():
@@ -4,7 +4,7 @@ import json
 import datetime
 import traceback
 from dotenv import load_dotenv
-from supabase import create_client
+from db_client import fetch_all, upsert_rows
 
 # Load environment
 load_dotenv()
@@ -15,8 +15,6 @@ if not SUPABASE_URL or not SUPABASE_KEY:
     print("Error: Supabase credentials missing.")
     exit(1)
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-
 def parse_se_record(raw_str):
     """
     Parse SE record (Horse Result) from 0B12.
@@ -65,18 +63,18 @@ def main():
     # 1. Fetch 0B12 data for today (2026/02/07 or target)
     
     print(f"Fetching 0B12 data for {today}...")
-    res = supabase.table("raw_race_data").select("*").eq("data_type", "0B12").eq("race_date", today).execute()
+    rows = fetch_all("raw_race_data", filters={"data_type": "0B12", "race_date": today})
     
-    if not res.data:
+    if not rows:
         print("No 0B12 data found in raw_race_data. Please upload using step2_upload.py --spec 0B12.")
         return
 
-    print(f"Found {len(res.data)} records (chunks). Processing...")
+    print(f"Found {len(rows)} records (chunks). Processing...")
     
     # Group by Race ID
     race_map = {}
     
-    for r in res.data:
+    for r in rows:
         rid = r['race_id']
         content = r.get('content') # This might be just header info
         raw = r.get('raw_string')
@@ -116,7 +114,7 @@ def main():
     import base64
     
     count_se = 0
-    for r in res.data:
+    for r in rows:
         rid = r['race_id']
         raw_b64 = r.get('raw_string')
         if not raw_b64: continue
@@ -172,7 +170,7 @@ def main():
         values = list(race_results.values())
         # Upsert
         try:
-            supabase.table("race_results").upsert(values).execute()
+            upsert_rows("race_results", values, on_conflict="race_id")
             print("Successfully updated race_results table.")
         except Exception as e:
             print(f"DB Upsert Error: {e}")
@@ -5,7 +5,7 @@ import json
 import datetime
 import requests
 from bs4 import BeautifulSoup
-from supabase import create_client
+from db_client import fetch_all, upsert_rows
 from dotenv import load_dotenv
 
 # Load environment
@@ -18,8 +18,6 @@ if not SUPABASE_URL or not SUPABASE_KEY:
     print("[ERROR] Supabase credentials missing.")
     sys.exit(1)
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-
 def get_today_str():
     return datetime.datetime.now().strftime("%Y%m%d")
 
@@ -148,13 +146,13 @@ def main():
         # We need a list of race_ids to check. 
         # For hybrid model, we rely on having 0B15 data uploaded.
         
-        res = supabase.table("raw_race_data").select("race_id").eq("race_date", today_str).execute()
+        rows = fetch_all("raw_race_data", select="race_id", filters={"race_date": today_str})
         
-        if not res.data:
+        if not rows:
             print("No races found in DB for today. Nothing to scrape.")
             return
 
-        race_ids = [r['race_id'] for r in res.data]
+        race_ids = [r['race_id'] for r in rows]
         # Unique
         race_ids = list(set(race_ids))
         print(f"Checking {len(race_ids)} races for results...")
@@ -166,7 +164,7 @@ def main():
             result_data = scrape_race_results(rid)
             if result_data:
                 # Upsert to race_results
-                supabase.table("race_results").upsert(result_data).execute()
+                upsert_rows("race_results", [result_data], on_conflict="race_id")
                 print(f"[OK] Updates results for {rid}")
             else:
                 print(f"[SKIP] No result yet for {rid}")
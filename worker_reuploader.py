@@ -1,16 +1,8 @@
 import os
 import glob
-import json
-import base64
-import datetime
-from dotenv import load_dotenv
-from supabase import create_client, Client
+from db_client import upsert_rows
+from raw_records import build_raw_row, RAW_CONFLICT
 
-# 環境変数読み込み
-load_dotenv()
-url = os.environ.get("SUPABASE_URL")
-key = os.environ.get("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
 
 class JRAByteParser:
     def __init__(self, line_str):
@@ -111,11 +103,13 @@ def process_file(file_path):
     else:
         return
 
-    with open(file_path, "r", encoding="utf-8", errors="replace") as f:
+    # step1_download.py writes the JV-Link records as cp932
+    with open(file_path, "r", encoding="cp932", errors="replace") as f:
         lines = f.readlines()
 
     records = []
     for line in lines:
+        raw = line.rstrip("\r\n")  # Stored / hashed as is (fixed width, see raw_records.py)
         line = line.strip()
         if not line: continue
         
@@ -131,16 +125,11 @@ def process_file(file_path):
         
         race_id = parsed_content.get("race_id", "UNKNOWN")
         
-        # Raw String (Base64)
-        raw_b64 = base64.b64encode(line.encode('utf-8')).decode('utf-8')
-        
-        record = {
-            "race_id": race_id,
-            "race_date": race_id[:8],
-            "data_type": data_type,
-            "raw_string": raw_b64,
-            "content": parsed_content
-        }
+        # SE は馬番 (Umaban) ごとに別レコード
+        record_key = parsed_content["record_type"] + parsed_content.get("Umaban", "")
+        # 独自パーサーのため parser_version なし (worker_reparse.py で JRAParser 形式に揃う)
+        record = build_raw_row(race_id, race_id[:8], data_type, parsed_content,
+                               raw, key=record_key, parser_version=None)
         records.append(record)
 
     if records:
@@ -149,7 +138,7 @@ def process_file(file_path):
         BATCH_SIZE = 100
         for i in range(0, len(records), BATCH_SIZE):
             batch = records[i:i+BATCH_SIZE]
-            supabase.table("raw_race_data").upsert(batch).execute()
+            upsert_rows("raw_race_data", batch, on_conflict=RAW_CONFLICT)
 
 def main():
     print("=== JRA-VAN Data Re-uploader ===")
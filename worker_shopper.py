@@ -14,7 +14,7 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart  # FIX #1: Added missing import
 from email.mime.image import MIMEImage  # FIX #1: Added missing import
-from supabase import create_client
+from db_client import fetch_all, update_rows
 
 # --- Configuration ---
 load_dotenv()
@@ -34,21 +34,12 @@ MAIL_SENDER = os.getenv("MAIL_SENDER")
 MAIL_APP_PASS = os.getenv("MAIL_APP_PASS")
 MAIL_RECEIVER = os.getenv("MAIL_RECEIVER")
 
-# Supabase
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-
 # FIX #10: Dashboard URL from environment
 DASHBOARD_URL = os.getenv("DASHBOARD_URL", "https://horse-racing-dashboard.streamlit.app/")
 
 class Shopper:
-    def __init__(self, supabase_client=None):
-        # Allow passing client to reuse connection
-        if supabase_client:
-            self.supabase = supabase_client
-        else:
-            self.supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-            
+    def __init__(self):
+        # Supabase access goes through the shared pooled client (db_client.py)
         self.driver = None
         self.total_spent = 0
         self.alert_history = {}  # Key: Error Signature, Value: Last Sent Timestamp
@@ -251,8 +242,7 @@ Recovery Advice:
                 return False
 
             # Fetch Approved Bets (Hybrid Architecture: Status=pending AND Approved=True)
-            res = self.supabase.table("bet_queue").select("*").eq("status", "pending").eq("approved", True).execute()
-            bets = res.data if hasattr(res, 'data') else []
+            bets = fetch_all("bet_queue", filters={"status": "pending", "approved": "true"}, order="id.asc")
             
             if not bets:
                 return True  # Continue polling
@@ -282,7 +272,7 @@ Recovery Advice:
                 
                 # Post-Purchase Update
                 self.total_spent += int(bet['amount'])
-                self.supabase.table("bet_queue").update({"status": "purchased"}).eq("id", bet['id']).execute()
+                update_rows("bet_queue", {"status": "purchased"}, {"id": bet['id']})
                 print(f"[DONE] Purchased. Total Spent: ¥{self.total_spent:,}")
                 purchased_items.append(bet)
                 